@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетная расстановка марок MarksOn3D по нескольким документам.
+
+Одна сохранённая конфигурация (шаблон имён видов, категории, настройки
+размещения и марки из tag_defaults.json) применяется к открытым документам
+или к списку файлов. Для каждого документа фиксируется количество
+созданных, пропущенных и неудавшихся марок и время обработки; сводка
+записывается в CSV.
+
+Документы совместной работы, открытые из файлов, не сохраняются через
+Save (для центральной модели он недоступен), а синхронизируются с
+центральной моделью с освобождением заимствованных элементов.
+"""
+
+import codecs
+import datetime
+import json
+import os
+import re
+import time
+
+from Autodesk.Revit.DB import (
+    Category,
+    ElementId,
+    FilteredElementCollector,
+    ModelPathUtils,
+    OpenOptions,
+    RelinquishOptions,
+    SynchronizeWithCentralOptions,
+    TagOrientation,
+    TransactWithCentralOptions,
+    View3D,
+    ViewPlan,
+)
+
+from duct_selection import SELECTION_MODES
+from element_names import ElementNameCache
+from marks_engine import (
+    DEFAULT_OFFSET_X,
+    DEFAULT_OFFSET_Y,
+    TagPlacementEngine,
+    get_category_name,
+    get_view_kind,
+)
+from plan_export import csv_field
+from run_manifest import RunManifest, document_key
+from tag_catalog import TagFamilyCatalog
+from tag_profiles import saved_tag
+
+CONFIG_VERSION = 1
+
+# Комментарий синхронизации документов совместной работы
+SYNC_COMMENT = "Пакетная расстановка марок (MarksOn3D)"
+
+# Настройки размещения по умолчанию (как на вкладке 4 MarksOn3D)
+DEFAULT_OPTIONS = {
+    "offset_x": DEFAULT_OFFSET_X,
+    "offset_y": DEFAULT_OFFSET_Y,
+    "orientation": "Horizontal",
+    "use_leader": True,
+    "random_offset": True,
+    "offset_seed": 0,
+    "avoid_collisions": False,
+    "duct_selection_mode": SELECTION_MODES[0],
+    "duct_top_n": 3,
+    "incremental": False,
+    "chunk_tags": 0,
+    "chunk_views": 0,
+}
+
+SUMMARY_COLUMNS = [
+    "document",
+    "path",
+    "views",
+    "created",
+    "existing_tag",
+    "unchanged",
+    "no_tag_type",
+    "no_bbox",
+    "failed",
+    "plan_s",
+    "execute_s",
+    "total_s",
+    "status",
+]
+
+
+class EngineOptions(object):
+    """
+    Настройки размещения для TagPlacementEngine из словаря конфигурации.
+    """
+
+    def __init__(self, values):
+        """
+        Args:
+            values (dict): Значения настроек (недостающие берутся из DEFAULT_OPTIONS).
+        """
+        merged = dict(DEFAULT_OPTIONS)
+        merged.update(values or {})
+        for name, value in merged.items():
+            setattr(self, name, value)
+        self.orientation = (
+            TagOrientation.Vertical
+            if merged["orientation"] == "Vertical"
+            else TagOrientation.Horizontal
+        )
+
+
+class BatchConfig(object):
+    """
+    Конфигурация пакетного запуска.
+
+    Attributes:
+        view_pattern (str): Регулярное выражение для имён видов.
+        category_ids (list): IntegerValue id категорий элементов.
+        tag_defaults (dict): Марки по именам категорий (категории профиля tag_defaults.json).
+        options (dict): Настройки размещения (см. DEFAULT_OPTIONS).
+        save_opened (bool): Сохранять и закрывать документы, открытые из файлов.
+    """
+
+    def __init__(self, view_pattern="", category_ids=None, tag_defaults=None, options=None,
+                 save_opened=True):
+        self.view_pattern = view_pattern
+        self.category_ids = list(category_ids or [])
+        self.tag_defaults = tag_defaults or {}
+        self.options = dict(options or {})
+        self.save_opened = save_opened
+
+    @classmethod
+    def FromSettings(cls, settings, view_pattern, tag_defaults):
+        """
+        Создаёт конфигурацию из настроек формы MarksOn3D.
+
+        Args:
+            settings (TagSettings): Настройки формы.
+            view_pattern (str): Шаблон имён видов.
+            tag_defaults (dict): Марки по именам категорий.
+
+        Returns:
+            BatchConfig: Конфигурация.
+        """
+        options = {}
+        for name in DEFAULT_OPTIONS:
+            options[name] = getattr(settings, name, DEFAULT_OPTIONS[name])
+        options["orientation"] = (
+            "Vertical" if settings.orientation == TagOrientation.Vertical else "Horizontal"
+        )
+        return cls(
+            view_pattern,
+            [category.Id.IntegerValue for category in settings.selected_categories],
+            tag_defaults,
+            options,
+        )
+
+    @classmethod
+    def Load(cls, path):
+        """
+        Загружает конфигурацию из JSON.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            BatchConfig: Конфигурация.
+        """
+        with codecs.open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CONFIG_VERSION:
+            raise ValueError("Неподдерживаемая версия конфигурации: {0}".format(data.get("version")))
+        return cls(
+            data.get("view_pattern", ""),
+            data.get("category_ids", []),
+            data.get("tag_defaults", {}),
+            data.get("options", {}),
+            data.get("save_opened", True),
+        )
+
+    def Save(self, path):
+        """
+        Сохраняет конфигурацию в JSON.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with codecs.open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": CONFIG_VERSION,
+                    "view_pattern": self.view_pattern,
+                    "category_ids": self.category_ids,
+                    "tag_defaults": self.tag_defaults,
+                    "options": self.options,
+                    "save_opened": self.save_opened,
+                },
+                f,
+                ensure_ascii=False,
+                indent=4,
+            )
+
+
+class DocumentSummary(object):
+    """
+    Итог обработки одного документа.
+
+    Attributes:
+        title (str): Имя документа.
+        path (str): Путь к файлу.
+        views (int): Количество подходящих видов.
+        created (int): Создано марок.
+        skipped (dict): {причина пропуска: количество}.
+        failed (int): Количество ошибок.
+        plan_time (float): Время планирования, с.
+        execute_time (float): Время создания марок, с.
+        total_time (float): Общее время, включая открытие и сохранение, с.
+        status (str): "ok" или этап, на котором произошла ошибка, и её текст.
+    """
+
+    def __init__(self, title, path=""):
+        self.title = title
+        self.path = path
+        self.views = 0
+        self.created = 0
+        self.skipped = {}
+        self.failed = 0
+        self.plan_time = 0.0
+        self.execute_time = 0.0
+        self.total_time = 0.0
+        self.status = "ok"
+
+    def Row(self):
+        """
+        Returns:
+            dict: Строка сводки с ключами SUMMARY_COLUMNS.
+        """
+        return {
+            "document": self.title,
+            "path": self.path,
+            "views": self.views,
+            "created": self.created,
+            "existing_tag": self.skipped.get("existing_tag", 0),
+            "unchanged": self.skipped.get("unchanged", 0),
+            "no_tag_type": self.skipped.get("no_tag_type", 0),
+            "no_bbox": self.skipped.get("no_bbox", 0),
+            "failed": self.failed,
+            "plan_s": round(self.plan_time, 2),
+            "execute_s": round(self.execute_time, 2),
+            "total_s": round(self.total_time, 2),
+            "status": self.status,
+        }
+
+
+class BatchRunner(object):
+    """
+    Последовательная обработка документов одной конфигурацией.
+
+    Attributes:
+        config (BatchConfig): Конфигурация.
+        logger (Logger): Экземпляр логгера.
+        manifest_dir (str): Папка манифестов для инкрементального режима.
+        summaries (list): Итоги по документам (DocumentSummary).
+    """
+
+    def __init__(self, config, logger=None, manifest_dir=None):
+        self.config = config
+        self.logger = logger
+        self.manifest_dir = manifest_dir
+        self.options = EngineOptions(config.options)
+        self.summaries = []
+
+    def Log(self, message, *args):
+        """
+        Записывает сообщение в лог, если логгер задан.
+
+        Args:
+            message (str): Сообщение или шаблон для format.
+            *args: Аргументы шаблона.
+        """
+        if self.logger:
+            self.logger.add(message, *args)
+
+    def RunDocuments(self, documents, on_document=None):
+        """
+        Обрабатывает уже открытые документы (без сохранения).
+
+        Args:
+            documents (iterable): Документы Revit.
+            on_document (callable, optional): Вызывается как on_document(summary).
+
+        Returns:
+            list: Итоги по документам.
+        """
+        for doc in documents:
+            if doc.IsLinked or doc.IsFamilyDocument or doc.IsReadOnly:
+                continue
+            summary = DocumentSummary(doc.Title, doc.PathName)
+            start = time.time()
+            self.RunDocument(doc, summary)
+            summary.total_time = time.time() - start
+            self.Finish(summary, on_document)
+        return self.summaries
+
+    def RunFiles(self, application, paths, on_document=None):
+        """
+        Открывает файлы по очереди, обрабатывает, сохраняет и закрывает их.
+
+        Файл, уже открытый пользователем, обрабатывается в открытом документе,
+        который не сохраняется и не закрывается (как в RunDocuments).
+        Документ совместной работы синхронизируется с центральной моделью
+        (SaveOpened). При ошибке в статус документа записывается этап
+        (открытие, сохранение или синхронизация) и текст ошибки.
+
+        Args:
+            application (Application): Приложение Revit.
+            paths (iterable): Пути к файлам .rvt.
+            on_document (callable, optional): Вызывается как on_document(summary).
+
+        Returns:
+            list: Итоги по документам.
+        """
+        for path in paths:
+            summary = DocumentSummary(os.path.basename(path), path)
+            start = time.time()
+            doc = None
+            opened = False
+            stage = "Ошибка открытия"
+            try:
+                doc = find_open_document(application, path)
+                if doc is None:
+                    model_path = ModelPathUtils.ConvertUserVisiblePathToModelPath(path)
+                    doc = application.OpenDocumentFile(model_path, OpenOptions())
+                    opened = True
+                else:
+                    self.Log("Файл {0} уже открыт, используется открытый документ", path)
+                summary.title = doc.Title
+                stage = "Ошибка обработки"
+                self.RunDocument(doc, summary)
+                if opened and self.config.save_opened and summary.created:
+                    if doc.IsWorkshared:
+                        stage = "Марки не сохранены: ошибка синхронизации с центральной моделью"
+                    else:
+                        stage = "Марки не сохранены: ошибка сохранения"
+                    self.SaveOpened(doc)
+            except Exception as e:
+                summary.status = "{0}: {1}".format(stage, e)
+                self.Log("Файл {0}: {1}", path, summary.status)
+            finally:
+                if opened:
+                    doc.Close(False)
+            summary.total_time = time.time() - start
+            self.Finish(summary, on_document)
+        return self.summaries
+
+    def SaveOpened(self, doc):
+        """
+        Сохраняет документ, открытый из файла.
+
+        Документ совместной работы синхронизируется с центральной моделью с
+        освобождением заимствованных элементов и рабочих наборов, иначе
+        вызывается Save.
+
+        Args:
+            doc (Document): Документ Revit.
+        """
+        if not doc.IsWorkshared:
+            doc.Save()
+            return
+        options = SynchronizeWithCentralOptions()
+        options.SetRelinquishOptions(RelinquishOptions(True))
+        options.Comment = SYNC_COMMENT
+        doc.SynchronizeWithCentral(TransactWithCentralOptions(), options)
+        self.Log("Документ '{0}' синхронизирован с центральной моделью", doc.Title)
+
+    def Finish(self, summary, on_document):
+        self.summaries.append(summary)
+        self.Log(
+            "Документ '{0}': создано {1}, ошибок {2}, {3:.1f} с",
+            summary.title, summary.created, summary.failed, summary.total_time,
+        )
+        if on_document:
+            on_document(summary)
+
+    def RunDocument(self, doc, summary):
+        """
+        Расставляет марки в документе по конфигурации.
+
+        Args:
+            doc (Document): Документ Revit.
+            summary (DocumentSummary): Заполняемый итог.
+        """
+        try:
+            views = self.FindViews(doc)
+            categories = self.FindCategories(doc)
+            tag_types_3d, tag_types_plan = self.ResolveTagTypes(doc, categories)
+            summary.views = len(views)
+            if not views or not categories:
+                summary.status = "Нет подходящих видов или категорий"
+                return
+
+            engine = TagPlacementEngine(doc, self.options, self.logger)
+            if self.options.incremental and self.manifest_dir:
+                engine.manifest = RunManifest.Load(
+                    os.path.join(self.manifest_dir, document_key(doc) + ".json")
+                )
+
+            start = time.time()
+            plan = engine.plan(views, categories, tag_types_3d, tag_types_plan)
+            summary.plan_time = time.time() - start
+            for element, view, reason in plan.skipped:
+                summary.skipped[reason] = summary.skipped.get(reason, 0) + 1
+
+            start = time.time()
+            result = engine.execute(plan, transaction_name="Пакетная расстановка марок")
+            summary.execute_time = time.time() - start
+            summary.created = result.success_count
+            # Ошибки планирования уже учтены в пропусках no_tag_type/no_bbox
+            summary.failed = len(result.errors) - len(plan.errors)
+        except Exception as e:
+            summary.status = "Ошибка обработки: {0}".format(e)
+            self.Log("Ошибка обработки документа {0}: {1}", doc.Title, e)
+
+    def FindViews(self, doc):
+        """
+        Возвращает 3D виды и планы (не шаблоны), имена которых подходят под шаблон.
+
+        Args:
+            doc (Document): Документ Revit.
+
+        Returns:
+            list: Виды, отсортированные по имени.
+        """
+        pattern = re.compile(self.config.view_pattern or ".*", re.IGNORECASE | re.UNICODE)
+        views = []
+        for view_class in (View3D, ViewPlan):
+            for view in FilteredElementCollector(doc).OfClass(view_class):
+                if view.IsTemplate or get_view_kind(view) is None:
+                    continue
+                if pattern.search(view.Name):
+                    views.append(view)
+        views.sort(key=lambda view: view.Name)
+        return views
+
+    def FindCategories(self, doc):
+        """
+        Returns:
+            list: Категории конфигурации, существующие в документе.
+        """
+        categories = []
+        for category_id in self.config.category_ids:
+            category = Category.GetCategory(doc, ElementId(category_id))
+            if category:
+                categories.append(category)
+        return categories
+
+    def ResolveTagTypes(self, doc, categories):
+        """
+        Находит в документе марки из tag_defaults по id или именам семейства и типоразмера.
+
+        Args:
+            doc (Document): Документ Revit.
+            categories (list): Категории элементов.
+
+        Returns:
+            tuple: ({категория: типоразмер} для 3D, {категория: типоразмер} для планов).
+        """
+        catalog = TagFamilyCatalog(doc, ElementNameCache(self.logger).Get)
+        tag_types_3d = {}
+        tag_types_plan = {}
+        for category in categories:
+            defaults = self.config.tag_defaults.get(get_category_name(category), {})
+            for suffix, target in (("3d", tag_types_3d), ("plan", tag_types_plan)):
+                family_name, type_name, type_id = saved_tag(defaults, suffix)
+                if not family_name or not type_name:
+                    continue
+                # Id типоразмера проверяется по именам, поэтому годится и для других документов
+                family, symbol = catalog.FindSaved(family_name, type_name, type_id)
+                if symbol:
+                    target[category] = symbol
+                else:
+                    self.Log(
+                        "Документ '{0}': марка '{1} / {2}' не найдена",
+                        doc.Title, family_name, type_name,
+                    )
+        return tag_types_3d, tag_types_plan
+
+    def WriteSummary(self, path):
+        """
+        Записывает сводку по документам в CSV (последняя строка - итог).
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        total = DocumentSummary("ИТОГО")
+        for summary in self.summaries:
+            total.views += summary.views
+            total.created += summary.created
+            total.failed += summary.failed
+            total.plan_time += summary.plan_time
+            total.execute_time += summary.execute_time
+            total.total_time += summary.total_time
+            for reason, count in summary.skipped.items():
+                total.skipped[reason] = total.skipped.get(reason, 0) + count
+
+        with codecs.open(path, "w", encoding="utf-8") as f:
+            f.write(u",".join(SUMMARY_COLUMNS) + u"\r\n")
+            for summary in self.summaries + [total]:
+                row = summary.Row()
+                f.write(u",".join(csv_field(row[column]) for column in SUMMARY_COLUMNS) + u"\r\n")
+
+    def SummaryText(self):
+        """
+        Returns:
+            str: Краткая сводка для окна сообщения.
+        """
+        lines = []
+        total_created = 0
+        total_time = 0.0
+        for summary in self.summaries:
+            lines.append("{0}: создано {1}, пропущено {2}, ошибок {3}, {4:.1f} с{5}".format(
+                summary.title,
+                summary.created,
+                sum(summary.skipped.values()),
+                summary.failed,
+                summary.total_time,
+                "" if summary.status == "ok" else " - " + summary.status,
+            ))
+            total_created += summary.created
+            total_time += summary.total_time
+        lines.append("")
+        lines.append("Документов: {0}, марок: {1}, время: {2:.1f} с".format(
+            len(self.summaries), total_created, total_time))
+        if total_created:
+            lines.append("Среднее время на марку: {0:.3f} с".format(total_time / total_created))
+        return "\n".join(lines)
+
+
+def normalize_path(path):
+    """
+    Returns:
+        str: Путь для сравнения (абсолютный, без учёта регистра в Windows).
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+def find_open_document(application, path):
+    """
+    Находит среди открытых документов документ с указанным файлом.
+
+    Args:
+        application (Application): Приложение Revit.
+        path (str): Путь к файлу .rvt.
+
+    Returns:
+        Document: Открытый документ или None.
+    """
+    target = normalize_path(path)
+    for doc in application.Documents:
+        if doc.IsLinked or not doc.PathName:
+            continue
+        if normalize_path(doc.PathName) == target:
+            return doc
+    return None
+
+
+def summary_file_name():
+    """
+    Returns:
+        str: Имя файла сводки с меткой времени.
+    """
+    return "batch_{0}.csv".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
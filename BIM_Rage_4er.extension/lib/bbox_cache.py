@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш габаритов элементов на видах.
+
+Габарит хранится кортежем (min_x, min_y, min_z, max_x, max_y, max_z) без
+ссылок на объекты Revit. Для планов ключ кэша - вид. Для 3D видов габарит
+не зависит от вида, пока совпадает состояние секущего параллелепипеда,
+поэтому 3D виды без секущего параллелепипеда (или с одинаковым) делят
+один раздел кэша.
+"""
+
+from Autodesk.Revit.DB import View3D
+
+# Точность сравнения секущих параллелепипедов, футы
+SECTION_BOX_DIGITS = 4
+
+
+def bounds_from_bbox(bbox):
+    """
+    Преобразует BoundingBoxXYZ в кортеж координат.
+
+    Args:
+        bbox (BoundingBoxXYZ): Габарит или None.
+
+    Returns:
+        tuple: (min_x, min_y, min_z, max_x, max_y, max_z) или None.
+    """
+    if not bbox or not bbox.Min or not bbox.Max:
+        return None
+    low, high = bbox.Min, bbox.Max
+    return (low.X, low.Y, low.Z, high.X, high.Y, high.Z)
+
+
+def bounds_center(bounds):
+    """
+    Вычисляет центр габарита.
+
+    Args:
+        bounds (tuple): (min_x, min_y, min_z, max_x, max_y, max_z).
+
+    Returns:
+        tuple: Центр габарита (x, y, z).
+    """
+    return (
+        (bounds[0] + bounds[3]) * 0.5,
+        (bounds[1] + bounds[4]) * 0.5,
+        (bounds[2] + bounds[5]) * 0.5,
+    )
+
+
+def view_bbox_key(view):
+    """
+    Возвращает ключ раздела кэша для вида.
+
+    Args:
+        view (View): Вид.
+
+    Returns:
+        tuple: ("3d", состояние секущего параллелепипеда) для 3D видов,
+            ("view", id вида) для остальных.
+    """
+    if isinstance(view, View3D):
+        try:
+            if not view.IsSectionBoxActive:
+                return ("3d", None)
+            box = view.GetSectionBox()
+            origin = box.Transform.Origin
+            basis = box.Transform.BasisX
+            values = (
+                box.Min.X, box.Min.Y, box.Min.Z,
+                box.Max.X, box.Max.Y, box.Max.Z,
+                origin.X, origin.Y, origin.Z,
+                basis.X, basis.Y,
+            )
+            return ("3d", tuple(round(value, SECTION_BOX_DIGITS) for value in values))
+        except Exception:
+            pass
+    return ("view", view.Id.IntegerValue)
+
+
+class BoundingBoxCache(object):
+    """
+    Кэш габаритов элементов по разделам видов.
+
+    Attributes:
+        sections (dict): {ключ раздела: {id элемента: габарит или None}}.
+        view_keys (dict): {id вида: ключ раздела}.
+        hits (int): Количество ответов из кэша.
+        misses (int): Количество вызовов get_BoundingBox.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.view_keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def Section(self, view):
+        """
+        Возвращает раздел кэша вида.
+
+        Args:
+            view (View): Вид.
+
+        Returns:
+            dict: {IntegerValue id элемента: габарит или None}.
+        """
+        view_id = view.Id.IntegerValue
+        key = self.view_keys.get(view_id)
+        if key is None:
+            key = self.view_keys[view_id] = view_bbox_key(view)
+        section = self.sections.get(key)
+        if section is None:
+            section = self.sections[key] = {}
+        return section
+
+    def Get(self, element, view):
+        """
+        Возвращает габарит элемента на виде.
+
+        Args:
+            element (Element): Элемент.
+            view (View): Вид.
+
+        Returns:
+            tuple: Габарит или None, если у элемента нет bounding box.
+        """
+        section = self.Section(view)
+        element_id = element.Id.IntegerValue
+        if element_id in section:
+            self.hits += 1
+            return section[element_id]
+        self.misses += 1
+        bounds = section[element_id] = bounds_from_bbox(element.get_BoundingBox(view))
+        return bounds
+
+    def Stats(self):
+        """
+        Returns:
+            str: Сводка использования кэша для лога.
+        """
+        return "Кэш габаритов: разделов {0}, попаданий {1}, запросов к Revit {2}".format(
+            len(self.sections), self.hits, self.misses
+        )
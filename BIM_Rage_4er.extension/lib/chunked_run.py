@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Разбиение выполнения плана на части (отдельные транзакции) и контрольные точки.
+
+Контрольная точка хранит подпись запуска и виды, марки которых полностью
+подтверждены. Она записывается после подтверждения транзакции, но до
+сохранения документа: если Revit закрылся без сохранения, марки
+"завершённых" видов потеряны. Поэтому при продолжении завершённые виды
+планируются заново, а уже созданные марки отсекаются индексом существующих
+марок (RunCheckpoint.Recheck показывает, сколько марок пришлось восстановить).
+
+Часть, в которой не удалось создать или перевести на выбранный типоразмер
+больше failure_limit марок, откатывается целиком (ChunkFailedError).
+"""
+
+import codecs
+import hashlib
+import json
+import os
+
+from run_manifest import atomic_write
+
+CHECKPOINT_VERSION = 1
+# Доля марок части, неудача которых откатывает всю часть
+MAX_FAILED_SHARE = 0.5
+# Неудачные марки, допустимые в части любого размера
+MIN_FAILED_ALLOWED = 3
+
+
+class ChunkFailedError(Exception):
+    """
+    Слишком много марок части не удалось создать; часть откатывается.
+    """
+
+
+def failure_limit(chunk_size):
+    """
+    Возвращает допустимое количество неудачных марок в части.
+
+    Args:
+        chunk_size (int): Количество марок в части.
+
+    Returns:
+        int: Максимум неудач, после которого часть откатывается.
+    """
+    return max(MIN_FAILED_ALLOWED, int(chunk_size * MAX_FAILED_SHARE))
+
+
+def split_into_chunks(items, chunk_tags=0, chunk_views=0, view_key=None):
+    """
+    Делит записи плана на части по количеству марок и/или видов.
+
+    Args:
+        items (list): Записи плана в порядке выполнения.
+        chunk_tags (int): Максимум марок в части (0 - без ограничения).
+        chunk_views (int): Максимум видов в части (0 - без ограничения).
+        view_key (callable, optional): Ключ вида записи. По умолчанию
+            item.view.Id.IntegerValue.
+
+    Returns:
+        list: Список частей (списков записей).
+    """
+    if view_key is None:
+        view_key = lambda item: item.view.Id.IntegerValue
+
+    chunks = []
+    current = []
+    current_views = []
+    for item in items:
+        key = view_key(item)
+        new_view = not current_views or current_views[-1] != key
+        if current and (
+            (chunk_tags and len(current) >= chunk_tags)
+            or (chunk_views and new_view and len(current_views) >= chunk_views)
+        ):
+            chunks.append(current)
+            current = []
+            current_views = []
+            new_view = True
+        current.append(item)
+        if new_view:
+            current_views.append(key)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def run_signature(view_ids, category_ids, tag_type_ids):
+    """
+    Вычисляет подпись запуска по его входным данным.
+
+    Args:
+        view_ids (list): IntegerValue id видов.
+        category_ids (list): IntegerValue id категорий.
+        tag_type_ids (list): IntegerValue id типоразмеров марок.
+
+    Returns:
+        str: Подпись запуска.
+    """
+    source = "|".join(
+        ",".join(str(value) for value in sorted(values))
+        for values in (view_ids, category_ids, tag_type_ids)
+    )
+    return hashlib.md5(source.encode("utf-8")).hexdigest()
+
+
+class RunCheckpoint(object):
+    """
+    Контрольная точка запуска.
+
+    Attributes:
+        path (str): Путь к файлу контрольной точки.
+        signature (str): Подпись запуска.
+        completed_views (set): IntegerValue id полностью обработанных видов.
+        committed_chunks (int): Количество подтверждённых частей.
+        committed_tags (int): Количество подтверждённых марок.
+    """
+
+    def __init__(self, path, signature):
+        """
+        Инициализирует пустую контрольную точку.
+
+        Args:
+            path (str): Путь к файлу контрольной точки.
+            signature (str): Подпись запуска.
+        """
+        self.path = path
+        self.signature = signature
+        self.completed_views = set()
+        self.committed_chunks = 0
+        self.committed_tags = 0
+
+    @classmethod
+    def Load(cls, path, signature):
+        """
+        Загружает контрольную точку; для другой подписи возвращает пустую.
+
+        Args:
+            path (str): Путь к файлу контрольной точки.
+            signature (str): Подпись текущего запуска.
+
+        Returns:
+            RunCheckpoint: Контрольная точка.
+        """
+        checkpoint = cls(path, signature)
+        if os.path.exists(path):
+            try:
+                with codecs.open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if (
+                    data.get("version") == CHECKPOINT_VERSION
+                    and data.get("signature") == signature
+                ):
+                    checkpoint.completed_views = set(data.get("completed_views", []))
+                    checkpoint.committed_chunks = data.get("committed_chunks", 0)
+                    checkpoint.committed_tags = data.get("committed_tags", 0)
+            except Exception:
+                pass
+        return checkpoint
+
+    def IsResumable(self):
+        """
+        Проверяет, есть ли подтверждённые части прерванного запуска.
+
+        Returns:
+            bool: True, если запуск можно продолжить.
+        """
+        return self.committed_chunks > 0
+
+    def Recheck(self, view_ids):
+        """
+        Сверяет завершённые виды с планом продолжения.
+
+        Завершённые виды не исключаются из плана: документ мог быть закрыт
+        без сохранения после записи контрольной точки. Виды, на которых
+        план снова нашёл элементы без марок, перестают считаться
+        завершёнными.
+
+        Args:
+            view_ids (iterable): IntegerValue id видов с записями плана.
+
+        Returns:
+            set: Завершённые виды, марки которых придётся создать заново.
+        """
+        lost = self.completed_views.intersection(view_ids)
+        self.completed_views.difference_update(lost)
+        return lost
+
+    def MarkCommitted(self, tag_count, completed_view_ids):
+        """
+        Отмечает подтверждённую часть и сохраняет контрольную точку.
+
+        Args:
+            tag_count (int): Количество марок в части.
+            completed_view_ids (iterable): Виды, завершённые этой частью.
+        """
+        self.committed_chunks += 1
+        self.committed_tags += tag_count
+        self.completed_views.update(completed_view_ids)
+        self.Save()
+
+    def Save(self):
+        """
+        Сохраняет контрольную точку в файл через временный файл.
+        """
+        atomic_write(
+            self.path,
+            json.dumps(
+                {
+                    "version": CHECKPOINT_VERSION,
+                    "signature": self.signature,
+                    "completed_views": sorted(self.completed_views),
+                    "committed_chunks": self.committed_chunks,
+                    "committed_tags": self.committed_tags,
+                }
+            ),
+        )
+
+    def Clear(self):
+        """
+        Удаляет файл контрольной точки после успешного завершения запуска.
+        """
+        self.completed_views = set()
+        self.committed_chunks = 0
+        self.committed_tags = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковый отбор самых длинных элементов в группах.
+
+Для каждой группы хранятся только лучшие N пар (длина, id элемента), поэтому
+память не зависит от количества элементов в модели. Модуль не зависит от
+Revit API.
+"""
+
+import heapq
+
+# Режимы отбора воздуховодов
+SELECTION_LONGEST = "longest"  # Самый длинный в группе система/сечение
+SELECTION_TOP_N = "top_n"  # N самых длинных в группе
+SELECTION_PER_LEVEL = "per_level"  # Самый длинный в группе на каждом уровне
+
+SELECTION_MODES = [SELECTION_LONGEST, SELECTION_TOP_N, SELECTION_PER_LEVEL]
+
+
+class GroupTopSelector(object):
+    """
+    Хранит N самых длинных элементов для каждого ключа группы.
+
+    Attributes:
+        limit (int): Количество элементов на группу.
+        groups (dict): {ключ: (длина, id)} при limit == 1,
+            иначе {ключ: min-куча [(длина, id)]}.
+        offered (int): Количество просмотренных элементов.
+    """
+
+    def __init__(self, limit=1):
+        """
+        Инициализирует отбор.
+
+        Args:
+            limit (int): Количество элементов на группу (не меньше 1).
+        """
+        self.limit = max(1, int(limit))
+        self.groups = {}
+        self.offered = 0
+
+    def Offer(self, key, element_id, length):
+        """
+        Учитывает элемент в группе.
+
+        Args:
+            key: Ключ группы.
+            element_id (int): IntegerValue id элемента.
+            length (float): Длина элемента.
+        """
+        self.offered += 1
+        entry = (length, element_id)
+        if self.limit == 1:
+            best = self.groups.get(key)
+            if best is None or length > best[0]:
+                self.groups[key] = entry
+            return
+
+        heap = self.groups.get(key)
+        if heap is None:
+            self.groups[key] = [entry]
+        elif len(heap) < self.limit:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def Results(self):
+        """
+        Возвращает отобранные элементы по группам.
+
+        Returns:
+            list: [(ключ, [(id, длина), ...])], элементы по убыванию длины.
+        """
+        results = []
+        for key, value in self.groups.items():
+            entries = [value] if self.limit == 1 else sorted(value, reverse=True)
+            results.append((key, [(element_id, length) for length, element_id in entries]))
+        return results
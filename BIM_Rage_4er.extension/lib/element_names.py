@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Имена элементов Revit для отображения и сохранения настроек.
+
+resolve_element_name - единая стратегия получения имени семейства,
+типоразмера или другого элемента. ElementNameCache запоминает результат
+по id элемента, поэтому параметры типоразмера читаются один раз за сеанс.
+"""
+
+from Autodesk.Revit.DB import Family, FamilySymbol
+
+# Параметры с именем типа (русская и английская версии Revit)
+TYPE_NAME_PARAMS = ["Тип", "Type Name", "Имя типа"]
+
+
+def _valid_name(element):
+    name = getattr(element, "Name", None)
+    if name and not name.startswith("IronPython"):
+        return name
+    return None
+
+
+def resolve_element_name(element, logger=None):
+    """
+    Получает имя элемента Revit.
+
+    Args:
+        element (Element): Семейство, типоразмер или другой элемент.
+        logger (Logger, optional): Логгер для записи ошибок.
+
+    Returns:
+        str: Имя элемента.
+    """
+    if not element:
+        return "Без имени"
+    try:
+        # Для FamilySymbol (типоразмеров)
+        if isinstance(element, FamilySymbol):
+            name = _valid_name(element)
+            if name:
+                return name
+
+            family = getattr(element, "Family", None)
+            if family:
+                family_name = getattr(family, "Name", None) or ""
+
+                # Пробуем получить имя типа через параметры
+                type_name = ""
+                for param_name in TYPE_NAME_PARAMS:
+                    param = element.LookupParameter(param_name)
+                    if param and param.HasValue:
+                        type_name = param.AsString()
+                        break
+
+                if family_name and type_name:
+                    return family_name + " - " + type_name
+                elif type_name:
+                    return type_name
+                elif family_name:
+                    return family_name
+
+            return "Типоразмер " + str(element.Id.IntegerValue)
+
+        # Для Family (семейств)
+        elif isinstance(element, Family):
+            return _valid_name(element) or "Семейство " + str(element.Id.IntegerValue)
+
+        # Общий случай
+        name = _valid_name(element)
+        if name:
+            return name
+
+    except Exception as e:
+        if logger:
+            logger.add("Ошибка получения имени элемента: {0}", e)
+
+    return "Элемент " + str(element.Id.IntegerValue)
+
+
+class ElementNameCache(object):
+    """
+    Кэш имён элементов по id.
+
+    Attributes:
+        logger (Logger): Логгер для записи ошибок.
+        names (dict): {IntegerValue id: имя}.
+        hits (int): Количество ответов из кэша.
+        misses (int): Количество вычислений имени.
+    """
+
+    def __init__(self, logger=None):
+        """
+        Инициализирует пустой кэш.
+
+        Args:
+            logger (Logger, optional): Логгер для записи ошибок.
+        """
+        self.logger = logger
+        self.names = {}
+        self.hits = 0
+        self.misses = 0
+
+    def Get(self, element):
+        """
+        Возвращает имя элемента, вычисляя его при первом обращении.
+
+        Args:
+            element (Element): Элемент Revit.
+
+        Returns:
+            str: Имя элемента.
+        """
+        if not element:
+            return resolve_element_name(element)
+        key = element.Id.IntegerValue
+        name = self.names.get(key)
+        if name is None:
+            self.misses += 1
+            name = resolve_element_name(element, self.logger)
+            self.names[key] = name
+        else:
+            self.hits += 1
+        return name
+
+    def Invalidate(self, element_ids=None):
+        """
+        Сбрасывает кэш целиком или для указанных элементов.
+
+        Args:
+            element_ids (iterable, optional): IntegerValue id элементов.
+        """
+        if element_ids is None:
+            self.names = {}
+            return
+        for element_id in element_ids:
+            self.names.pop(element_id, None)
@@ -0,0 +1,1225 @@
+# -*- coding: utf-8 -*-
+"""
+Движок расстановки марок без пользовательского интерфейса.
+
+Используется скриптом MarksOn3D и пакетными запусками: план (plan) собирает
+элементы, отбирает воздуховоды и рассчитывает точки марок, выполнение
+(execute) создаёт марки по готовому плану.
+"""
+
+import time
+
+from Autodesk.Revit.DB import (
+    BuiltInCategory,
+    Element,
+    ElementId,
+    ElementMulticategoryFilter,
+    FilteredElementCollector,
+    IndependentTag,
+    LabelUtils,
+    Reference,
+    StorageType,
+    TagMode,
+    Transaction,
+    View3D,
+    ViewPlan,
+    XYZ,
+)
+from System.Collections.Generic import List
+
+from bbox_cache import BoundingBoxCache, bounds_center, bounds_from_bbox
+from chunked_run import ChunkFailedError, failure_limit, split_into_chunks
+from duct_selection import SELECTION_PER_LEVEL, SELECTION_TOP_N, GroupTopSelector
+from param_access import ParameterAccessor, param_as_double, param_as_string
+from run_manifest import element_fingerprint
+from tag_layout import (
+    DEFAULT_TAG_HEIGHT_MM,
+    DEFAULT_TAG_WIDTH_MM,
+    TagLayout,
+    offset_points,
+    project_bounds,
+    project_point,
+    seeded_direction,
+)
+
+# Константы
+MM_TO_FEET = 304.8
+DEFAULT_OFFSET_X = 60.0
+DEFAULT_OFFSET_Y = 30.0
+
+
+class NullLogger(object):
+    """
+    Логгер-заглушка для запусков без логирования.
+    """
+
+    def add(self, message, *args, **kwargs):
+        """
+        Игнорирует сообщение.
+
+        Args:
+            message (str): Сообщение.
+        """
+        pass
+
+    debug = warning = error = add
+
+
+def get_category_name(category, logger=None):
+    """
+    Возвращает локализованное имя категории.
+
+    Args:
+        category (Category): Категория Revit.
+        logger (Logger, optional): Логгер для ошибок.
+
+    Returns:
+        str: Имя категории.
+    """
+    if not category:
+        return "Неизвестная категория"
+    try:
+        if hasattr(category, "Id") and category.Id.IntegerValue < 0:
+            return LabelUtils.GetLabelFor(BuiltInCategory(category.Id.IntegerValue))
+    except Exception as e:
+        if logger:
+            logger.add("Ошибка получения имени категории: {0}".format(e))
+    return getattr(category, "Name", "Неизвестная категория")
+
+
+def get_view_kind(view):
+    """
+    Определяет тип вида для настроек марок.
+
+    Args:
+        view (View): Вид Revit.
+
+    Returns:
+        str: "3D", "План" или None для неподдерживаемых видов.
+    """
+    if isinstance(view, View3D):
+        return "3D"
+    if isinstance(view, ViewPlan):
+        return "План"
+    return None
+
+
+def get_view_axes(view):
+    """
+    Возвращает направления вправо и вверх на виде в виде кортежей.
+
+    Args:
+        view (View): Вид Revit.
+
+    Returns:
+        tuple: ((x, y, z) вправо, (x, y, z) вверх).
+    """
+    right, up = view.RightDirection, view.UpDirection
+    return (right.X, right.Y, right.Z), (up.X, up.Y, up.Z)
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+# Индекс замаркированных элементов
+class TaggedElementIndex(object):
+    """
+    Индекс элементов, уже имеющих марки, по видам.
+
+    Марки вида собираются один раз при первом обращении, после чего
+    проверка наличия марки сводится к поиску в словаре.
+
+    Attributes:
+        doc (Document): Документ Revit.
+        logger (Logger): Экземпляр логгера.
+        tagged_by_view (dict): {id вида: {id элемента: [id марок]}}.
+    """
+
+    def __init__(self, doc, logger=None):
+        """
+        Инициализирует индекс.
+
+        Args:
+            doc (Document): Документ Revit.
+            logger (Logger, optional): Экземпляр логгера.
+        """
+        self.doc = doc
+        self.logger = logger or NullLogger()
+        self.tagged_by_view = {}
+
+    def GetViewIndex(self, view):
+        """
+        Возвращает марки элементов вида, строя индекс при необходимости.
+
+        Args:
+            view (View): Вид (3D или План).
+
+        Returns:
+            dict: {IntegerValue id элемента: [IntegerValue id марок]}.
+        """
+        view_key = view.Id.IntegerValue
+        tagged_ids = self.tagged_by_view.get(view_key)
+        if tagged_ids is None:
+            tagged_ids = self.BuildViewIndex(view)
+            self.tagged_by_view[view_key] = tagged_ids
+        return tagged_ids
+
+    def BuildViewIndex(self, view):
+        """
+        Собирает id всех элементов, замаркированных на виде, и их марок за один проход.
+
+        Args:
+            view (View): Вид (3D или План).
+
+        Returns:
+            dict: {IntegerValue id элемента: [IntegerValue id марок]}.
+        """
+        tagged_ids = {}
+        try:
+            tags = (
+                FilteredElementCollector(self.doc, view.Id)
+                .OfClass(IndependentTag)
+                .ToElements()
+            )
+        except Exception as e:
+            self.logger.add("Ошибка сбора марок вида {0}: {1}".format(view.Id, e))
+            return tagged_ids
+
+        for tag in tags:
+            tag_id = tag.Id.IntegerValue
+            try:
+                for tagged_elem in tag.GetTaggedLocalElements():
+                    tagged_ids.setdefault(tagged_elem.Id.IntegerValue, []).append(tag_id)
+            except Exception as e:
+                self.logger.add("Ошибка проверки марки {0}: {1}".format(tag.Id, e))
+                if hasattr(tag, "TaggedLocalElementId") and tag.TaggedLocalElementId:
+                    tagged_ids.setdefault(
+                        tag.TaggedLocalElementId.IntegerValue, []
+                    ).append(tag_id)
+
+        self.logger.add(
+            "Индекс марок вида {0}: марок {1}, элементов {2}".format(
+                view.Id, len(tags), len(tagged_ids)
+            )
+        )
+        return tagged_ids
+
+    def Contains(self, element, view):
+        """
+        Проверяет, есть ли у элемента марка на виде.
+
+        Args:
+            element (Element): Элемент.
+            view (View): Вид (3D или План).
+
+        Returns:
+            bool: True, если марка существует.
+        """
+        return element.Id.IntegerValue in self.GetViewIndex(view)
+
+    def TagIds(self, element, view):
+        """
+        Возвращает id марок элемента на виде.
+
+        Args:
+            element (Element): Элемент.
+            view (View): Вид (3D или План).
+
+        Returns:
+            list: IntegerValue id марок (пустой, если марок нет).
+        """
+        return list(self.GetViewIndex(view).get(element.Id.IntegerValue, []))
+
+    def Add(self, element, view, tag_id):
+        """
+        Регистрирует новую марку элемента на виде.
+
+        Args:
+            element (Element): Замаркированный элемент.
+            view (View): Вид (3D или План).
+            tag_id (int): IntegerValue id марки.
+        """
+        self.GetViewIndex(view).setdefault(element.Id.IntegerValue, []).append(tag_id)
+
+
+# План расстановки
+class PlannedTag(object):
+    """
+    Запланированная марка.
+
+    Attributes:
+        element (Element): Маркируемый элемент.
+        view (View): Вид размещения.
+        category (Category): Категория элемента.
+        tag_type (FamilySymbol): Типоразмер марки.
+        point (XYZ): Точка размещения марки.
+        fingerprint (str): Отпечаток элемента для манифеста или None.
+    """
+
+    __slots__ = ("element", "view", "category", "tag_type", "point", "fingerprint")
+
+    def __init__(self, element, view, category, tag_type, point, fingerprint=None):
+        self.element = element
+        self.view = view
+        self.category = category
+        self.tag_type = tag_type
+        self.point = point
+        self.fingerprint = fingerprint
+
+
+class TagPlan(object):
+    """
+    Результат планирования расстановки марок.
+
+    Attributes:
+        items (list): Список PlannedTag.
+        skipped (list): Пропущенные элементы [(element, view, причина)].
+        errors (list): Сообщения об ошибках планирования.
+        fingerprints (dict): {(id вида, id элемента): отпечаток} в инкрементальном режиме.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.skipped = []
+        self.errors = []
+        self.fingerprints = {}
+
+
+class TagRunResult(object):
+    """
+    Результат выполнения плана.
+
+    Attributes:
+        success_count (int): Количество созданных марок.
+        errors (list): Сообщения об ошибках.
+    """
+
+    def __init__(self):
+        self.success_count = 0
+        self.errors = []
+
+
+# Движок
+class TagPlacementEngine(object):
+    """
+    Движок расстановки марок: plan → execute.
+
+    Attributes:
+        doc (Document): Документ Revit.
+        options: Настройки размещения (offset_x, offset_y, orientation,
+            use_leader, random_offset, offset_seed, avoid_collisions, duct_selection_mode,
+            duct_top_n, chunk_tags, chunk_views), например TagSettings.
+        logger (Logger): Экземпляр логгера.
+        tag_index (TaggedElementIndex): Индекс существующих марок по видам.
+        params (ParameterAccessor): Кэширующий доступ к параметрам воздуховодов.
+        bboxes (BoundingBoxCache): Кэш габаритов элементов на видах.
+        manifest (RunManifest): Манифест для инкрементального режима или None.
+        tag_type_names (dict): {IntegerValue id типоразмера: имя}, заполняется
+            в PrepareTagTypes.
+        tag_sizes (dict): {IntegerValue id типоразмера: (ширина, высота) на листе
+            в футах или None}, заполняется в TagSize.
+    """
+
+    def __init__(self, doc, options, logger=None):
+        """
+        Инициализирует движок.
+
+        Args:
+            doc (Document): Документ Revit.
+            options: Настройки размещения.
+            logger (Logger, optional): Экземпляр логгера.
+        """
+        self.doc = doc
+        self.options = options
+        self.logger = logger or NullLogger()
+        self.tag_index = TaggedElementIndex(doc, self.logger)
+        self.params = ParameterAccessor()
+        self.bboxes = BoundingBoxCache()
+        self.manifest = None
+        self.tag_type_names = {}
+        self.tag_sizes = {}
+
+    def plan(self, views, categories, tag_types_3d, tag_types_plan):
+        """
+        Строит план расстановки марок без изменения документа.
+
+        Args:
+            views (list): Виды для обработки.
+            categories (list): Категории элементов.
+            tag_types_3d (dict): {категория: типоразмер марки} для 3D видов.
+            tag_types_plan (dict): {категория: типоразмер марки} для планов.
+
+        Returns:
+            TagPlan: План расстановки.
+        """
+        plan = TagPlan()
+        self.logger.add("Выбрано видов: {0}".format(len(views)))
+
+        for view in views:
+            view_kind = get_view_kind(view)
+            if view_kind is None:
+                error_msg = "Вид '{0}' не поддерживается (требуется 3D или План), пропущен".format(view.Name)
+                plan.errors.append(error_msg)
+                self.logger.add(error_msg)
+                continue
+
+            self.logger.add("Обработка вида: {0} [{1}]".format(view.Name, view_kind))
+            tag_types = tag_types_3d if view_kind == "3D" else tag_types_plan
+            elements_by_category = self.CollectElementsByCategory(view, categories)
+
+            view_elements = []
+            for category in categories:
+                elements = elements_by_category.get(category.Id.IntegerValue, [])
+                self.logger.add(
+                    "Категория '{0}': найдено элементов {1}".format(
+                        get_category_name(category, self.logger), len(elements)
+                    )
+                )
+
+                # Для воздуховодов оставляем по одному на группу
+                if category.Id.IntegerValue == int(BuiltInCategory.OST_DuctCurves):
+                    elements = self.GetDuctsToTag(elements)
+                    self.logger.add(
+                        "Для категории '{0}' отобрано {1} воздуховодов для маркировки".format(
+                            get_category_name(category, self.logger), len(elements)
+                        )
+                    )
+
+                view_elements.append((category, elements))
+
+            layout = None
+            if self.options.avoid_collisions:
+                layout = self.CreateLayout(view, elements_by_category, view_elements, tag_types)
+
+            for category, elements in view_elements:
+                self.PlanBatch(
+                    plan, elements, view, view_kind, category, tag_types.get(category), layout
+                )
+
+            if layout:
+                self.logger.add(
+                    "Раскладка вида {0}: на свободном месте {1}, без свободного места {2}".format(
+                        view.Id, layout.placed_count, layout.fallback_count
+                    )
+                )
+
+        self.logger.add("Всего операций после фильтрации: {0}".format(len(plan.items)))
+        if self.manifest is not None:
+            unchanged = sum(1 for skipped in plan.skipped if skipped[2] == "unchanged")
+            self.logger.add("Пропущено неизменённых элементов: {0}".format(unchanged))
+        self.logger.add(self.params.Stats())
+        self.logger.add(self.bboxes.Stats())
+        return plan
+
+    def PlanBatch(self, plan, elements, view, view_kind, category, tag_type, layout=None):
+        """
+        Добавляет в план марки для элементов категории на виде либо причины пропуска.
+
+        Габариты берутся из кэша, точки марок рассчитываются одним проходом
+        по кортежам координат; объекты XYZ создаются только для итоговых точек.
+
+        Args:
+            plan (TagPlan): Заполняемый план.
+            elements (list): Элементы категории.
+            view (View): Вид.
+            view_kind (str): "3D" или "План".
+            category (Category): Категория элементов.
+            tag_type (FamilySymbol): Типоразмер марки или None.
+            layout (TagLayout, optional): Раскладка вида для размещения без наложений.
+        """
+        view_key = view.Id.IntegerValue
+        candidates = []
+        for element in elements:
+            fingerprint = None
+            if self.manifest is not None:
+                # Неизменённые элементы с сохранившимися марками пропускаются сразу
+                element_key = element.Id.IntegerValue
+                fingerprint = element_fingerprint(element, view, self.bboxes.Get(element, view))
+                plan.fingerprints[(view_key, element_key)] = fingerprint
+                if self.manifest.IsUnchanged(view_key, element_key, fingerprint, self.TagExists):
+                    plan.skipped.append((element, view, "unchanged"))
+                    continue
+
+            if self.tag_index.Contains(element, view):
+                self.logger.debug("  ⊘ Элемент {0} уже имеет марку, пропущен", element.Id)
+                plan.skipped.append((element, view, "existing_tag"))
+                continue
+
+            if not tag_type:
+                self.logger.warning("  ⚠️ Тип марки не выбран для категории '{0}' ({1} вид)",
+                    get_category_name(category, self.logger), view_kind)
+                plan.skipped.append((element, view, "no_tag_type"))
+                plan.errors.append("Не удалось создать марку для элемента {0}".format(element.Id))
+                continue
+
+            bounds = self.bboxes.Get(element, view)
+            if bounds is None:
+                self.logger.warning("  ⚠️ Элемент ID {0} не имеет bounding box на виде {1}",
+                    element.Id.IntegerValue, view.Name)
+                plan.skipped.append((element, view, "no_bbox"))
+                plan.errors.append("Не удалось создать марку для элемента {0}".format(element.Id))
+                continue
+
+            candidates.append((element, fingerprint, bounds_center(bounds)))
+
+        if not candidates:
+            return
+
+        scale_factor = 100.0 / view.Scale
+        offset_x = (self.options.offset_x * scale_factor) / MM_TO_FEET
+        offset_y = (self.options.offset_y * scale_factor) / MM_TO_FEET
+        centers = [center for element, fingerprint, center in candidates]
+        directions = [
+            self.OffsetDirection(element.Id.IntegerValue, view_key)
+            for element, fingerprint, center in candidates
+        ]
+
+        if layout:
+            tag_size = self.TagSize(view, tag_type, candidates[0][0])
+            points = self.LayoutPoints(
+                layout, view, candidates, directions, offset_x, offset_y, tag_size
+            )
+        else:
+            # Для 3D видов - смещение по всем осям (по Z меньше), для планов - только XY
+            offset_z = offset_x * 0.5 if view_kind == "3D" else 0.0
+            points = offset_points(centers, directions, offset_x, offset_y, offset_z)
+
+        for (element, fingerprint, center), point in zip(candidates, points):
+            self.logger.debug(
+                "  -> Элемент ID {0}: центр=({1:.2f}, {2:.2f}), точка марки=({3:.2f}, {4:.2f}, {5:.2f})",
+                element.Id.IntegerValue, center[0], center[1], point[0], point[1], point[2])
+            plan.items.append(
+                PlannedTag(element, view, category, tag_type, XYZ(*point), fingerprint)
+            )
+
+    def OffsetDirection(self, element_id, view_id):
+        """
+        Возвращает знаки смещения марки от центра элемента.
+
+        При random_offset направление разбрасывается по хэшу элемента, вида
+        и options.offset_seed: повторный запуск даёт ту же раскладку.
+
+        Args:
+            element_id (int): IntegerValue id элемента.
+            view_id (int): IntegerValue id вида.
+
+        Returns:
+            tuple: (dx, dy, dz), каждое -1 или 1.
+        """
+        if self.options.random_offset:
+            return seeded_direction(element_id, view_id, self.options.offset_seed)
+        return (
+            1 if element_id % 2 == 0 else -1,
+            1 if element_id % 3 == 0 else -1,
+            1 if element_id % 5 == 0 else -1,
+        )
+
+    def LayoutPoints(self, layout, view, candidates, directions, offset_x, offset_y,
+                     tag_size=None):
+        """
+        Подбирает свободные точки марок в плоскости вида.
+
+        Args:
+            layout (TagLayout): Раскладка вида.
+            view (View): Вид.
+            candidates (list): [(элемент, отпечаток, центр (x, y, z))].
+            directions (list): [(dx, dy, dz)] предпочтительных направлений.
+            offset_x (float): Смещение вправо.
+            offset_y (float): Смещение вверх.
+            tag_size (tuple, optional): (ширина, высота) марки в единицах модели.
+
+        Returns:
+            list: [(x, y, z)] точек марок.
+        """
+        right, up = get_view_axes(view)
+        points = []
+        for (element, fingerprint, center), direction in zip(candidates, directions):
+            element_id = element.Id.IntegerValue
+            center_u = _dot(center, right)
+            center_v = _dot(center, up)
+            (u, v), is_free = layout.Place(
+                element_id,
+                (center_u, center_v),
+                offset_x,
+                offset_y,
+                direction[:2],
+                tag_size,
+            )
+            if not is_free:
+                self.logger.debug("  ⚠️ Элемент ID {0}: нет свободного места для марки", element_id)
+            du, dv = u - center_u, v - center_v
+            points.append(tuple(center[i] + right[i] * du + up[i] * dv for i in range(3)))
+        return points
+
+    def TagExists(self, tag_id):
+        """
+        Проверяет, что марка с указанным id есть в документе.
+
+        Args:
+            tag_id (int): IntegerValue id марки.
+
+        Returns:
+            bool: True, если марка существует.
+        """
+        return self.doc.GetElement(ElementId(tag_id)) is not None
+
+    def CollectElementsByCategory(self, view, categories):
+        """
+        Собирает элементы всех категорий вида одним коллектором и раскладывает их по категориям.
+
+        Args:
+            view (View): Вид.
+            categories (list): Категории элементов.
+
+        Returns:
+            dict: {IntegerValue id категории: [элементы]}.
+        """
+        elements_by_category = dict(
+            (category.Id.IntegerValue, []) for category in categories
+        )
+        if not categories:
+            return elements_by_category
+
+        start_time = time.time()
+        category_ids = List[ElementId]([category.Id for category in categories])
+        elements = (
+            FilteredElementCollector(self.doc, view.Id)
+            .WherePasses(ElementMulticategoryFilter(category_ids))
+            .WhereElementIsNotElementType()
+            .ToElements()
+        )
+
+        count = 0
+        for element in elements:
+            if not element.Category:
+                continue
+            bucket = elements_by_category.get(element.Category.Id.IntegerValue)
+            if bucket is not None:
+                bucket.append(element)
+                count += 1
+
+        self.logger.add("Сбор элементов вида {0}: {1} элементов за {2:.3f} с".format(
+            view.Id, count, time.time() - start_time))
+        return elements_by_category
+
+    def CreateLayout(self, view, elements_by_category, view_elements, tag_types):
+        """
+        Создаёт раскладку вида и заносит в неё препятствия и существующие марки.
+
+        Препятствия - все видимые на виде элементы выбранных категорий (а не
+        только отобранные для маркировки). Линейные элементы заносятся осью
+        с полушириной сечения, остальные - габаритом.
+
+        Args:
+            view (View): Вид.
+            elements_by_category (dict): {id категории: [элементы вида]}.
+            view_elements (list): [(категория, [элементы])] для маркировки.
+            tag_types (dict): {категория: типоразмер марки}.
+
+        Returns:
+            TagLayout: Раскладка вида.
+        """
+        right, up = get_view_axes(view)
+        sizes = [
+            self.TagSize(view, tag_types[category], elements[0])
+            for category, elements in view_elements
+            if elements and tag_types.get(category)
+        ]
+        if sizes:
+            tag_width = max(size[0] for size in sizes)
+            tag_height = max(size[1] for size in sizes)
+        else:
+            tag_width = DEFAULT_TAG_WIDTH_MM * view.Scale / MM_TO_FEET
+            tag_height = DEFAULT_TAG_HEIGHT_MM * view.Scale / MM_TO_FEET
+        layout = TagLayout(tag_width, tag_height)
+
+        obstacles = linear = 0
+        for elements in elements_by_category.values():
+            for element in elements:
+                bounds = self.bboxes.Get(element, view)
+                if bounds is None:
+                    continue
+                rect = project_bounds(bounds, right, up)
+                axis = self.ElementAxis(element)
+                if axis is not None:
+                    layout.AddLinearObstacle(
+                        element.Id.IntegerValue,
+                        project_point(axis[0], right, up),
+                        project_point(axis[1], right, up),
+                        self.SectionHalfWidth(element, rect),
+                    )
+                    linear += 1
+                else:
+                    layout.AddObstacle(element.Id.IntegerValue, rect)
+                obstacles += 1
+
+        existing = 0
+        for tag in FilteredElementCollector(self.doc, view.Id).OfClass(IndependentTag):
+            try:
+                bounds = bounds_from_bbox(tag.get_BoundingBox(view))
+                if bounds is not None:
+                    rect = project_bounds(bounds, right, up)
+                else:
+                    head = tag.TagHeadPosition
+                    head = (head.X, head.Y, head.Z)
+                    rect = layout.TagRect(_dot(head, right), _dot(head, up))
+                layout.grid.Insert(("existing", tag.Id.IntegerValue), rect)
+                existing += 1
+            except Exception as e:
+                self.logger.add("Ошибка получения положения марки {0}: {1}".format(tag.Id, e))
+
+        self.logger.add(
+            "Раскладка вида {0}: препятствий {1} (по оси {2}), марок {3}, "
+            "размер марки {4:.1f}x{5:.1f} мм".format(
+                view.Id, obstacles, linear, existing,
+                tag_width / view.Scale * MM_TO_FEET, tag_height / view.Scale * MM_TO_FEET,
+            )
+        )
+        return layout
+
+    def ElementAxis(self, element):
+        """
+        Возвращает ось линейного элемента (воздуховод, труба).
+
+        Args:
+            element (Element): Элемент.
+
+        Returns:
+            tuple: ((x, y, z) начала, (x, y, z) конца) или None, если у элемента
+                нет LocationCurve.
+        """
+        curve = getattr(getattr(element, "Location", None), "Curve", None)
+        if curve is None:
+            return None
+        try:
+            start, end = curve.GetEndPoint(0), curve.GetEndPoint(1)
+        except Exception:
+            return None
+        return (start.X, start.Y, start.Z), (end.X, end.Y, end.Z)
+
+    def SectionHalfWidth(self, element, rect):
+        """
+        Возвращает полуширину сечения линейного элемента.
+
+        Args:
+            element (Element): Элемент.
+            rect (tuple): Габарит элемента в плоскости вида.
+
+        Returns:
+            float: Полуширина по диаметру или размерам сечения, иначе по
+                меньшей стороне габарита.
+        """
+        size = 0.0
+        for field in ("diameter", "width", "height"):
+            try:
+                size = max(size, param_as_double(self.params.Get(element, field)))
+            except Exception:
+                pass
+        if size <= 0.0:
+            size = min(rect[2] - rect[0], rect[3] - rect[1])
+        return size * 0.5
+
+    def TagSize(self, view, tag_type, element):
+        """
+        Возвращает размер марки типоразмера на виде.
+
+        Размер замеряется один раз на типоразмер (MeasureTagSize) и хранится
+        в единицах листа; если замер не удался, используется
+        DEFAULT_TAG_WIDTH_MM x DEFAULT_TAG_HEIGHT_MM.
+
+        Args:
+            view (View): Вид.
+            tag_type (FamilySymbol): Типоразмер марки.
+            element (Element): Элемент категории для пробной марки.
+
+        Returns:
+            tuple: (ширина, высота) в единицах модели.
+        """
+        key = tag_type.Id.IntegerValue
+        if key not in self.tag_sizes:
+            self.tag_sizes[key] = self.MeasureTagSize(view, tag_type, element)
+        size = self.tag_sizes[key] or (
+            DEFAULT_TAG_WIDTH_MM / MM_TO_FEET, DEFAULT_TAG_HEIGHT_MM / MM_TO_FEET
+        )
+        return (size[0] * view.Scale, size[1] * view.Scale)
+
+    def MeasureTagSize(self, view, tag_type, element):
+        """
+        Замеряет марку типоразмера пробной маркой без выноски.
+
+        Пробная марка создаётся во временной транзакции, которая всегда
+        откатывается, поэтому документ не меняется. Если транзакцию открыть
+        нельзя (документ только для чтения или уже идёт транзакция), замер
+        не выполняется.
+
+        Args:
+            view (View): Вид.
+            tag_type (FamilySymbol): Типоразмер марки.
+            element (Element): Элемент для пробной марки.
+
+        Returns:
+            tuple: (ширина, высота) на листе в футах или None.
+        """
+        bounds = self.bboxes.Get(element, view)
+        center = bounds_center(bounds) if bounds else (0.0, 0.0, 0.0)
+        tag_bounds = None
+        trans = Transaction(self.doc, "Замер марки")
+        started = False
+        try:
+            trans.Start()
+            started = True
+            if not tag_type.IsActive:
+                tag_type.Activate()
+            tag = IndependentTag.Create(
+                self.doc,
+                view.Id,
+                Reference(element),
+                False,
+                TagMode.TM_ADDBY_CATEGORY,
+                self.options.orientation,
+                XYZ(*center),
+            )
+            if tag.GetTypeId() != tag_type.Id:
+                tag.ChangeTypeId(tag_type.Id)
+            self.doc.Regenerate()
+            tag_bounds = bounds_from_bbox(tag.get_BoundingBox(view))
+        except Exception as e:
+            self.logger.add("Не удалось замерить марку {0}: {1}".format(tag_type.Id, e))
+        finally:
+            if started:
+                trans.RollBack()
+            trans.Dispose()
+
+        if tag_bounds is None:
+            return None
+        right, up = get_view_axes(view)
+        rect = project_bounds(tag_bounds, right, up)
+        width, height = rect[2] - rect[0], rect[3] - rect[1]
+        if width <= 0 or height <= 0:
+            return None
+        self.logger.add("Размер марки {0}: {1:.1f}x{2:.1f} мм".format(
+            tag_type.Id, width / view.Scale * MM_TO_FEET, height / view.Scale * MM_TO_FEET))
+        return (width / view.Scale, height / view.Scale)
+
+    def execute(self, plan, on_progress=None, transaction_name="Расстановка марок", checkpoint=None):
+        """
+        Создаёт марки по плану.
+
+        План делится на части по options.chunk_tags марок и/или
+        options.chunk_views видов; каждая часть выполняется в своей транзакции.
+        Критическая ошибка, в том числе больше failure_limit марок части,
+        которые не удалось создать или перевести на выбранный типоразмер,
+        откатывает только текущую часть, после чего выполнение останавливается.
+
+        Args:
+            plan (TagPlan): План расстановки.
+            on_progress (callable, optional): Вызывается как on_progress(done, total).
+            transaction_name (str): Имя транзакции.
+            checkpoint (RunCheckpoint, optional): Контрольная точка для продолжения
+                прерванного запуска.
+
+        Returns:
+            TagRunResult: Результат выполнения.
+        """
+        result = TagRunResult()
+        result.errors.extend(plan.errors)
+        total = len(plan.items)
+        created = []
+        done = 0
+
+        chunks = split_into_chunks(
+            plan.items, self.options.chunk_tags, self.options.chunk_views
+        )
+        # Последняя запись каждого вида - после неё вид считается завершённым
+        last_item_by_view = {}
+        for planned in plan.items:
+            last_item_by_view[planned.view.Id.IntegerValue] = planned
+
+        self.PrepareTagTypes(plan)
+
+        completed = True
+        for chunk_number, chunk in enumerate(chunks, 1):
+            name = transaction_name
+            if len(chunks) > 1:
+                name = "{0} ({1}/{2})".format(transaction_name, chunk_number, len(chunks))
+
+            chunk_created = []
+            chunk_failed = 0
+            max_failed = failure_limit(len(chunk))
+            retype = {}
+            trans = Transaction(self.doc, name)
+            trans.Start()
+            try:
+                for planned in chunk:
+                    done += 1
+                    if on_progress:
+                        on_progress(done, total)
+
+                    tag = self.CreateTag(planned)
+                    if tag:
+                        chunk_created.append((planned, tag.Id.IntegerValue))
+                        type_id = planned.tag_type.Id
+                        if tag.GetTypeId() != type_id:
+                            group = retype.get(type_id.IntegerValue)
+                            if group is None:
+                                group = retype[type_id.IntegerValue] = (type_id, List[ElementId]())
+                            group[1].Add(tag.Id)
+                    else:
+                        error_msg = "Не удалось создать марку для элемента {0}".format(
+                            planned.element.Id
+                        )
+                        result.errors.append(error_msg)
+                        self.logger.error("  ✗ {0}", error_msg)
+                        chunk_failed += 1
+                        self.CheckChunkFailures(chunk_failed, max_failed, len(chunk))
+
+                chunk_failed += self.AssignTagTypes(retype)
+                self.CheckChunkFailures(chunk_failed, max_failed, len(chunk))
+                trans.Commit()
+                self.logger.add("Транзакция '{0}' подтверждена успешно".format(name))
+            except Exception as e:
+                trans.RollBack()
+                error_msg = "Критическая ошибка: {0}".format(e)
+                result.errors.append(error_msg)
+                self.logger.error(error_msg)
+                completed = False
+                break
+            finally:
+                trans.Dispose()
+
+            result.success_count += len(chunk_created)
+            created.extend(chunk_created)
+            for planned, tag_id in chunk_created:
+                self.tag_index.Add(planned.element, planned.view, tag_id)
+
+            if checkpoint is not None:
+                completed_views = [
+                    planned.view.Id.IntegerValue for planned in chunk
+                    if last_item_by_view[planned.view.Id.IntegerValue] is planned
+                ]
+                checkpoint.MarkCommitted(len(chunk_created), completed_views)
+
+        self.logger.add("Транзакции завершены: частей {0}, созданных марок {1}".format(
+            len(chunks), result.success_count))
+        self.UpdateManifest(plan, created)
+        if checkpoint is not None and completed:
+            checkpoint.Clear()
+        return result
+
+    def UpdateManifest(self, plan, created):
+        """
+        Записывает в манифест созданные марки и уже замаркированные элементы.
+
+        Args:
+            plan (TagPlan): Выполненный план.
+            created (list): [(PlannedTag, id марки)].
+        """
+        if self.manifest is None:
+            return
+
+        for planned, tag_id in created:
+            if planned.fingerprint is not None:
+                self.manifest.Record(
+                    planned.view.Id.IntegerValue,
+                    planned.element.Id.IntegerValue,
+                    planned.fingerprint,
+                    [tag_id],
+                )
+
+        for element, view, reason in plan.skipped:
+            if reason != "existing_tag":
+                continue
+            key = (view.Id.IntegerValue, element.Id.IntegerValue)
+            fingerprint = plan.fingerprints.get(key)
+            tag_ids = self.tag_index.TagIds(element, view)
+            if fingerprint is not None and tag_ids:
+                # Удаление любой из этих марок вернёт элемент в обработку
+                self.manifest.Record(key[0], key[1], fingerprint, tag_ids)
+
+        try:
+            self.manifest.Save()
+            self.logger.add("Манифест сохранён: {0}".format(self.manifest.path))
+        except Exception as e:
+            self.logger.add("Ошибка сохранения манифеста: {0}".format(e))
+
+    def run(self, views, categories, tag_types_3d, tag_types_plan, on_progress=None):
+        """
+        Планирует и сразу выполняет расстановку марок.
+
+        Args:
+            views (list): Виды для обработки.
+            categories (list): Категории элементов.
+            tag_types_3d (dict): Типоразмеры марок для 3D видов.
+            tag_types_plan (dict): Типоразмеры марок для планов.
+            on_progress (callable, optional): Обработчик прогресса.
+
+        Returns:
+            TagRunResult: Результат выполнения.
+        """
+        plan = self.plan(views, categories, tag_types_3d, tag_types_plan)
+        return self.execute(plan, on_progress)
+
+    def PrepareTagTypes(self, plan):
+        """
+        Один раз на запуск получает имена типоразмеров марок плана и
+        активирует неактивные (в отдельной транзакции).
+
+        Args:
+            plan (TagPlan): План расстановки.
+        """
+        tag_types = {}
+        for planned in plan.items:
+            tag_types.setdefault(planned.tag_type.Id.IntegerValue, planned.tag_type)
+
+        inactive = []
+        for type_id, tag_type in tag_types.items():
+            if type_id not in self.tag_type_names:
+                self.tag_type_names[type_id] = self.GetTagTypeName(tag_type)
+            if not tag_type.IsActive:
+                inactive.append(tag_type)
+        self.logger.add("Типоразмеров марок в плане: {0}, неактивных: {1}".format(
+            len(tag_types), len(inactive)))
+        if not inactive:
+            return
+
+        trans = Transaction(self.doc, "Активация типоразмеров марок")
+        trans.Start()
+        try:
+            for tag_type in inactive:
+                tag_type_name = self.tag_type_names[tag_type.Id.IntegerValue]
+                try:
+                    tag_type.Activate()
+                    self.logger.add("  ✓ Тип марки '{0}' активирован".format(tag_type_name))
+                except Exception as e:
+                    # Продолжаем, возможно марка создастся с типом по умолчанию
+                    self.logger.warning("  ⚠️ Не удалось активировать тип '{0}': {1}", tag_type_name, e)
+            trans.Commit()
+        except Exception as e:
+            trans.RollBack()
+            self.logger.error("Ошибка активации типоразмеров марок: {0}", e)
+        finally:
+            trans.Dispose()
+
+    def CheckChunkFailures(self, failed, max_failed, chunk_size):
+        """
+        Прерывает часть, если неудачных марок больше допустимого.
+
+        Args:
+            failed (int): Неудачные марки части.
+            max_failed (int): Допустимое количество (failure_limit).
+            chunk_size (int): Марок в части.
+
+        Raises:
+            ChunkFailedError: Неудач больше max_failed.
+        """
+        if failed > max_failed:
+            raise ChunkFailedError(
+                "не удалось создать марок: {0} из {1}, часть отменена".format(failed, chunk_size)
+            )
+
+    def AssignTagTypes(self, retype):
+        """
+        Назначает типоразмеры созданным маркам, по одному вызову на типоразмер.
+
+        IndependentTag.Create (TM_ADDBY_CATEGORY) создаёт марку с типом
+        категории по умолчанию; марки с другим выбранным типом переводятся
+        на него группой. Если групповой вызов не прошёл, марки переводятся
+        по одной.
+
+        Args:
+            retype (dict): {IntegerValue id типоразмера: (ElementId, List[ElementId] марок)}.
+
+        Returns:
+            int: Количество марок, оставшихся с типом по умолчанию.
+        """
+        failed = 0
+        for type_key, (type_id, tag_ids) in retype.items():
+            tag_type_name = self.tag_type_names.get(type_key, type_key)
+            try:
+                Element.ChangeTypeId(self.doc, tag_ids, type_id)
+                self.logger.debug("  ✓ Тип марки '{0}' назначен маркам: {1}", tag_type_name, tag_ids.Count)
+                continue
+            except Exception as e:
+                self.logger.warning(
+                    "  ⚠️ Не удалось изменить тип {0} марок на '{1}' группой: {2}",
+                    tag_ids.Count, tag_type_name, e)
+
+            for tag_id in tag_ids:
+                try:
+                    self.doc.GetElement(tag_id).ChangeTypeId(type_id)
+                except Exception as e:
+                    failed += 1
+                    self.logger.error(
+                        "  ✗ Марка {0} осталась с типом по умолчанию вместо '{1}': {2}",
+                        tag_id, tag_type_name, e)
+        return failed
+
+    def CreateTag(self, planned):
+        """
+        Создает марку по записи плана. Типоразмер назначается позже,
+        группой в AssignTagTypes.
+
+        Args:
+            planned (PlannedTag): Запланированная марка.
+
+        Returns:
+            IndependentTag: Созданная марка или None.
+        """
+        try:
+            # Примечание: Тип конца выноски (Leader End) нельзя изменить программно
+            # Это настройка семейства марки, которая задаётся в редакторе семейств Revit
+            tag = IndependentTag.Create(
+                self.doc,
+                planned.view.Id,
+                Reference(planned.element),
+                self.options.use_leader,
+                TagMode.TM_ADDBY_CATEGORY,
+                self.options.orientation,
+                planned.point,
+            )
+            if tag:
+                self.logger.debug("  ✓ Марка создана для элемента ID {0}", planned.element.Id.IntegerValue)
+                return tag
+            self.logger.warning("  ⚠️ IndependentTag.Create вернул None")
+            return None
+
+        except Exception as e:
+            self.logger.error("  ⚠️ Exception при создании марки: {0}", e)
+            return None
+
+    def GetTagTypeName(self, tag_type):
+        """
+        Возвращает имя типоразмера марки для логирования.
+
+        Args:
+            tag_type (FamilySymbol): Типоразмер марки.
+
+        Returns:
+            str: Имя типоразмера или "ID_<id>".
+        """
+        tag_type_name = None
+        try:
+            # Пытаемся получить имя через параметр
+            for param_name in ["Тип", "Type Name"]:
+                name_param = tag_type.LookupParameter(param_name)
+                if name_param and name_param.HasValue:
+                    tag_type_name = name_param.AsString()
+                if tag_type_name:
+                    break
+
+            if not tag_type_name:
+                # Пробуем прямое свойство
+                tag_type_name = str(tag_type.Name) if tag_type.Name else None
+        except:
+            pass
+
+        # Если не удалось получить имя, используем ID
+        if not tag_type_name:
+            tag_type_name = "ID_{}".format(tag_type.Id.IntegerValue)
+        return tag_type_name
+
+    def GetDuctsToTag(self, duct_elements):
+        """
+        Отбирает воздуховоды для маркировки, оставляя самые длинные в каждой группе.
+        Группировка по "Имя системы" -> "Сечение" (и уровню в режиме per_level).
+
+        Args:
+            duct_elements (iterable): Элементы воздуховодов.
+
+        Returns:
+            list: Список элементов воздуховодов для маркировки.
+        """
+        mode = self.options.duct_selection_mode
+        limit = self.options.duct_top_n if mode == SELECTION_TOP_N else 1
+        selector = GroupTopSelector(limit)
+
+        # Храним только лучшие (длина, id) на группу
+        for duct in duct_elements:
+            try:
+                system_name = param_as_string(self.params.Get(duct, "system_name"))
+
+                # Для воздуховодов без параметра "Сечение" оно вычисляется из размеров
+                section_param = self.params.Get(duct, "section")
+                if not section_param:
+                    section = self.GetDuctSection(duct)
+                else:
+                    section = param_as_string(section_param)
+
+                length = param_as_double(self.params.Get(duct, "length"))
+
+                if mode == SELECTION_PER_LEVEL:
+                    key = (system_name, section, self.GetLevelId(duct))
+                else:
+                    key = (system_name, section)
+                selector.Offer(key, duct.Id.IntegerValue, length)
+
+            except Exception as e:
+                self.logger.error("Ошибка обработки воздуховода {0}: {1}", duct.Id, e)
+                continue
+
+        selected_ducts = []
+        for key, entries in selector.Results():
+            for element_id, length in entries:
+                selected_ducts.append(self.doc.GetElement(ElementId(element_id)))
+                self.logger.debug(
+                    "Выбран воздуховод ID {0} для группы {1}, длина {2:.2f}",
+                    element_id, key, length,
+                )
+
+        self.logger.add("Групп воздуховодов: {0} (просмотрено {1})".format(
+            len(selector.groups), selector.offered))
+        return selected_ducts
+
+    def GetLevelId(self, duct):
+        """
+        Возвращает id уровня воздуховода.
+
+        Args:
+            duct (Element): Элемент воздуховода.
+
+        Returns:
+            int: IntegerValue id уровня или -1.
+        """
+        level = getattr(duct, "ReferenceLevel", None)
+        if level:
+            return level.Id.IntegerValue
+        level_id = getattr(duct, "LevelId", None)
+        return level_id.IntegerValue if level_id else -1
+
+    def GetDuctSection(self, duct):
+        """
+        Получает сечение воздуховода.
+
+        Args:
+            duct (Element): Элемент воздуховода.
+
+        Returns:
+            str: Строка с описанием сечения.
+        """
+        try:
+            # Для круглых воздуховодов
+            diameter_param = self.params.Get(duct, "diameter")
+            if diameter_param and diameter_param.HasValue:
+                if diameter_param.StorageType == StorageType.Double:
+                    diameter = diameter_param.AsDouble() * MM_TO_FEET  # в мм
+                    return "Ø{:.0f}".format(diameter)
+
+            # Для прямоугольных воздуховодов
+            width_param = self.params.Get(duct, "width")
+            height_param = self.params.Get(duct, "height")
+
+            if (
+                width_param
+                and height_param
+                and width_param.HasValue
+                and height_param.HasValue
+            ):
+                width = param_as_double(width_param, MM_TO_FEET)  # в мм
+                height = param_as_double(height_param, MM_TO_FEET)  # в мм
+                return "{:.0f}x{:.0f}".format(width, height)
+
+            return "Не определено"
+        except Exception as e:
+            self.logger.error("Ошибка получения сечения воздуховода {0}: {1}", duct.Id, e)
+            return "Ошибка"
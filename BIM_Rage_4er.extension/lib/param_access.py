@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Доступ к параметрам элементов с кэшированием определения параметра.
+
+Поиск по локализованному имени (LookupParameter) выполняется один раз на
+сочетание категории и типа элемента; дальше значение читается напрямую по
+BuiltInParameter или GUID общего параметра. ParameterValueCache хранит
+прочитанные значения по элементу и по типу на время запуска.
+"""
+
+from Autodesk.Revit.DB import BuiltInParameter, InternalDefinition, StorageType
+
+# Логические поля воздуховодов: (локализованное имя, запасной BuiltInParameter)
+DUCT_FIELDS = {
+    "system_name": ("Имя системы", BuiltInParameter.RBS_SYSTEM_NAME_PARAM),
+    "section": ("Сечение", None),
+    "length": ("Длина", BuiltInParameter.CURVE_ELEM_LENGTH),
+    "diameter": ("Диаметр", BuiltInParameter.RBS_CURVE_DIAMETER_PARAM),
+    "width": ("Ширина", BuiltInParameter.RBS_CURVE_WIDTH_PARAM),
+    "height": ("Высота", BuiltInParameter.RBS_CURVE_HEIGHT_PARAM),
+}
+
+# Способы чтения параметра
+SOURCE_BUILTIN = "builtin"
+SOURCE_GUID = "guid"
+SOURCE_NAME = "name"
+SOURCE_MISSING = "missing"
+
+
+class ParameterAccessor(object):
+    """
+    Кэширующий доступ к логическим полям элементов.
+
+    Attributes:
+        fields (dict): {поле: (локализованное имя, BuiltInParameter или None)}.
+        resolved (dict): {(id категории, id типа, поле): (способ, ключ)}.
+        hits (int): Прямые чтения по известному BuiltInParameter или GUID.
+        name_lookups (int): Повторные чтения полей, которые читаются только
+            по имени (LookupParameter на каждое чтение).
+        misses (int): Чтения, потребовавшие поиска определения.
+    """
+
+    def __init__(self, fields=None):
+        """
+        Инициализирует доступ к параметрам.
+
+        Args:
+            fields (dict, optional): Описание полей. По умолчанию DUCT_FIELDS.
+        """
+        self.fields = fields or DUCT_FIELDS
+        self.resolved = {}
+        self.hits = 0
+        self.name_lookups = 0
+        self.misses = 0
+
+    def Get(self, element, field):
+        """
+        Возвращает параметр элемента для логического поля.
+
+        Args:
+            element (Element): Элемент Revit.
+            field (str): Имя логического поля.
+
+        Returns:
+            Parameter: Параметр или None.
+        """
+        category_id = element.Category.Id.IntegerValue if element.Category else 0
+        key = (category_id, element.GetTypeId().IntegerValue, field)
+        source = self.resolved.get(key)
+        if source is None:
+            self.misses += 1
+            param, source = self.Resolve(element, field)
+            self.resolved[key] = source
+            return param
+
+        kind, definition = source
+        if kind == SOURCE_NAME:
+            self.name_lookups += 1
+            return element.LookupParameter(definition)
+        self.hits += 1
+        if kind == SOURCE_MISSING:
+            return None
+        return element.get_Parameter(definition)
+
+    def Resolve(self, element, field):
+        """
+        Находит параметр поля и определяет способ его прямого чтения.
+
+        Args:
+            element (Element): Элемент Revit.
+            field (str): Имя логического поля.
+
+        Returns:
+            tuple: (Parameter или None, (способ, ключ)).
+        """
+        name, fallback = self.fields[field]
+        param = element.LookupParameter(name)
+        if param:
+            if param.IsShared:
+                return param, (SOURCE_GUID, param.GUID)
+            definition = param.Definition
+            if (
+                isinstance(definition, InternalDefinition)
+                and definition.BuiltInParameter != BuiltInParameter.INVALID
+            ):
+                return param, (SOURCE_BUILTIN, definition.BuiltInParameter)
+            return param, (SOURCE_NAME, name)
+
+        if fallback is not None:
+            param = element.get_Parameter(fallback)
+            if param:
+                return param, (SOURCE_BUILTIN, fallback)
+        return None, (SOURCE_MISSING, None)
+
+    def Stats(self):
+        """
+        Возвращает строку со статистикой кэша.
+
+        Returns:
+            str: Количество попаданий, чтений по имени, промахов и определений.
+        """
+        total = self.hits + self.name_lookups + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return (
+            "Параметры: попаданий {0}, по имени {1}, промахов {2} ({3:.1f}% из кэша), "
+            "определений {4}".format(
+                self.hits, self.name_lookups, self.misses, rate, len(self.resolved)
+            )
+        )
+
+
+class ParameterValueCache(object):
+    """
+    Кэш значений параметров на время запуска.
+
+    Значение параметра экземпляра хранится по (id элемента, имя параметра);
+    если у экземпляра параметра нет, значение берётся из типа и хранится по
+    (id типа, имя параметра), поэтому параметры типа читаются один раз на тип.
+
+    Attributes:
+        doc (Document): Документ Revit.
+        values (dict): {(id элемента, имя): (найден, значение или None)}.
+        type_values (dict): {(id типа, имя): (найден, значение или None)}.
+        hits (int): Значения экземпляров из кэша.
+        type_hits (int): Значения типов из кэша.
+        misses (int): Прочитанные значения.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.values = {}
+        self.type_values = {}
+        self.hits = 0
+        self.type_hits = 0
+        self.misses = 0
+
+    def Get(self, element, param_name):
+        """
+        Возвращает значение параметра экземпляра или, если его нет, типа.
+
+        Args:
+            element (Element): Элемент Revit.
+            param_name (str): Имя параметра.
+
+        Returns:
+            tuple: (найден ли параметр, строковое значение или None, если
+                у параметра нет значения).
+        """
+        key = (element.Id.IntegerValue, param_name)
+        result = self.values.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        param = element.LookupParameter(param_name)
+        if param:
+            self.misses += 1
+            result = _read_value(param)
+        else:
+            result = self.GetTypeValue(element.GetTypeId(), param_name)
+        self.values[key] = result
+        return result
+
+    def GetTypeValue(self, type_id, param_name):
+        """
+        Возвращает значение параметра типа.
+
+        Args:
+            type_id (ElementId): Id типа.
+            param_name (str): Имя параметра.
+
+        Returns:
+            tuple: (найден ли параметр, значение или None).
+        """
+        key = (type_id.IntegerValue, param_name)
+        result = self.type_values.get(key)
+        if result is not None:
+            self.type_hits += 1
+            return result
+
+        self.misses += 1
+        type_elem = self.doc.GetElement(type_id)
+        param = type_elem.LookupParameter(param_name) if type_elem else None
+        result = _read_value(param) if param else (False, None)
+        self.type_values[key] = result
+        return result
+
+    def Stats(self):
+        """
+        Возвращает строку со статистикой кэша.
+
+        Returns:
+            str: Попадания по экземплярам и типам, чтения и доля из кэша.
+        """
+        total = self.hits + self.type_hits + self.misses
+        rate = 100.0 * (self.hits + self.type_hits) / total if total else 0.0
+        return "Значения: из кэша экземпляров {0}, типов {1}, прочитано {2} ({3:.1f}% из кэша)".format(
+            self.hits, self.type_hits, self.misses, rate
+        )
+
+
+def _read_value(param):
+    if not param.HasValue:
+        return True, None
+    return True, param.AsValueString() or ""
+
+
+def param_as_string(param):
+    """
+    Возвращает значение параметра строкой.
+
+    Args:
+        param (Parameter): Параметр или None.
+
+    Returns:
+        str: Значение или пустая строка.
+    """
+    if not param or not param.HasValue:
+        return ""
+    if param.StorageType == StorageType.String:
+        return param.AsString() or ""
+    return param.AsValueString() or ""
+
+
+def param_as_double(param, scale=1.0):
+    """
+    Возвращает числовое значение параметра.
+
+    Args:
+        param (Parameter): Параметр или None.
+        scale (float): Множитель для внутренних единиц (например, 304.8 для мм).
+
+    Returns:
+        float: Значение или 0.0.
+    """
+    if not param or not param.HasValue:
+        return 0.0
+    if param.StorageType == StorageType.Double:
+        return param.AsDouble() * scale
+    return float(param.AsValueString().replace(",", "."))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Выгрузка плана расстановки марок (пробный запуск) в CSV или JSON.
+
+Строки упорядочены по (id вида, id элемента), координаты округлены, поэтому
+файлы планов разных ревизий модели можно сравнивать построчно. Модуль не
+импортирует Revit API: используются только атрибуты записей плана.
+"""
+
+import codecs
+import json
+import os
+
+# Состояние строки плана
+STATUS_PLANNED = "planned"
+
+PLAN_COLUMNS = [
+    "status",
+    "view_id",
+    "view_name",
+    "element_id",
+    "category",
+    "tag_type_id",
+    "tag_type",
+    "x",
+    "y",
+    "z",
+]
+
+COORD_DIGITS = 4
+
+
+def plan_rows(plan, get_type_name=None):
+    """
+    Преобразует план в список строк.
+
+    Args:
+        plan (TagPlan): План расстановки.
+        get_type_name (callable, optional): Имя типоразмера марки по элементу.
+
+    Returns:
+        list: Словари с ключами PLAN_COLUMNS.
+    """
+    rows = []
+    for planned in plan.items:
+        point = planned.point
+        tag_type = planned.tag_type
+        rows.append({
+            "status": STATUS_PLANNED,
+            "view_id": planned.view.Id.IntegerValue,
+            "view_name": planned.view.Name,
+            "element_id": planned.element.Id.IntegerValue,
+            "category": planned.category.Name,
+            "tag_type_id": tag_type.Id.IntegerValue,
+            "tag_type": get_type_name(tag_type) if get_type_name else "",
+            "x": round(point.X, COORD_DIGITS),
+            "y": round(point.Y, COORD_DIGITS),
+            "z": round(point.Z, COORD_DIGITS),
+        })
+    for element, view, reason in plan.skipped:
+        category = element.Category
+        rows.append({
+            "status": reason,
+            "view_id": view.Id.IntegerValue,
+            "view_name": view.Name,
+            "element_id": element.Id.IntegerValue,
+            "category": category.Name if category else "",
+            "tag_type_id": "",
+            "tag_type": "",
+            "x": "",
+            "y": "",
+            "z": "",
+        })
+    rows.sort(key=lambda row: (row["view_id"], row["element_id"], row["status"]))
+    return rows
+
+
+def csv_field(value):
+    """
+    Форматирует значение для CSV (кавычки при необходимости).
+
+    Args:
+        value: Значение поля.
+
+    Returns:
+        unicode: Поле CSV.
+    """
+    text = u"{0}".format(value)
+    if any(char in text for char in ',"\r\n'):
+        text = u'"{0}"'.format(text.replace('"', '""'))
+    return text
+
+
+def export_plan(plan, path, get_type_name=None):
+    """
+    Записывает план в файл; формат выбирается по расширению (.json или .csv).
+
+    Args:
+        plan (TagPlan): План расстановки.
+        path (str): Путь к файлу.
+        get_type_name (callable, optional): Имя типоразмера марки по элементу.
+
+    Returns:
+        int: Количество записанных строк.
+    """
+    rows = plan_rows(plan, get_type_name)
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    with codecs.open(path, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            # Компактно: список колонок и строки-массивы
+            json.dump(
+                {
+                    "columns": PLAN_COLUMNS,
+                    "rows": [[row[column] for column in PLAN_COLUMNS] for row in rows],
+                },
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        else:
+            f.write(u",".join(PLAN_COLUMNS) + u"\r\n")
+            for row in rows:
+                f.write(u",".join(csv_field(row[column]) for column in PLAN_COLUMNS) + u"\r\n")
+    return len(rows)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Прогресс длительных операций с ограничением частоты обновления интерфейса.
+
+Обработчик вызывается не чаще одного раза в min_interval_ms миллисекунд
+(или раз в min_items элементов), а также на последнем элементе. Отчёт
+содержит скорость обработки и оценку оставшегося времени. Модуль не
+зависит от Revit API и WinForms.
+"""
+
+import time
+
+DEFAULT_INTERVAL_MS = 200
+
+
+def format_duration(seconds):
+    """
+    Форматирует длительность в виде м:сс или ч:мм:сс.
+
+    Args:
+        seconds (float): Длительность в секундах.
+
+    Returns:
+        str: Отформатированная длительность.
+    """
+    seconds = int(round(max(0.0, seconds)))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return "{0}:{1:02d}:{2:02d}".format(hours, minutes, seconds)
+    return "{0}:{1:02d}".format(minutes, seconds)
+
+
+class ProgressReporter(object):
+    """
+    Счётчик прогресса с редкими обновлениями.
+
+    Attributes:
+        total (int): Общее количество элементов.
+        done (int): Количество обработанных элементов.
+        callback (callable): Обработчик обновления, вызывается как callback(reporter).
+        min_interval_ms (int): Минимальный интервал между обновлениями, мс.
+        min_items (int): Обновлять также каждые min_items элементов (0 - не использовать).
+        unit (str): Единица измерения для текста скорости.
+        updates (int): Количество вызовов обработчика.
+    """
+
+    def __init__(self, total, callback, min_interval_ms=DEFAULT_INTERVAL_MS, min_items=0, unit="шт"):
+        """
+        Инициализирует счётчик и запускает отсчёт времени.
+
+        Args:
+            total (int): Общее количество элементов.
+            callback (callable): Обработчик обновления.
+            min_interval_ms (int): Минимальный интервал между обновлениями, мс.
+            min_items (int): Обновлять каждые min_items элементов (0 - не использовать).
+            unit (str): Единица измерения ("марок", "видов" и т.п.).
+        """
+        self.total = max(0, int(total))
+        self.done = 0
+        self.callback = callback
+        self.min_interval_ms = min_interval_ms
+        self.min_items = min_items
+        self.unit = unit
+        self.updates = 0
+        self.start_time = time.time()
+        self.last_time = None
+        self.last_done = 0
+
+    def Step(self, count=1):
+        """
+        Учитывает обработанные элементы.
+
+        Args:
+            count (int): Количество элементов.
+        """
+        self.Update(self.done + count)
+
+    def Update(self, done):
+        """
+        Устанавливает количество обработанных элементов и при необходимости вызывает обработчик.
+
+        Args:
+            done (int): Количество обработанных элементов.
+        """
+        self.done = done
+        now = time.time()
+        if (
+            self.last_time is None
+            or done >= self.total
+            or (now - self.last_time) * 1000.0 >= self.min_interval_ms
+            or (self.min_items and done - self.last_done >= self.min_items)
+        ):
+            self.Emit(now)
+
+    def Emit(self, now=None):
+        """
+        Вызывает обработчик обновления.
+
+        Args:
+            now (float, optional): Текущее время.
+        """
+        self.last_time = now if now is not None else time.time()
+        self.last_done = self.done
+        self.updates += 1
+        if self.callback:
+            self.callback(self)
+
+    def Finish(self):
+        """
+        Отмечает завершение и вызывает обработчик с итоговыми значениями.
+        """
+        self.done = max(self.done, self.total)
+        self.Emit()
+
+    def Elapsed(self):
+        """
+        Returns:
+            float: Время с начала в секундах.
+        """
+        return time.time() - self.start_time
+
+    def Rate(self):
+        """
+        Returns:
+            float: Скорость обработки, элементов в секунду.
+        """
+        elapsed = self.Elapsed()
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def Eta(self):
+        """
+        Returns:
+            float: Оценка оставшегося времени в секундах или None.
+        """
+        rate = self.Rate()
+        if rate <= 0:
+            return None
+        return max(0, self.total - self.done) / rate
+
+    def Percent(self):
+        """
+        Returns:
+            int: Процент выполнения (0-100).
+        """
+        if not self.total:
+            return 100
+        return min(100, int(self.done * 100 / self.total))
+
+    def Text(self):
+        """
+        Возвращает строку состояния для отображения.
+
+        Returns:
+            str: Например "120/1000 (12%) · 45.3 марок/с · осталось 0:19".
+        """
+        text = "{0}/{1} ({2}%) · {3:.1f} {4}/с".format(
+            self.done, self.total, self.Percent(), self.Rate(), self.unit
+        )
+        eta = self.Eta()
+        if self.done >= self.total:
+            text += " · за " + format_duration(self.Elapsed())
+        elif eta is not None:
+            text += " · осталось " + format_duration(eta)
+        return text
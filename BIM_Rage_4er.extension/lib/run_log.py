@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал выполнения со структурированными записями.
+
+Записи хранят шаблон сообщения и аргументы; строка формируется только при
+просмотре или выгрузке. Буфер ограничен по размеру: вытесняемые записи
+дописываются в файл (если он задан). Модуль не зависит от Revit API и WinForms.
+"""
+
+import codecs
+import datetime
+import os
+import time
+from collections import deque
+from itertools import islice
+
+# Уровни записей
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+DEFAULT_CAPACITY = 20000
+
+
+class LogRecord(object):
+    """
+    Запись журнала.
+
+    Attributes:
+        created (float): Время создания (time.time()).
+        level (int): Уровень записи.
+        message (str): Шаблон сообщения (str.format).
+        args (tuple): Аргументы шаблона.
+    """
+
+    __slots__ = ("created", "level", "message", "args")
+
+    def __init__(self, level, message, args):
+        self.created = time.time()
+        self.level = level
+        self.message = message
+        self.args = args
+
+    def Format(self):
+        """
+        Формирует строку записи.
+
+        Returns:
+            str: "[ЧЧ:ММ:СС] сообщение".
+        """
+        message = self.message
+        if self.args:
+            try:
+                message = message.format(*self.args)
+            except Exception:
+                message = "{0} {1}".format(message, self.args)
+        timestamp = datetime.datetime.fromtimestamp(self.created).strftime("%H:%M:%S")
+        if self.level >= WARNING:
+            return "[{0}] {1}: {2}".format(timestamp, LEVEL_NAMES[self.level], message)
+        return "[{0}] {1}".format(timestamp, message)
+
+
+class RunLog(object):
+    """
+    Журнал с кольцевым буфером, фильтром уровня и выгрузкой в файл.
+
+    Attributes:
+        enabled (bool): Флаг включения журнала.
+        min_level (int): Минимальный сохраняемый уровень.
+        records (deque): Записи в памяти (не более capacity).
+        spill_path (str): Файл для вытесненных записей или None.
+        spilled (int): Количество записей, выгруженных в файл.
+        dropped (int): Количество вытесненных записей без выгрузки.
+    """
+
+    def __init__(self, enabled=False, min_level=DEBUG, capacity=DEFAULT_CAPACITY, spill_path=None):
+        """
+        Инициализирует журнал.
+
+        Args:
+            enabled (bool): Включить журнал.
+            min_level (int): Минимальный сохраняемый уровень.
+            capacity (int): Размер кольцевого буфера.
+            spill_path (str, optional): Файл для вытесненных записей.
+        """
+        self.enabled = enabled
+        self.min_level = min_level
+        self.records = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self.spilled = 0
+        self.dropped = 0
+        self._spill_file = None
+        self._spill_opened = False
+
+    def add(self, message, *args, **kwargs):
+        """
+        Добавляет запись; форматирование откладывается до просмотра.
+
+        Args:
+            message (str): Шаблон сообщения.
+            *args: Аргументы шаблона.
+            level (int, optional): Уровень записи (по умолчанию INFO).
+        """
+        if not self.enabled:
+            return
+        level = kwargs.get("level", INFO)
+        if level < self.min_level:
+            return
+        if len(self.records) == self.records.maxlen:
+            self.Spill(self.records[0])
+        self.records.append(LogRecord(level, message, args))
+
+    def debug(self, message, *args):
+        """Добавляет запись уровня DEBUG."""
+        self.add(message, *args, level=DEBUG)
+
+    def warning(self, message, *args):
+        """Добавляет запись уровня WARNING."""
+        self.add(message, *args, level=WARNING)
+
+    def error(self, message, *args):
+        """Добавляет запись уровня ERROR."""
+        self.add(message, *args, level=ERROR)
+
+    def Spill(self, record):
+        """
+        Выгружает вытесняемую запись в файл.
+
+        Файл очищается при первой выгрузке журнала; после Close() записи
+        дописываются в конец.
+
+        Args:
+            record (LogRecord): Вытесняемая запись.
+        """
+        if not self.spill_path:
+            self.dropped += 1
+            return
+        try:
+            if self._spill_file is None:
+                folder = os.path.dirname(self.spill_path)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder)
+                mode = "a" if self._spill_opened else "w"
+                self._spill_file = codecs.open(self.spill_path, mode, encoding="utf-8")
+                self._spill_opened = True
+            self._spill_file.write(record.Format() + "\n")
+            self.spilled += 1
+        except Exception:
+            self.dropped += 1
+
+    def Close(self):
+        """
+        Закрывает файл выгрузки (следующая выгрузка допишет файл).
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def Count(self):
+        """
+        Returns:
+            int: Количество записей в памяти.
+        """
+        return len(self.records)
+
+    def Page(self, index, page_size):
+        """
+        Возвращает отформатированные записи страницы.
+
+        Args:
+            index (int): Номер страницы с нуля.
+            page_size (int): Записей на странице.
+
+        Returns:
+            list: Строки записей.
+        """
+        start = index * page_size
+        return [record.Format() for record in islice(self.records, start, start + page_size)]
+
+    def PageCount(self, page_size):
+        """
+        Returns:
+            int: Количество страниц (не меньше 1).
+        """
+        return max(1, (len(self.records) + page_size - 1) // page_size)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Манифест запусков расстановки марок для инкрементальной перемаркировки.
+
+Для каждого вида документа хранится отпечаток (fingerprint) обработанных
+элементов и id созданных марок. При повторном запуске элементы с тем же
+отпечатком и сохранившимися марками пропускаются без проверки марок вида.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def document_key(doc):
+    """
+    Возвращает стабильный ключ документа для имени файла манифеста.
+
+    Args:
+        doc (Document): Документ Revit.
+
+    Returns:
+        str: Шестнадцатеричный ключ.
+    """
+    source = doc.PathName or doc.Title or ""
+    return hashlib.md5(source.encode("utf-8")).hexdigest()
+
+
+def element_fingerprint(element, view, bounds=None):
+    """
+    Вычисляет отпечаток геометрии и параметров элемента на виде.
+
+    Учитываются тип элемента, габарит на виде (с точностью 0.001 фута) и
+    VersionGuid элемента, если он доступен (Revit 2021+), который меняется
+    при любом изменении параметров.
+
+    Args:
+        element (Element): Элемент Revit.
+        view (View): Вид.
+        bounds (tuple, optional): Габарит из кэша
+            (min_x, min_y, min_z, max_x, max_y, max_z); если не задан,
+            берётся element.get_BoundingBox(view).
+
+    Returns:
+        str: Отпечаток элемента.
+    """
+    parts = [str(element.GetTypeId().IntegerValue)]
+    if bounds is None:
+        bbox = element.get_BoundingBox(view)
+        if bbox and bbox.Min and bbox.Max:
+            bounds = (bbox.Min.X, bbox.Min.Y, bbox.Min.Z, bbox.Max.X, bbox.Max.Y, bbox.Max.Z)
+    if bounds is not None:
+        parts.extend("{0:.3f}".format(value) for value in bounds)
+    version = getattr(element, "VersionGuid", None)
+    if version is not None:
+        parts.append(str(version))
+    return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def atomic_write(path, text):
+    """
+    Записывает файл через временный файл и замену.
+
+    Args:
+        path (str): Путь к файлу.
+        text (unicode): Содержимое.
+    """
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    temp_path = path + ".tmp"
+    with codecs.open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(temp_path, path)
+        return
+    if os.path.exists(path):
+        try:
+            # IronPython: os.rename не заменяет существующий файл в Windows
+            from System.IO import File
+
+            File.Replace(temp_path, path, None)
+            return
+        except ImportError:
+            os.remove(path)
+    os.rename(temp_path, path)
+
+
+class RunManifest(object):
+    """
+    Манифест обработанных элементов документа.
+
+    Attributes:
+        path (str): Путь к файлу манифеста.
+        views (dict): {id вида: {id элемента: [отпечаток, [id марок]]}}.
+            Ключи - строки, как в JSON.
+    """
+
+    def __init__(self, path):
+        """
+        Инициализирует пустой манифест.
+
+        Args:
+            path (str): Путь к файлу манифеста.
+        """
+        self.path = path
+        self.views = {}
+
+    @classmethod
+    def Load(cls, path):
+        """
+        Загружает манифест из файла; при отсутствии или ошибке возвращает пустой.
+
+        Args:
+            path (str): Путь к файлу манифеста.
+
+        Returns:
+            RunManifest: Манифест.
+        """
+        manifest = cls(path)
+        if os.path.exists(path):
+            try:
+                with codecs.open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    manifest.views = data.get("views", {})
+            except Exception:
+                manifest.views = {}
+        return manifest
+
+    def Save(self):
+        """
+        Сохраняет манифест в файл через временный файл, чтобы прерванная
+        запись не оставила обрезанный манифест.
+        """
+        atomic_write(
+            self.path, json.dumps({"version": MANIFEST_VERSION, "views": self.views})
+        )
+
+    def Get(self, view_id, element_id):
+        """
+        Возвращает запись элемента на виде.
+
+        Args:
+            view_id (int): IntegerValue id вида.
+            element_id (int): IntegerValue id элемента.
+
+        Returns:
+            list: [отпечаток, [id марок]] или None.
+        """
+        return self.views.get(str(view_id), {}).get(str(element_id))
+
+    def Record(self, view_id, element_id, fingerprint, tag_ids):
+        """
+        Записывает обработанный элемент.
+
+        Args:
+            view_id (int): IntegerValue id вида.
+            element_id (int): IntegerValue id элемента.
+            fingerprint (str): Отпечаток элемента.
+            tag_ids (list): IntegerValue id марок элемента на виде.
+        """
+        self.views.setdefault(str(view_id), {})[str(element_id)] = [fingerprint, list(tag_ids)]
+
+    def IsUnchanged(self, view_id, element_id, fingerprint, tag_exists):
+        """
+        Проверяет, что элемент не изменился и его марки на месте.
+
+        Запись без id марок считается устаревшей: по ней нельзя проверить,
+        что элемент всё ещё замаркирован.
+
+        Args:
+            view_id (int): IntegerValue id вида.
+            element_id (int): IntegerValue id элемента.
+            fingerprint (str): Текущий отпечаток элемента.
+            tag_exists (callable): tag_exists(id марки) -> bool.
+
+        Returns:
+            bool: True, если элемент можно пропустить.
+        """
+        entry = self.Get(view_id, element_id)
+        if not entry or entry[0] != fingerprint or not entry[1]:
+            return False
+        return all(tag_exists(tag_id) for tag_id in entry[1])
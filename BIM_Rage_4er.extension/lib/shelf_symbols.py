@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс типоразмеров марок по семействам для подбора длины полки.
+
+Типоразмеры семейства читаются один раз за запуск: имя (SYMBOL_NAME_PARAM)
+→ типоразмер. Длины полки типоразмера (по всем именам из SHELF_PARAM_NAMES)
+читаются при первом обращении и кэшируются. Типоразмеры, созданные через Duplicate, добавляются в индекс
+без повторного обхода семейства.
+"""
+
+from Autodesk.Revit.DB import BuiltInParameter, StorageType
+
+MM_TO_FEET = 304.8
+
+# Возможные имена параметра длины полки в семействах марок
+SHELF_PARAM_NAMES = ["Длина полки", "Shelf Length", "Length", "Длина"]
+
+# Допуск совпадения длины полки, мм
+SHELF_TOLERANCE_MM = 1
+
+
+def symbol_name(symbol):
+    """
+    Возвращает имя типоразмера.
+
+    Args:
+        symbol (FamilySymbol): Типоразмер.
+
+    Returns:
+        str: Значение SYMBOL_NAME_PARAM или Name.
+    """
+    name_param = symbol.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM)
+    if name_param and name_param.HasValue:
+        return name_param.AsString()
+    return symbol.Name
+
+
+def length_prefix(name):
+    """
+    Возвращает префикс имени - всё до последнего подчёркивания с числом.
+
+    Примеры: "Размер / Расход_11" → "Размер / Расход", "Марка_8" → "Марка",
+    "Марка_А" → "Марка_А".
+
+    Args:
+        name (str): Имя типоразмера.
+
+    Returns:
+        str: Префикс.
+    """
+    parts = name.rsplit("_", 1)
+    if len(parts) > 1:
+        try:
+            int(parts[1])
+            return parts[0]
+        except ValueError:
+            pass
+    return name
+
+
+def find_shelf_param(symbol, writable=False):
+    """
+    Находит параметр длины полки типоразмера.
+
+    Args:
+        symbol (FamilySymbol): Типоразмер.
+        writable (bool): Искать параметр, доступный для записи
+            (иначе - параметр со значением).
+
+    Returns:
+        Parameter: Параметр или None.
+    """
+    for param_name in SHELF_PARAM_NAMES:
+        param = symbol.LookupParameter(param_name)
+        if not param or param.StorageType != StorageType.Double:
+            continue
+        if writable and not param.IsReadOnly:
+            return param
+        if not writable and param.HasValue:
+            return param
+    return None
+
+
+def shelf_lengths(symbol):
+    """
+    Возвращает значения всех параметров длины полки типоразмера.
+
+    В семействе может быть несколько параметров из SHELF_PARAM_NAMES
+    (например, "Длина полки" и служебная "Длина"), поэтому типоразмер
+    подходит, если требуемой длине равен любой из них.
+
+    Args:
+        symbol (FamilySymbol): Типоразмер.
+
+    Returns:
+        list: Длины в мм в порядке SHELF_PARAM_NAMES.
+    """
+    lengths = []
+    for param_name in SHELF_PARAM_NAMES:
+        param = symbol.LookupParameter(param_name)
+        if param and param.HasValue and param.StorageType == StorageType.Double:
+            lengths.append(param.AsDouble() * MM_TO_FEET)
+    return lengths
+
+
+class ShelfSymbolIndex(object):
+    """
+    Индекс типоразмеров марок по семействам на время одного запуска.
+
+    Attributes:
+        doc (Document): Документ Revit.
+        families (dict): {IntegerValue id семейства: {имя: типоразмер}}.
+        builds (int): Количество построенных индексов семейств.
+        lookups (int): Количество обращений к индексу.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.families = {}
+        self._lengths = {}
+        self.builds = 0
+        self.lookups = 0
+
+    def Names(self, family):
+        """
+        Возвращает индекс имён семейства, строя его при первом обращении.
+
+        Args:
+            family (Family): Семейство марок.
+
+        Returns:
+            dict: {имя: типоразмер}.
+        """
+        family_id = family.Id.IntegerValue
+        names = self.families.get(family_id)
+        if names is None:
+            names = {}
+            for symbol_id in family.GetFamilySymbolIds():
+                symbol = self.doc.GetElement(symbol_id)
+                if symbol:
+                    names[symbol_name(symbol)] = symbol
+            self.families[family_id] = names
+            self.builds += 1
+        self.lookups += 1
+        return names
+
+    def ShelfLengths(self, symbol):
+        """
+        Возвращает длины полки типоразмера (кэшируются).
+
+        Args:
+            symbol (FamilySymbol): Типоразмер.
+
+        Returns:
+            list: Длины в мм по всем параметрам длины полки (см. shelf_lengths).
+        """
+        key = symbol.Id.IntegerValue
+        if key not in self._lengths:
+            self._lengths[key] = shelf_lengths(symbol)
+        return self._lengths[key]
+
+    def Add(self, family, symbol, length_mm=None):
+        """
+        Добавляет созданный типоразмер в индекс семейства.
+
+        Args:
+            family (Family): Семейство.
+            symbol (FamilySymbol): Новый типоразмер.
+            length_mm (float, optional): Установленная длина полки, мм.
+        """
+        self.Names(family)[symbol_name(symbol)] = symbol
+        self._lengths[symbol.Id.IntegerValue] = [length_mm] if length_mm is not None else []
+
+    def NewNameAndNum(self, tag_type, required_length):
+        """
+        Подбирает имя типоразмера для длины полки.
+
+        Args:
+            tag_type (FamilySymbol): Исходный типоразмер марки.
+            required_length (float): Требуемая длина полки, мм.
+
+        Returns:
+            tuple: (имя, число в имени, ElementId существующего типоразмера
+                с подходящей длиной полки или None).
+        """
+        prefix = length_prefix(symbol_name(tag_type))
+        names = self.Names(tag_type.Family)
+        num = int(required_length)
+
+        target = names.get("{}_{}".format(prefix, num))
+        if target is not None:
+            for length in self.ShelfLengths(target):
+                if abs(length - required_length) < SHELF_TOLERANCE_MM:
+                    return "{}_{}".format(prefix, num), num, target.Id
+
+        # Подходящего нет - новое уникальное имя
+        while "{}_{}".format(prefix, num) in names:
+            num += 1
+        return "{}_{}".format(prefix, num), num, None
+
+    def CreateSymbol(self, base_symbol, name, required_length):
+        """
+        Создаёт типоразмер дублированием и устанавливает длину полки.
+
+        Args:
+            base_symbol (FamilySymbol): Исходный типоразмер.
+            name (str): Имя нового типоразмера.
+            required_length (float): Длина полки, мм.
+
+        Returns:
+            tuple: (FamilySymbol, bool - длина полки установлена).
+        """
+        symbol = base_symbol.Duplicate(name)
+        param = find_shelf_param(symbol, writable=True)
+        if param:
+            param.Set(required_length / MM_TO_FEET)
+        self.Add(base_symbol.Family, symbol, required_length if param else None)
+        return symbol, param is not None
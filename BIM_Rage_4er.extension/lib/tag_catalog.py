@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Каталог семейств марок документа.
+
+Каталог строится одним проходом FilteredElementCollector по семействам
+категорий марок и хранит соответствие категория марок → семейства; типоразмеры
+семейства и индекс (имя семейства, имя типоразмера) → марка заполняются при
+первом обращении к семейству. Повторные запросы (подбор марки по
+категории, поиск сохранённой марки по имени, заполнение диалога выбора)
+обслуживаются из каталога. После загрузки семейств или удаления и
+переименования семейств и типоразмеров каталога он сбрасывается методом
+Invalidate (или обработчиком OnDocumentChanged).
+"""
+
+from Autodesk.Revit.DB import (
+    BuiltInCategory,
+    Category,
+    ElementClassFilter,
+    ElementId,
+    Family,
+    FamilySymbol,
+    FilteredElementCollector,
+)
+
+# Категория элементов → категория марок
+TAG_CATEGORY_MAP = {
+    BuiltInCategory.OST_DuctCurves: BuiltInCategory.OST_DuctTags,
+    BuiltInCategory.OST_FlexDuctCurves: BuiltInCategory.OST_DuctTags,
+    BuiltInCategory.OST_DuctTerminal: BuiltInCategory.OST_DuctTerminalTags,
+    BuiltInCategory.OST_DuctAccessory: BuiltInCategory.OST_DuctAccessoryTags,
+    BuiltInCategory.OST_DuctInsulations: BuiltInCategory.OST_DuctInsulationsTags,
+    BuiltInCategory.OST_MechanicalEquipment: BuiltInCategory.OST_MechanicalEquipmentTags,
+}
+
+# IntegerValue id категорий марок, семейства которых попадают в каталог
+TAG_CATEGORY_IDS = set(int(category) for category in TAG_CATEGORY_MAP.values())
+
+
+def get_tag_category_id(doc, element_category, logger=None):
+    """
+    Возвращает id категории марок для категории элементов.
+
+    Args:
+        doc (Document): Документ Revit.
+        element_category (Category): Категория элементов.
+        logger (Logger, optional): Логгер для записи ошибок.
+
+    Returns:
+        ElementId: Id категории марок или None.
+    """
+    try:
+        if hasattr(element_category, "Id") and element_category.Id.IntegerValue < 0:
+            element_cat = BuiltInCategory(element_category.Id.IntegerValue)
+            if element_cat in TAG_CATEGORY_MAP:
+                tag_cat = Category.GetCategory(doc, TAG_CATEGORY_MAP[element_cat])
+                if tag_cat:
+                    return tag_cat.Id
+    except Exception as e:
+        if logger:
+            logger.add("Ошибка получения категории марки: {0}", e)
+    return None
+
+
+class TagFamilyCatalog(object):
+    """
+    Каталог семейств и типоразмеров марок документа.
+
+    Attributes:
+        doc (Document): Документ Revit.
+        get_name (callable): Функция имени элемента get_name(element) -> str.
+        tag_category_ids (set): IntegerValue id категорий марок каталога.
+        builds (int): Количество построений каталога.
+    """
+
+    def __init__(self, doc, get_name, tag_category_ids=None):
+        """
+        Инициализирует пустой каталог; построение откладывается до первого запроса.
+
+        Args:
+            doc (Document): Документ Revit.
+            get_name (callable): Функция имени элемента.
+            tag_category_ids (iterable, optional): Категории марок для каталога.
+                По умолчанию - категории марок из TAG_CATEGORY_MAP.
+        """
+        self.doc = doc
+        self.get_name = get_name
+        if tag_category_ids is None:
+            tag_category_ids = TAG_CATEGORY_IDS
+        self.tag_category_ids = set(tag_category_ids)
+        self.builds = 0
+        self._families_by_category = None
+        self._families_by_name = {}
+        self._family_ids = set()
+        self._symbols = {}
+        self._symbol_ids = set()
+        self._by_name = {}
+
+    def Invalidate(self):
+        """
+        Сбрасывает каталог; следующий запрос построит его заново.
+        """
+        self._families_by_category = None
+        self._families_by_name = {}
+        self._family_ids = set()
+        self._symbols = {}
+        self._symbol_ids = set()
+        self._by_name = {}
+
+    def ForgetSymbols(self, family_id):
+        """
+        Сбрасывает типоразмеры одного семейства; они будут прочитаны заново.
+
+        Args:
+            family_id (int): IntegerValue id семейства.
+        """
+        symbols = self._symbols.pop(family_id, None)
+        if not symbols:
+            return
+        for symbol in symbols:
+            self._symbol_ids.discard(symbol.Id.IntegerValue)
+        self._by_name = dict(
+            (key, value) for key, value in self._by_name.items()
+            if value[0].Id.IntegerValue != family_id
+        )
+
+    def OnDocumentChanged(self, sender, args):
+        """
+        Обработчик Application.DocumentChanged.
+
+        Каталог сбрасывается при загрузке семейств и при удалении или
+        изменении (например, переименовании) семейства или типоразмера из
+        каталога; новый типоразмер семейства каталога сбрасывает только
+        типоразмеры этого семейства.
+
+        Args:
+            sender: Источник события.
+            args (DocumentChangedEventArgs): Аргументы события.
+        """
+        if self._families_by_category is None:
+            return
+        try:
+            if not args.GetDocument().Equals(self.doc):
+                return
+            if args.GetAddedElementIds(ElementClassFilter(Family)).Count:
+                self.Invalidate()
+                return
+            for ids in (args.GetDeletedElementIds(), args.GetModifiedElementIds()):
+                for element_id in ids:
+                    key = element_id.IntegerValue
+                    if key in self._family_ids or key in self._symbol_ids:
+                        self.Invalidate()
+                        return
+            for symbol_id in args.GetAddedElementIds(ElementClassFilter(FamilySymbol)):
+                symbol = self.doc.GetElement(symbol_id)
+                family = getattr(symbol, "Family", None)
+                if family:
+                    self.ForgetSymbols(family.Id.IntegerValue)
+        except Exception:
+            self.Invalidate()
+
+    def Build(self):
+        """
+        Строит каталог одним проходом по семействам категорий марок.
+
+        Читаются только категория и имя семейства; типоразмеры семейства
+        читаются при первом обращении к нему (Symbols).
+        """
+        families_by_category = {}
+        families_by_name = {}
+        for family in FilteredElementCollector(self.doc).OfClass(Family):
+            if not family:
+                continue
+            family_category = getattr(family, "FamilyCategory", None)
+            if not family_category:
+                continue
+            category_id = family_category.Id.IntegerValue
+            if category_id not in self.tag_category_ids:
+                continue
+            families_by_category.setdefault(category_id, []).append(family)
+            families_by_name.setdefault(self.get_name(family), []).append(family)
+            self._family_ids.add(family.Id.IntegerValue)
+
+        self._families_by_category = families_by_category
+        self._families_by_name = families_by_name
+        self.builds += 1
+
+    def EnsureBuilt(self):
+        """
+        Строит каталог, если он ещё не построен или был сброшен.
+        """
+        if self._families_by_category is None:
+            self.Build()
+
+    def Families(self, tag_category_id):
+        """
+        Возвращает семейства марок категории.
+
+        Args:
+            tag_category_id (ElementId): Id категории марок.
+
+        Returns:
+            list: Семейства в порядке документа.
+        """
+        if not tag_category_id:
+            return []
+        self.EnsureBuilt()
+        return list(self._families_by_category.get(tag_category_id.IntegerValue, []))
+
+    def Symbols(self, family):
+        """
+        Возвращает типоразмеры семейства, читая их при первом обращении.
+
+        Args:
+            family (Family): Семейство.
+
+        Returns:
+            list: Типоразмеры семейства.
+        """
+        self.EnsureBuilt()
+        family_id = family.Id.IntegerValue
+        symbols = self._symbols.get(family_id)
+        if symbols is None:
+            symbols = []
+            family_name = self.get_name(family)
+            for symbol_id in family.GetFamilySymbolIds():
+                symbol = self.doc.GetElement(symbol_id)
+                if not symbol:
+                    continue
+                self._by_name.setdefault(
+                    (family_name, self.get_name(symbol)), (family, symbol)
+                )
+                self._symbol_ids.add(symbol_id.IntegerValue)
+                symbols.append(symbol)
+            self._symbols[family_id] = symbols
+        return list(symbols)
+
+    def DefaultTag(self, tag_category_id):
+        """
+        Подбирает марку для категории: первое семейство с типоразмерами,
+        активный типоразмер или первый доступный.
+
+        Args:
+            tag_category_id (ElementId): Id категории марок.
+
+        Returns:
+            tuple: (Family, FamilySymbol) или (None, None).
+        """
+        for family in self.Families(tag_category_id):
+            symbols = self.Symbols(family)
+            if not symbols:
+                continue
+            for symbol in symbols:
+                if symbol.IsActive:
+                    return family, symbol
+            return family, symbols[0]
+        return None, None
+
+    def FindByName(self, family_name, type_name):
+        """
+        Находит семейство и типоразмер по именам.
+
+        Args:
+            family_name (str): Имя семейства.
+            type_name (str): Имя типоразмера.
+
+        Returns:
+            tuple: (Family, FamilySymbol) или (None, None).
+        """
+        self.EnsureBuilt()
+        key = (family_name, type_name)
+        if key not in self._by_name:
+            # Типоразмеры читаются только у семейств с нужным именем
+            for family in self._families_by_name.get(family_name, []):
+                self.Symbols(family)
+        return self._by_name.get(key, (None, None))
+
+    def FindSaved(self, family_name, type_name, type_id=None):
+        """
+        Находит сохранённую марку: сначала по id типоразмера (без построения
+        каталога), при несовпадении имён - поиском по именам.
+
+        Args:
+            family_name (str): Имя семейства.
+            type_name (str): Имя типоразмера.
+            type_id (int, optional): Сохранённый IntegerValue id типоразмера.
+
+        Returns:
+            tuple: (Family, FamilySymbol) или (None, None).
+        """
+        if type_id:
+            symbol = self.doc.GetElement(ElementId(type_id))
+            if isinstance(symbol, FamilySymbol):
+                family = symbol.Family
+                if (
+                    family
+                    and self.get_name(symbol) == type_name
+                    and self.get_name(family) == family_name
+                ):
+                    return family, symbol
+        return self.FindByName(family_name, type_name)
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+Размещение марок без наложений.
+
+Координаты задаются в плоскости вида (u - вправо, v - вверх), прямоугольники -
+кортежами (min_u, min_v, max_u, max_v). Протяжённые элементы (воздуховоды,
+трубы) индексируются отрезком оси с полушириной сечения: сетка занимает
+только ячейки вдоль оси, а не весь габарит. Модуль не зависит от Revit API.
+"""
+
+import hashlib
+import math
+
+# Размер марки на листе, если замерить типоразмер не удалось, мм
+DEFAULT_TAG_WIDTH_MM = 40.0
+DEFAULT_TAG_HEIGHT_MM = 8.0
+
+# Направления поиска свободного места (по часовой стрелке от правого верхнего)
+CANDIDATE_DIRECTIONS = [
+    (1, 1), (1, 0), (1, -1), (0, -1),
+    (-1, -1), (-1, 0), (-1, 1), (0, 1),
+]
+
+# Множители смещения для колец кандидатов
+CANDIDATE_RINGS = [1.0, 2.0, 3.0]
+
+
+def rects_overlap(a, b):
+    """
+    Проверяет пересечение двух прямоугольников.
+
+    Args:
+        a (tuple): (min_u, min_v, max_u, max_v).
+        b (tuple): (min_u, min_v, max_u, max_v).
+
+    Returns:
+        bool: True, если прямоугольники пересекаются.
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def segment_hits_rect(start, end, half_width, rect):
+    """
+    Проверяет пересечение отрезка с полушириной и прямоугольника.
+
+    Прямоугольник расширяется на полуширину, после чего отрезок отсекается
+    по нему (Лианг - Барски).
+
+    Args:
+        start (tuple): Начало отрезка (u, v).
+        end (tuple): Конец отрезка (u, v).
+        half_width (float): Полуширина отрезка.
+        rect (tuple): (min_u, min_v, max_u, max_v).
+
+    Returns:
+        bool: True, если есть пересечение.
+    """
+    low = (rect[0] - half_width, rect[1] - half_width)
+    high = (rect[2] + half_width, rect[3] + half_width)
+    t0, t1 = 0.0, 1.0
+    for axis in range(2):
+        delta = end[axis] - start[axis]
+        if delta == 0.0:
+            if not low[axis] < start[axis] < high[axis]:
+                return False
+            continue
+        a = (low[axis] - start[axis]) / delta
+        b = (high[axis] - start[axis]) / delta
+        if a > b:
+            a, b = b, a
+        t0, t1 = max(t0, a), min(t1, b)
+        if t0 >= t1:
+            return False
+    return True
+
+
+def project_point(point, right, up):
+    """
+    Проецирует точку на плоскость вида.
+
+    Args:
+        point (tuple): (x, y, z).
+        right (tuple): Направление вправо на виде (x, y, z).
+        up (tuple): Направление вверх на виде (x, y, z).
+
+    Returns:
+        tuple: (u, v).
+    """
+    return (
+        point[0] * right[0] + point[1] * right[1] + point[2] * right[2],
+        point[0] * up[0] + point[1] * up[1] + point[2] * up[2],
+    )
+
+
+def project_bounds(bounds, right, up):
+    """
+    Проецирует габарит на плоскость вида.
+
+    Args:
+        bounds (tuple): (min_x, min_y, min_z, max_x, max_y, max_z).
+        right (tuple): Направление вправо на виде (x, y, z).
+        up (tuple): Направление вверх на виде (x, y, z).
+
+    Returns:
+        tuple: (min_u, min_v, max_u, max_v).
+    """
+    # Проекция линейна: минимум и максимум по каждой оси берутся независимо
+    min_u = max_u = min_v = max_v = 0.0
+    for axis in range(3):
+        low, high = bounds[axis], bounds[axis + 3]
+        for direction, is_u in ((right[axis], True), (up[axis], False)):
+            a, b = low * direction, high * direction
+            if a > b:
+                a, b = b, a
+            if is_u:
+                min_u += a
+                max_u += b
+            else:
+                min_v += a
+                max_v += b
+    return (min_u, min_v, max_u, max_v)
+
+
+def seeded_direction(element_id, view_id, seed=0):
+    """
+    Возвращает воспроизводимые знаки смещения марки.
+
+    Знаки берутся из md5 строки "зерно:вид:элемент", поэтому не зависят
+    от порядка обхода, запуска и машины, но распределены равномерно.
+
+    Args:
+        element_id (int): IntegerValue id элемента.
+        view_id (int): IntegerValue id вида.
+        seed (int): Зерно разброса.
+
+    Returns:
+        tuple: (dx, dy, dz), каждое -1 или 1.
+    """
+    source = "{0}:{1}:{2}".format(seed, view_id, element_id)
+    bits = int(hashlib.md5(source.encode("utf-8")).hexdigest()[:2], 16)
+    return (
+        1 if bits & 1 else -1,
+        1 if bits & 2 else -1,
+        1 if bits & 4 else -1,
+    )
+
+
+def offset_points(centers, directions, offset_x, offset_y, offset_z=0.0):
+    """
+    Смещает центры элементов пакетом.
+
+    Args:
+        centers (list): [(x, y, z)] центров элементов.
+        directions (list): [(dx, dy, dz)] знаков смещения (-1 или 1).
+        offset_x (float): Смещение по X.
+        offset_y (float): Смещение по Y.
+        offset_z (float): Смещение по Z (0 для планов).
+
+    Returns:
+        list: [(x, y, z)] точек марок.
+    """
+    return [
+        (x + offset_x * dx, y + offset_y * dy, z + offset_z * dz)
+        for (x, y, z), (dx, dy, dz) in zip(centers, directions)
+    ]
+
+
+class SpatialGrid(object):
+    """
+    Хэш-сетка прямоугольников для поиска пересечений за O(1) на ячейку.
+
+    Attributes:
+        cell_size (float): Размер ячейки.
+        cells (dict): {(i, j): [ключи фигур]}.
+        rects (dict): {ключ: прямоугольник}.
+        segments (dict): {ключ: (начало, конец, полуширина)}.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Инициализирует сетку.
+
+        Args:
+            cell_size (float): Размер ячейки (больше нуля).
+        """
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.rects = {}
+        self.segments = {}
+
+    def CellRange(self, rect):
+        """
+        Возвращает диапазоны индексов ячеек, покрываемых прямоугольником.
+
+        Args:
+            rect (tuple): Прямоугольник.
+
+        Returns:
+            tuple: (i0, j0, i1, j1) включительно.
+        """
+        size = self.cell_size
+        return (
+            int(math.floor(rect[0] / size)),
+            int(math.floor(rect[1] / size)),
+            int(math.floor(rect[2] / size)),
+            int(math.floor(rect[3] / size)),
+        )
+
+    def Insert(self, key, rect):
+        """
+        Добавляет прямоугольник в сетку.
+
+        Args:
+            key: Ключ прямоугольника.
+            rect (tuple): Прямоугольник.
+        """
+        i0, j0, i1, j1 = self.CellRange(rect)
+        self.rects[key] = rect
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), []).append(key)
+
+    def InsertSegment(self, key, start, end, half_width):
+        """
+        Добавляет отрезок с полушириной, занимая только ячейки вдоль него.
+
+        Args:
+            key: Ключ отрезка.
+            start (tuple): Начало (u, v).
+            end (tuple): Конец (u, v).
+            half_width (float): Полуширина.
+        """
+        self.segments[key] = (start, end, half_width)
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        steps = int(math.ceil(length / (self.cell_size * 0.5))) or 1
+        cells = set()
+        for step in range(steps + 1):
+            t = float(step) / steps
+            u = start[0] + (end[0] - start[0]) * t
+            v = start[1] + (end[1] - start[1]) * t
+            i0, j0, i1, j1 = self.CellRange(
+                (u - half_width, v - half_width, u + half_width, v + half_width)
+            )
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cells.add((i, j))
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(key)
+
+    def Hits(self, key, rect):
+        """
+        Проверяет пересечение прямоугольника с фигурой сетки.
+
+        Args:
+            key: Ключ фигуры.
+            rect (tuple): Прямоугольник.
+
+        Returns:
+            bool: True, если есть пересечение.
+        """
+        shape = self.rects.get(key)
+        if shape is not None:
+            return rects_overlap(rect, shape)
+        start, end, half_width = self.segments[key]
+        return segment_hits_rect(start, end, half_width, rect)
+
+    def Intersects(self, rect, ignore_key=None):
+        """
+        Проверяет, пересекает ли прямоугольник что-либо в сетке.
+
+        Args:
+            rect (tuple): Прямоугольник.
+            ignore_key (optional): Ключ, пересечение с которым не учитывается.
+
+        Returns:
+            bool: True, если есть пересечение.
+        """
+        i0, j0, i1, j1 = self.CellRange(rect)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for key in self.cells.get((i, j), ()):
+                    if key != ignore_key and self.Hits(key, rect):
+                        return True
+        return False
+
+
+class TagLayout(object):
+    """
+    Раскладка марок одного вида: препятствия и занятые марками места.
+
+    Attributes:
+        tag_width (float): Ширина марки по умолчанию в единицах модели.
+        tag_height (float): Высота марки по умолчанию в единицах модели.
+        grid (SpatialGrid): Индекс препятствий и размещённых марок.
+        placed_count (int): Количество марок, размещённых на свободном месте.
+        fallback_count (int): Количество марок без свободного места.
+    """
+
+    def __init__(self, tag_width, tag_height):
+        """
+        Инициализирует раскладку.
+
+        Args:
+            tag_width (float): Ширина марки в единицах модели.
+            tag_height (float): Высота марки в единицах модели.
+        """
+        self.tag_width = tag_width
+        self.tag_height = tag_height
+        self.grid = SpatialGrid(max(tag_width, tag_height))
+        self.placed_count = 0
+        self.fallback_count = 0
+
+    def AddObstacle(self, key, rect):
+        """
+        Добавляет препятствие (габарит элемента).
+
+        Args:
+            key: Ключ элемента.
+            rect (tuple): Габарит элемента в плоскости вида.
+        """
+        self.grid.Insert(key, rect)
+
+    def AddLinearObstacle(self, key, start, end, half_width):
+        """
+        Добавляет протяжённое препятствие (ось элемента с полушириной сечения).
+
+        Args:
+            key: Ключ элемента.
+            start (tuple): Начало оси в плоскости вида (u, v).
+            end (tuple): Конец оси в плоскости вида (u, v).
+            half_width (float): Полуширина сечения в единицах модели.
+        """
+        self.grid.InsertSegment(key, start, end, half_width)
+
+    def TagRect(self, u, v, size=None):
+        """
+        Возвращает прямоугольник марки с центром в точке.
+
+        Args:
+            u (float): Координата вправо.
+            v (float): Координата вверх.
+            size (tuple, optional): (ширина, высота) марки; по умолчанию
+                tag_width и tag_height.
+
+        Returns:
+            tuple: Прямоугольник марки.
+        """
+        width, height = size or (self.tag_width, self.tag_height)
+        half_w = width / 2.0
+        half_h = height / 2.0
+        return (u - half_w, v - half_h, u + half_w, v + half_h)
+
+    def Candidates(self, center, offset_u, offset_v, preferred):
+        """
+        Перечисляет точки-кандидаты вокруг элемента, начиная с предпочтительной.
+
+        Args:
+            center (tuple): Центр элемента (u, v).
+            offset_u (float): Смещение по горизонтали.
+            offset_v (float): Смещение по вертикали.
+            preferred (tuple): Предпочтительное направление (du, dv).
+
+        Returns:
+            list: Точки (u, v).
+        """
+        directions = [preferred] + [d for d in CANDIDATE_DIRECTIONS if d != preferred]
+        points = []
+        for ring in CANDIDATE_RINGS:
+            for du, dv in directions:
+                points.append((
+                    center[0] + offset_u * ring * du,
+                    center[1] + offset_v * ring * dv,
+                ))
+        return points
+
+    def Place(self, key, center, offset_u, offset_v, preferred, size=None):
+        """
+        Выбирает первую свободную точку для марки и занимает её.
+
+        Args:
+            key: Ключ элемента (его габарит не считается препятствием).
+            center (tuple): Центр элемента (u, v).
+            offset_u (float): Смещение по горизонтали.
+            offset_v (float): Смещение по вертикали.
+            preferred (tuple): Предпочтительное направление (du, dv).
+            size (tuple, optional): (ширина, высота) марки этого типоразмера.
+
+        Returns:
+            tuple: ((u, v), True) для свободной точки или
+                (предпочтительная точка, False), если свободных нет.
+        """
+        candidates = self.Candidates(center, offset_u, offset_v, preferred)
+        for u, v in candidates:
+            rect = self.TagRect(u, v, size)
+            if not self.grid.Intersects(rect, ignore_key=key):
+                self.grid.Insert(("tag", key), rect)
+                self.placed_count += 1
+                return (u, v), True
+
+        u, v = candidates[0]
+        self.grid.Insert(("tag", key), self.TagRect(u, v, size))
+        self.fallback_count += 1
+        return (u, v), False
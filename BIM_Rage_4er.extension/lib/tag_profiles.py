@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилище профилей tag_defaults.json по проектам.
+
+Файл содержит версию схемы и профили, ключ профиля - GUID документа
+(Document.CreationGUID). Профиль хранит настройки категорий (имена семейства
+и типоразмера марки вместе с id типоразмера, параметры) и общие настройки
+скрипта. Перед записью файл перечитывается и заменяется только профиль
+текущего документа, поэтому проекты не затирают настройки друг друга.
+Запись атомарная (через временный файл) и пропускается, если содержимое
+не изменилось.
+
+Файл без версии (прежний формат "категория → настройки") переносится в
+профиль по умолчанию, с которого начинаются новые проекты.
+"""
+
+import codecs
+import copy
+import json
+import os
+
+from run_manifest import atomic_write, document_key
+
+PROFILES_VERSION = 2
+
+# Профиль, с которого начинаются проекты без сохранённых настроек
+DEFAULT_PROFILE = "default"
+
+
+def document_profile_key(doc):
+    """
+    Возвращает ключ профиля документа.
+
+    Args:
+        doc (Document): Документ Revit.
+
+    Returns:
+        str: GUID создания документа или ключ по пути (если GUID недоступен).
+    """
+    guid = getattr(doc, "CreationGUID", None)
+    if guid is not None:
+        return str(guid)
+    return document_key(doc)
+
+
+def new_profile(title=""):
+    """
+    Returns:
+        dict: Пустой профиль.
+    """
+    return {"title": title, "categories": {}, "settings": {}}
+
+
+def migrate_legacy(data):
+    """
+    Переносит файл прежнего формата в профиль.
+
+    Args:
+        data (dict): {имя категории: настройки, имя настройки: значение}.
+
+    Returns:
+        dict: Профиль.
+    """
+    profile = new_profile()
+    for name, value in data.items():
+        if isinstance(value, dict):
+            profile["categories"][name] = value
+        else:
+            profile["settings"][name] = value
+    return profile
+
+
+def check_profile(profile):
+    """
+    Проверяет схему профиля.
+
+    Args:
+        profile: Значение из файла.
+
+    Returns:
+        bool: True, если профиль можно использовать.
+    """
+    if not isinstance(profile, dict):
+        return False
+    categories = profile.get("categories", {})
+    if not isinstance(categories, dict) or not isinstance(profile.get("settings", {}), dict):
+        return False
+    return all(isinstance(entry, dict) for entry in categories.values())
+
+
+def is_supported(version):
+    """
+    Returns:
+        bool: True для файлов прежнего формата (без версии) и версий до PROFILES_VERSION.
+    """
+    return version is None or (isinstance(version, int) and version <= PROFILES_VERSION)
+
+
+def read_profiles(path):
+    """
+    Читает профили из файла.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        tuple: ({ключ: профиль}, версия файла или None, текст файла).
+    """
+    if not os.path.exists(path):
+        return {}, None, None
+    with codecs.open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("корень файла должен быть объектом")
+
+    version = data.get("version")
+    if version is None:
+        return {DEFAULT_PROFILE: migrate_legacy(data)}, None, text
+    if not is_supported(version):
+        return {}, version, text
+
+    profiles = {}
+    for key, profile in (data.get("profiles") or {}).items():
+        if check_profile(profile):
+            profile.setdefault("title", "")
+            profile.setdefault("categories", {})
+            profile.setdefault("settings", {})
+            profiles[key] = profile
+    return profiles, version, text
+
+
+class TagProfileStore(object):
+    """
+    Профили настроек марок по документам.
+
+    Attributes:
+        path (str): Путь к tag_defaults.json.
+        profiles (dict): {ключ документа: профиль}.
+        read_only (bool): Файл записан более новой версией схемы и не перезаписывается.
+        error (str): Ошибка чтения файла или None.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.profiles = {}
+        self.read_only = False
+        self.error = None
+        self._text = None
+
+    @classmethod
+    def Load(cls, path):
+        """
+        Загружает профили; при ошибке возвращает пустое хранилище.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            TagProfileStore: Хранилище.
+        """
+        store = cls(path)
+        try:
+            store.profiles, version, store._text = read_profiles(path)
+            if not is_supported(version):
+                store.read_only = True
+                store.error = "неподдерживаемая версия файла: {0}".format(version)
+        except Exception as e:
+            store.error = str(e)
+        return store
+
+    def Profile(self, key, title=""):
+        """
+        Возвращает профиль документа, создавая его из профиля по умолчанию.
+
+        Args:
+            key (str): Ключ документа (document_profile_key).
+            title (str): Имя документа для читаемости файла.
+
+        Returns:
+            dict: Профиль {"title", "categories", "settings"}.
+        """
+        profile = self.profiles.get(key)
+        if profile is None:
+            base = self.profiles.get(DEFAULT_PROFILE)
+            profile = copy.deepcopy(base) if base else new_profile()
+            self.profiles[key] = profile
+        if title:
+            profile["title"] = title
+        return profile
+
+    def Save(self, key):
+        """
+        Записывает профиль документа, сохраняя профили других документов из файла.
+
+        Args:
+            key (str): Ключ документа.
+
+        Returns:
+            bool: True, если файл был записан.
+        """
+        if self.read_only or key not in self.profiles:
+            return False
+        version = None
+        try:
+            profiles, version, self._text = read_profiles(self.path)
+        except Exception:
+            # Повреждённый файл заменяется профилями из памяти
+            profiles = dict(self.profiles)
+        if not is_supported(version):
+            self.read_only = True
+            return False
+
+        profiles[key] = self.profiles[key]
+        # Прежний профиль по умолчанию сохраняется для новых проектов
+        if DEFAULT_PROFILE in self.profiles:
+            profiles.setdefault(DEFAULT_PROFILE, self.profiles[DEFAULT_PROFILE])
+        self.profiles = profiles
+
+        text = json.dumps(
+            {"version": PROFILES_VERSION, "profiles": profiles},
+            ensure_ascii=False,
+            indent=2,
+            sort_keys=True,
+        )
+        if text == self._text:
+            return False
+        atomic_write(self.path, text)
+        self._text = text
+        return True
+
+
+def saved_tag(entry, suffix):
+    """
+    Читает сохранённую марку из настроек категории.
+
+    Args:
+        entry (dict): Настройки категории.
+        suffix (str): "3d" или "plan".
+
+    Returns:
+        tuple: (имя семейства, имя типоразмера, id типоразмера или None).
+    """
+    return (
+        entry.get("family_" + suffix),
+        entry.get("type_" + suffix),
+        entry.get("type_id_" + suffix),
+    )
+
+
+def store_tag(entry, suffix, family_name, type_name, type_id=None):
+    """
+    Записывает марку в настройки категории.
+
+    Args:
+        entry (dict): Настройки категории.
+        suffix (str): "3d" или "plan".
+        family_name (str): Имя семейства.
+        type_name (str): Имя типоразмера.
+        type_id (int, optional): IntegerValue id типоразмера.
+    """
+    entry["family_" + suffix] = family_name
+    entry["type_" + suffix] = type_name
+    if type_id:
+        entry["type_id_" + suffix] = type_id
+    else:
+        entry.pop("type_id_" + suffix, None)
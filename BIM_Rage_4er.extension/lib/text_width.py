@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Модель ширины текста марки по метрикам шрифта.
+
+Ширина строки складывается из ширин символов (advance), измеренных один
+раз на шрифт через GDI+ MeasureString; таблица символов и ширины строк
+кэшируются, поэтому тысячи значений измеряются за миллисекунды. Кернинг
+не учитывается - для подбора длины полки этого достаточно.
+
+GDI+ молча подставляет другой шрифт вместо неустановленного, поэтому имя
+шрифта проверяется по установленным (is_font_installed) до измерения.
+"""
+
+# Кегль (em, пиксели), при котором измеряются символы
+REFERENCE_EM = 100.0
+
+DEFAULT_FONT_NAME = "Arial"
+DEFAULT_TEXT_SIZE_MM = 2.5
+
+
+def installed_font_names():
+    """
+    Возвращает имена шрифтов, установленных в системе.
+
+    Returns:
+        set: Имена семейств шрифтов в нижнем регистре.
+    """
+    import clr
+
+    clr.AddReference("System.Drawing")
+    from System.Drawing.Text import InstalledFontCollection
+
+    collection = InstalledFontCollection()
+    try:
+        return set(family.Name.lower() for family in collection.Families)
+    finally:
+        collection.Dispose()
+
+
+def is_font_installed(font_name, font_names=None):
+    """
+    Проверяет, установлен ли шрифт.
+
+    Args:
+        font_name (str): Имя шрифта.
+        font_names (set, optional): Имена установленных шрифтов в нижнем
+            регистре. По умолчанию - installed_font_names().
+
+    Returns:
+        bool: True, если шрифт установлен (без учёта регистра).
+    """
+    if font_names is None:
+        font_names = installed_font_names()
+    return (font_name or "").strip().lower() in font_names
+
+
+def gdi_char_measurer(font_name):
+    """
+    Создаёт функцию измерения символа через GDI+.
+
+    Args:
+        font_name (str): Имя шрифта.
+
+    Returns:
+        callable: measure(char) -> ширина символа в долях em.
+    """
+    import clr
+
+    clr.AddReference("System.Drawing")
+    from System.Drawing import (
+        Bitmap,
+        Font,
+        Graphics,
+        GraphicsUnit,
+        StringFormat,
+        StringFormatFlags,
+    )
+
+    graphics = Graphics.FromImage(Bitmap(1, 1))
+    font = Font(font_name, REFERENCE_EM, GraphicsUnit.Pixel)
+    # Типографский формат без полей GDI+; пробелы учитываются
+    string_format = StringFormat(StringFormat.GenericTypographic)
+    string_format.FormatFlags |= StringFormatFlags.MeasureTrailingSpaces
+
+    def measure(char):
+        return graphics.MeasureString(char, font, 0, string_format).Width / REFERENCE_EM
+
+    return measure
+
+
+class GlyphWidthTable(object):
+    """
+    Таблица ширин символов одного шрифта.
+
+    Attributes:
+        advances (dict): {символ: ширина в долях em}.
+    """
+
+    def __init__(self, measure_char):
+        """
+        Args:
+            measure_char (callable): measure_char(char) -> ширина в долях em.
+        """
+        self.measure_char = measure_char
+        self.advances = {}
+
+    def Advance(self, char):
+        """
+        Возвращает ширину символа, измеряя его при первом обращении.
+
+        Args:
+            char (str): Символ.
+
+        Returns:
+            float: Ширина символа в долях em.
+        """
+        advance = self.advances.get(char)
+        if advance is None:
+            advance = self.advances[char] = self.measure_char(char)
+        return advance
+
+    def Width(self, text):
+        """
+        Returns:
+            float: Ширина строки в долях em.
+        """
+        return sum(self.Advance(char) for char in text)
+
+
+class TextWidthModel(object):
+    """
+    Ширина текста марки в мм листа.
+
+    Attributes:
+        font_name (str): Имя шрифта.
+        text_size_mm (float): Высота текста (em) на листе, мм.
+        hits (int): Попадания в кэш строк.
+        misses (int): Измеренные строки.
+    """
+
+    def __init__(self, font_name=DEFAULT_FONT_NAME, text_size_mm=DEFAULT_TEXT_SIZE_MM,
+                 measurer_factory=gdi_char_measurer):
+        """
+        Args:
+            font_name (str): Имя шрифта.
+            text_size_mm (float): Высота текста, мм.
+            measurer_factory (callable): factory(font_name) -> measure(char).
+        """
+        self.font_name = font_name
+        self.text_size_mm = text_size_mm
+        self.measurer_factory = measurer_factory
+        self._tables = {}
+        self._widths = {}
+        self.hits = 0
+        self.misses = 0
+
+    def Table(self, font_name):
+        """
+        Возвращает таблицу ширин символов шрифта, создавая её при первом обращении.
+
+        Args:
+            font_name (str): Имя шрифта.
+
+        Returns:
+            GlyphWidthTable: Таблица символов шрифта.
+        """
+        table = self._tables.get(font_name)
+        if table is None:
+            table = self._tables[font_name] = GlyphWidthTable(self.measurer_factory(font_name))
+        return table
+
+    def Width(self, text):
+        """
+        Возвращает ширину текста.
+
+        Args:
+            text (str): Текст.
+
+        Returns:
+            float: Ширина, мм.
+        """
+        key = (self.font_name, self.text_size_mm, text)
+        width = self._widths.get(key)
+        if width is None:
+            self.misses += 1
+            width = self._widths[key] = (
+                self.Table(self.font_name).Width(text) * self.text_size_mm
+            )
+        else:
+            self.hits += 1
+        return width
+
+    def Stats(self):
+        """
+        Returns:
+            str: Статистика кэша для отчёта.
+        """
+        return "строк {0}, повторов {1}, символов в таблице {2}".format(
+            self.misses, self.hits,
+            sum(len(table.advances) for table in self._tables.values()),
+        )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс списка видов для быстрого поиска по подстроке.
+
+Записи сортируются один раз при построении. Поиск по подстроке длиной от
+трёх символов сужается по индексу триграмм; при дописывании запроса
+фильтрация продолжается по предыдущему результату. Модуль не зависит от
+Revit API и WinForms.
+"""
+
+TRIGRAM = 3
+
+
+def _trigrams(text):
+    return set(text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1))
+
+
+class ViewIndex(object):
+    """
+    Отсортированный список видов с поиском и отметками.
+
+    Attributes:
+        labels (list): Отображаемые имена в порядке сортировки.
+        keys (list): Ключи записей (IntegerValue id видов) в том же порядке.
+        checked (set): Ключи отмеченных записей.
+        visible (list): Позиции записей, подходящих под текущий запрос.
+        query (str): Текущий запрос в нижнем регистре.
+    """
+
+    def __init__(self, entries):
+        """
+        Строит индекс.
+
+        Args:
+            entries (iterable): Пары (отображаемое имя, ключ).
+        """
+        entries = sorted(entries, key=lambda entry: entry[0].lower())
+        self.labels = [label for label, key in entries]
+        self.keys = [key for label, key in entries]
+        self._lower = [label.lower() for label in self.labels]
+        self._positions = dict((key, i) for i, key in enumerate(self.keys))
+        self._trigram_index = None
+        self.checked = set()
+        self.visible = list(range(len(self.labels)))
+        self.query = ""
+
+    def __len__(self):
+        return len(self.labels)
+
+    def TrigramIndex(self):
+        """
+        Возвращает индекс триграмм, строя его при первом обращении.
+
+        Returns:
+            dict: {триграмма: set(позиций)}.
+        """
+        if self._trigram_index is None:
+            index = {}
+            for position, label in enumerate(self._lower):
+                for trigram in _trigrams(label):
+                    index.setdefault(trigram, set()).add(position)
+            self._trigram_index = index
+        return self._trigram_index
+
+    def Candidates(self, query):
+        """
+        Возвращает позиции-кандидаты для запроса.
+
+        Args:
+            query (str): Запрос в нижнем регистре.
+
+        Returns:
+            list: Позиции по возрастанию.
+        """
+        if self.query and self.query in query:
+            # Запрос дописан: результат - подмножество предыдущего
+            return self.visible
+        if len(query) < TRIGRAM:
+            return range(len(self.labels))
+        index = self.TrigramIndex()
+        postings = []
+        for trigram in _trigrams(query):
+            positions = index.get(trigram)
+            if not positions:
+                return []
+            postings.append(positions)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for positions in postings[1:]:
+            result &= positions
+        return sorted(result)
+
+    def Filter(self, text):
+        """
+        Применяет запрос (поиск подстроки без учёта регистра).
+
+        Args:
+            text (str): Текст запроса.
+
+        Returns:
+            list: Позиции подходящих записей (self.visible).
+        """
+        query = (text or "").lower()
+        if query == self.query:
+            return self.visible
+        lower = self._lower
+        if query:
+            self.visible = [i for i in self.Candidates(query) if query in lower[i]]
+        else:
+            self.visible = list(range(len(self.labels)))
+        self.query = query
+        return self.visible
+
+    def Label(self, row):
+        """
+        Возвращает отображаемое имя записи текущего результата.
+
+        Args:
+            row (int): Номер строки в текущем результате (visible).
+
+        Returns:
+            str: Имя записи.
+        """
+        return self.labels[self.visible[row]]
+
+    def Key(self, row):
+        """
+        Возвращает ключ записи текущего результата.
+
+        Args:
+            row (int): Номер строки в текущем результате (visible).
+
+        Returns:
+            int: Ключ записи (IntegerValue id вида).
+        """
+        return self.keys[self.visible[row]]
+
+    def IsChecked(self, key):
+        """
+        Проверяет, отмечена ли запись.
+
+        Args:
+            key (int): Ключ записи.
+
+        Returns:
+            bool: True, если запись отмечена.
+        """
+        return key in self.checked
+
+    def SetChecked(self, key, checked):
+        """
+        Отмечает запись или снимает с неё отметку.
+
+        Args:
+            key (int): Ключ записи.
+            checked (bool): Отметить.
+        """
+        if checked:
+            self.checked.add(key)
+        else:
+            self.checked.discard(key)
+
+    def CheckVisible(self, checked):
+        """
+        Отмечает или снимает отметку со всех записей текущего результата.
+
+        Args:
+            checked (bool): Отметить.
+        """
+        keys = [self.keys[i] for i in self.visible]
+        if checked:
+            self.checked.update(keys)
+        else:
+            self.checked.difference_update(keys)
+
+    def CheckedKeys(self):
+        """
+        Возвращает отмеченные записи.
+
+        Returns:
+            list: Ключи отмеченных записей в порядке сортировки.
+        """
+        return sorted(self.checked, key=lambda key: self._positions.get(key, 0))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Виртуальный список видов с отметками и отложенным поиском.
+
+ListView в виртуальном режиме запрашивает только видимые строки, поэтому
+фильтрация списка из тысяч видов сводится к замене ViewIndex.visible и
+VirtualListSize. Поиск применяется после паузы в наборе текста.
+"""
+
+import clr
+
+clr.AddReference("System.Windows.Forms")
+
+from System.Windows.Forms import (
+    ColumnHeaderStyle,
+    Keys,
+    ListViewItem,
+    Timer,
+    View,
+)
+
+SEARCH_DELAY_MS = 250
+
+
+class VirtualViewList(object):
+    """
+    Связывает ListView с ViewIndex.
+
+    Attributes:
+        list_view (ListView): Список на форме.
+        index (ViewIndex): Индекс видов.
+        timer (Timer): Таймер отложенного поиска.
+    """
+
+    def __init__(self, list_view, index=None, delay_ms=SEARCH_DELAY_MS):
+        """
+        Настраивает ListView для виртуального режима.
+
+        Args:
+            list_view (ListView): Список на форме.
+            index (ViewIndex, optional): Индекс видов.
+            delay_ms (int): Пауза перед применением поиска, мс.
+        """
+        self.list_view = list_view
+        self.index = None
+        self.search_box = None
+
+        list_view.View = View.Details
+        # ColumnHeaderStyle.None недоступен как атрибут в синтаксисе Python
+        list_view.HeaderStyle = getattr(ColumnHeaderStyle, "None")
+        list_view.FullRowSelect = True
+        list_view.MultiSelect = False
+        list_view.CheckBoxes = True
+        list_view.VirtualMode = True
+        list_view.Columns.Add("", list_view.ClientSize.Width - 20)
+        list_view.RetrieveVirtualItem += self.OnRetrieveVirtualItem
+        list_view.MouseClick += self.OnMouseClick
+        list_view.KeyDown += self.OnKeyDown
+
+        self.timer = Timer()
+        self.timer.Interval = delay_ms
+        self.timer.Tick += self.OnTimerTick
+
+        if index is not None:
+            self.SetIndex(index)
+
+    def SetIndex(self, index):
+        """
+        Подключает новый индекс и показывает его текущий результат.
+
+        Args:
+            index (ViewIndex): Индекс видов.
+        """
+        self.index = index
+        self.Refresh()
+
+    def Refresh(self):
+        """
+        Обновляет количество строк и перерисовывает список.
+        """
+        count = len(self.index.visible) if self.index else 0
+        self.list_view.VirtualListSize = count
+        self.list_view.Invalidate()
+
+    def BindSearch(self, text_box):
+        """
+        Подключает поле поиска с отложенным применением запроса.
+
+        Args:
+            text_box (TextBox): Поле поиска.
+        """
+        self.search_box = text_box
+        text_box.TextChanged += self.OnSearchTextChanged
+
+    def ApplyFilter(self, text):
+        """
+        Немедленно применяет запрос.
+
+        Args:
+            text (str): Текст запроса.
+        """
+        self.timer.Stop()
+        if self.index is None:
+            return
+        self.index.Filter(text)
+        self.Refresh()
+
+    def CheckVisible(self, checked):
+        """
+        Отмечает или снимает отметку со всех видов текущего результата.
+
+        Args:
+            checked (bool): Отметить.
+        """
+        if self.index is None:
+            return
+        self.index.CheckVisible(checked)
+        self.list_view.Invalidate()
+
+    def Toggle(self, row):
+        """
+        Переключает отметку строки.
+
+        Args:
+            row (int): Номер строки в текущем результате.
+        """
+        key = self.index.Key(row)
+        self.index.SetChecked(key, not self.index.IsChecked(key))
+        self.list_view.RedrawItems(row, row, False)
+
+    def OnRetrieveVirtualItem(self, sender, args):
+        item = ListViewItem(self.index.Label(args.ItemIndex))
+        item.Checked = self.index.IsChecked(self.index.Key(args.ItemIndex))
+        args.Item = item
+
+    def OnMouseClick(self, sender, args):
+        # В виртуальном режиме ListView не меняет отметки сам
+        hit = self.list_view.HitTest(args.Location)
+        if hit.Item is not None:
+            self.Toggle(hit.Item.Index)
+
+    def OnKeyDown(self, sender, args):
+        if args.KeyCode == Keys.Space and self.list_view.SelectedIndices.Count:
+            self.Toggle(self.list_view.SelectedIndices[0])
+            args.Handled = True
+
+    def OnSearchTextChanged(self, sender, args):
+        self.timer.Stop()
+        self.timer.Start()
+
+    def OnTimerTick(self, sender, args):
+        self.ApplyFilter(self.search_box.Text if self.search_box else "")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Снимки свойств видов для списков выбора.
+
+Свойства 3D видов и планов читаются одним проходом коллектора и хранятся
+в компактных записях; живые объекты View не удерживаются. Документ
+запрашивается (GetElement) только для видов, выбранных пользователем.
+"""
+
+import clr
+
+from Autodesk.Revit.DB import (
+    ElementId,
+    ElementMulticlassFilter,
+    FilteredElementCollector,
+    View3D,
+    ViewPlan,
+)
+from System import Type
+from System.Collections.Generic import List
+
+KIND_3D = "3D"
+KIND_PLAN = "План"
+
+
+class ViewSnapshot(object):
+    """
+    Снимок свойств вида.
+
+    Attributes:
+        id (int): IntegerValue id вида.
+        name (str): Имя вида.
+        kind (str): "3D" или "План".
+        scale (int): Масштаб вида.
+        level (str): Имя уровня плана ("" для 3D видов).
+        printable (bool): Вид можно печатать (CanBePrinted).
+    """
+
+    __slots__ = ("id", "name", "kind", "scale", "level", "printable")
+
+    def __init__(self, id, name, kind, scale, level, printable):
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.scale = scale
+        self.level = level
+        self.printable = printable
+
+    def Label(self):
+        """
+        Returns:
+            str: Отображаемое имя "Имя [тип] (ID: id)".
+        """
+        return "{0} [{1}] (ID: {2})".format(self.name, self.kind, self.id)
+
+
+def collect_view_snapshots(doc, printable_only=True):
+    """
+    Собирает снимки 3D видов и планов (без шаблонов) одним коллектором.
+
+    Args:
+        doc (Document): Документ Revit.
+        printable_only (bool): Пропускать виды, которые нельзя печатать.
+
+    Returns:
+        list: Записи ViewSnapshot.
+    """
+    view_classes = List[Type]([clr.GetClrType(View3D), clr.GetClrType(ViewPlan)])
+    collector = (
+        FilteredElementCollector(doc)
+        .WherePasses(ElementMulticlassFilter(view_classes))
+        .WhereElementIsNotElementType()
+    )
+
+    snapshots = []
+    for view in collector:
+        if view.IsTemplate:
+            continue
+        printable = view.CanBePrinted
+        if printable_only and not printable:
+            continue
+        if isinstance(view, View3D):
+            kind, level = KIND_3D, ""
+        else:
+            kind = KIND_PLAN
+            gen_level = view.GenLevel
+            level = gen_level.Name if gen_level else ""
+        snapshots.append(
+            ViewSnapshot(view.Id.IntegerValue, view.Name or "", kind, view.Scale, level, printable)
+        )
+    return snapshots
+
+
+def get_views(doc, view_ids):
+    """
+    Возвращает объекты видов по id.
+
+    Args:
+        doc (Document): Документ Revit.
+        view_ids (iterable): IntegerValue id видов.
+
+    Returns:
+        list: Виды (несуществующие пропускаются).
+    """
+    views = []
+    for view_id in view_ids:
+        view = doc.GetElement(ElementId(view_id))
+        if view is not None:
+            views.append(view)
+    return views
@@ -58,6 +58,8 @@ from Autodesk.Revit.DB import (
     SubTransaction,
 )
 
+from progress_reporter import ProgressReporter, format_duration
+
 doc = __revit__.ActiveUIDocument.Document
 uidoc = __revit__.ActiveUIDocument
 app = doc.Application
@@ -1765,28 +1767,45 @@ def main():
     view_sizes = {}
     failed = []
     analysis_stats = {'times': []}
+    # Вид, который сейчас анализируется (для строки состояния)
+    current_view = [None]
+    
+    def on_analysis_progress(reporter):
+        # Сетка перестраивается целиком, поэтому обновляется не чаще
+        # интервала ProgressReporter (200 мс), а не на каждом виде
+        done = reporter.done
+        update_grid(progress_form, grid, all_selected, done, done)
+        pct_text = str(done * 90 // max(reporter.total, 1)) + "%"
+        if done < reporter.total and current_view[0] is not None:
+            stage_text = "Анализ: " + get_view_short_name(current_view[0].Name)
+        else:
+            stage_text = "Анализ завершён"
+        eta = reporter.Eta()
+        if done and done < reporter.total and eta is not None:
+            stage_text += " · {0:.1f} видов/с · осталось {1}".format(
+                reporter.Rate(), format_duration(eta))
+        update_progress_info(progress_form, stage, progress, pct, stage_text, pct_text)
+    
+    analysis_progress = ProgressReporter(len(selected_views), on_analysis_progress, unit="видов")
     
     analysis_t = Transaction(doc, "Analyze views")
     analysis_t.Start()
     
     try:
         for idx, v in enumerate(selected_views):
-            update_grid(progress_form, grid, all_selected, idx, idx)
-            pct_text = str(int((idx + 1) / len(selected_views) * 90)) + "%"
-            update_progress_info(progress_form, stage, progress, pct,
-                                 "Анализ: " + get_view_short_name(v.Name), pct_text)
+            current_view[0] = v
+            analysis_progress.Update(idx)
             
             log_message("  📐 Анализ: " + v.Name)
             size = measure_view_with_calibration(v, stats=analysis_stats)
             
             if size:
                 view_sizes[v.Id] = size
-                update_grid(progress_form, grid, all_selected, idx, idx + 1)
                 log_message("    ✅ " + str(int(size[0])) + "x" + str(int(size[1])) + " мм")
             else:
                 failed.append(v)
-                update_grid(progress_form, grid, all_selected, idx, idx + 1)
                 log_message("    ❌ Не удалось определить размер")
+        analysis_progress.Finish()
         
         analysis_t.RollBack()
     
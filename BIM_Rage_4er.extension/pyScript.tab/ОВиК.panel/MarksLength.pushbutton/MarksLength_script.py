@@ -15,8 +15,6 @@ clr.AddReference("RevitAPIUI")
 clr.AddReference("System.Windows.Forms")
 clr.AddReference("System.Drawing")
 
-import codecs
-import json
 import math
 import os
 import sys
@@ -24,9 +22,24 @@ import traceback
 
 from Autodesk.Revit.DB import *
 from System import Array, Decimal, Environment, Object
+from System.Collections.Generic import List
 from System.Drawing import *
 from System.Windows.Forms import *
 
+from param_access import ParameterValueCache
+from progress_reporter import ProgressReporter
+from shelf_symbols import ShelfSymbolIndex
+from tag_profiles import TagProfileStore, document_profile_key
+from text_width import (
+    DEFAULT_FONT_NAME,
+    DEFAULT_TEXT_SIZE_MM,
+    TextWidthModel,
+    is_font_installed,
+)
+from view_index import ViewIndex
+from view_list import VirtualViewList
+from view_snapshot import collect_view_snapshots, get_views
+
 # Логирование для pyRevit
 try:
     from pyrevit import script
@@ -40,6 +53,34 @@ except:
 
 MM_TO_FEET = 304.8
 DEFAULT_LENGTH_COEFFICIENT = 1.6  # Коэффициент расчёта длины полки
+SHELF_MARGIN_MM = 1  # Запас длины полки, мм
+
+# Категории марок, длина полки которых корректируется
+TAG_CATEGORY_IDS = set(
+    category.value__
+    for category in (
+        BuiltInCategory.OST_DuctTags,
+        BuiltInCategory.OST_DuctTerminalTags,
+        BuiltInCategory.OST_DuctAccessoryTags,
+        BuiltInCategory.OST_DuctInsulationsTags,
+        BuiltInCategory.OST_MechanicalEquipmentTags,
+    )
+)
+
+# Пакеты видов в порядке обработки
+VIEW_KEYS = ("3d", "plan")
+
+# Счётчики итогового отчёта: (ключ, подпись)
+REPORT_COUNTERS = [
+    ("total", "Всего марок"),
+    ("with_category", "С целевой категорией"),
+    ("with_elements", "С привязанными элементами"),
+    ("with_param", "С выбранным параметром"),
+    ("with_value", "С заполненным значением"),
+    ("changed", "Изменено марок"),
+    ("created", "Создано символов"),
+    ("groups", "Групп длины полки (подборов типоразмера)"),
+]
 
 
 class Settings(object):
@@ -55,6 +96,10 @@ class Settings(object):
         self.selected_parameters_3d = {}
         self.selected_parameters_plan = {}
         self.length_coefficient = DEFAULT_LENGTH_COEFFICIENT  # Коэффициент длины полки
+        # Расчёт по метрикам шрифта вместо числа символов
+        self.use_font_width = False
+        self.font_name = DEFAULT_FONT_NAME
+        self.text_size_mm = DEFAULT_TEXT_SIZE_MM
 
 
 class MainForm(Form):
@@ -64,10 +109,12 @@ class MainForm(Form):
         self.doc = doc
         self.uidoc = uidoc
         self.settings = Settings()
-        self.all_views_dict = {}
-        self.views_dict = {}
-        self.lstViewsChecked = {}
+        self.view_snapshots = {}  # {IntegerValue id вида: ViewSnapshot}
         self.category_mapping = {}
+        self.symbol_index = None  # ShelfSymbolIndex текущего запуска
+        self.width_model = None  # TextWidthModel текущего запуска
+        self.values = None  # ParameterValueCache текущего запуска
+        self.progress_stage = ""  # Этап для строки прогресса
 
         self.LoadTagDefaults()
 
@@ -136,10 +183,9 @@ class MainForm(Form):
             self.btnSelectAll,
             self.btnDeselectAll,
             self.CreateControl(
-                CheckedListBox,
+                ListView,
                 Location=Point(10, 65),
                 Size=Size(600, 360),
-                CheckOnClick=True,
             ),
             self.CreateControl(Button, Text="Далее →", Location=Point(600, 440)),
         ]
@@ -150,7 +196,8 @@ class MainForm(Form):
         self.btnNext1.Click += self.OnNext1Click
         for c in controls:
             tab.Controls.Add(c)
-        self.txtSearchViews.TextChanged += self.OnSearchViewsTextChanged
+        self.view_list = VirtualViewList(self.lstViews)
+        self.view_list.BindSearch(self.txtSearchViews)
 
         if PYREVIT_AVAILABLE:
             logger.debug("Вкладка 1 (Виды) настроена")
@@ -195,6 +242,39 @@ class MainForm(Form):
             ForeColor=Color.Gray
         )
         tab.Controls.Add(lblCoefficientHint)
+        self.lblCoefficientHint = lblCoefficientHint
+
+        # Расчёт по ширине текста в шрифте марки
+        self.chkFontWidth = self.CreateControl(
+            CheckBox,
+            Text="По шрифту",
+            Location=Point(470, 38),
+            Size=Size(80, 22),
+            Checked=self.settings.use_font_width
+        )
+        self.chkFontWidth.CheckedChanged += self.OnFontWidthCheckedChanged
+        tab.Controls.Add(self.chkFontWidth)
+
+        self.txtFontName = self.CreateControl(
+            TextBox,
+            Text=self.settings.font_name,
+            Location=Point(550, 40),
+            Size=Size(95, 20)
+        )
+        tab.Controls.Add(self.txtFontName)
+
+        self.numTextSize = self.CreateControl(
+            NumericUpDown,
+            Location=Point(650, 40),
+            Size=Size(55, 20),
+            Minimum=0.5,
+            Maximum=20.0,
+            Increment=0.5,
+            DecimalPlaces=1,
+            Value=self.settings.text_size_mm
+        )
+        tab.Controls.Add(self.numTextSize)
+        self.OnFontWidthCheckedChanged(None, None)
 
         # Раздельные таблицы для 3D и планов
         lbl3D = self.CreateControl(
@@ -281,6 +361,9 @@ class MainForm(Form):
             Maximum=100,
             Value=0,
         )
+        self.lblProgress = self.CreateControl(
+            Label, Text="", Location=Point(10, 35), Size=Size(700, 20)
+        )
         controls = [
             self.CreateControl(
                 Label,
@@ -288,6 +371,7 @@ class MainForm(Form):
                 Location=Point(10, 10),
                 Size=Size(400, 20),
             ),
+            self.lblProgress,
             self.txtResults,
             self.progressBar,
             self.CreateControl(
@@ -304,9 +388,9 @@ class MainForm(Form):
             ),
         ]
         self.btnBack3, self.btnFinish, self.btnExecute = (
-            controls[3],
             controls[4],
             controls[5],
+            controls[6],
         )
         self.btnBack3.Click += self.OnBack3Click
         self.btnFinish.Click += self.OnFinishClick
@@ -320,48 +404,19 @@ class MainForm(Form):
     def LoadAllViews(self):
         """Загружает список всех видов (3D и планы) с сортировкой по имени."""
         try:
-            self.lstViews.Items.Clear()
-            self.all_views_dict.clear()
-            self.views_dict.clear()
-            self.lstViewsChecked.clear()
-
-            # Собираем 3D виды
-            views_3d = (
-                FilteredElementCollector(self.doc)
-                .OfClass(View3D)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-
-            # Собираем планы этажей
-            views_plan = (
-                FilteredElementCollector(self.doc)
-                .OfClass(ViewPlan)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
+            self.view_snapshots.clear()
 
-            all_views = list(views_3d) + list(views_plan)
+            # Снимки видов собираются одним проходом, объекты видов не хранятся
+            entries = []
+            for snapshot in collect_view_snapshots(self.doc):
+                self.view_snapshots[snapshot.id] = snapshot
+                entries.append((snapshot.Label(), snapshot.id))
 
-            # Сортируем виды по имени
-            all_views_sorted = sorted(all_views, key=lambda v: v.Name or "")
-
-            for view in all_views_sorted:
-                if not view.IsTemplate and view.CanBePrinted:
-                    # Определяем тип вида
-                    view_type = "3D" if isinstance(view, View3D) else "План"
-                    name = "{0} [{1}] (ID: {2})".format(
-                        view.Name,
-                        view_type,
-                        str(view.Id.IntegerValue)
-                    )
-                    self.all_views_dict[name] = view
-                    self.lstViewsChecked[name] = False
-
-            self.UpdateViewsList("")  # Показать все
+            # Индекс сортируется один раз при построении
+            self.view_list.SetIndex(ViewIndex(entries))
 
             if PYREVIT_AVAILABLE:
-                logger.info("Загружено {} видов (3D + планы)".format(len(self.all_views_dict)))
+                logger.info("Загружено {} видов (3D + планы)".format(len(self.view_snapshots)))
         except Exception as e:
             if PYREVIT_AVAILABLE:
                 logger.error("Ошибка при загрузке видов: {}".format(str(e)))
@@ -369,36 +424,16 @@ class MainForm(Form):
                 print("Ошибка при загрузке видов: {}".format(str(e)))
 
     def UpdateViewsList(self, filter_text):
-        """Обновляет список видов с фильтром и сортировкой."""
-        self.lstViews.Items.Clear()
-        self.views_dict.clear()
-        filter_lower = filter_text.lower()
-
-        # Сортируем виды по имени перед добавлением
-        sorted_views = sorted(
-            self.all_views_dict.items(),
-            key=lambda x: x[0].lower()  # Сортировка по имени вида
-        )
-
-        for name, view in sorted_views:
-            if filter_lower in name.lower():
-                self.lstViews.Items.Add(name, self.lstViewsChecked.get(name, False))
-                self.views_dict[name] = view
+        """Применяет фильтр к списку видов."""
+        self.view_list.ApplyFilter(filter_text)
 
     def OnToggleViews(self, checked):
-        for i in range(self.lstViews.Items.Count):
-            self.lstViews.SetItemChecked(i, checked)
-
-    def OnSearchViewsTextChanged(self, sender, args):
-        self.UpdateViewsList(sender.Text)
+        self.view_list.CheckVisible(checked)
 
     def OnNext1Click(self, sender, args):
-        self.settings.selected_views = []
-        for i in range(self.lstViews.Items.Count):
-            if self.lstViews.GetItemChecked(i):
-                self.settings.selected_views.append(
-                    self.all_views_dict[self.lstViews.Items[i]]
-                )
+        self.settings.selected_views = get_views(
+            self.doc, self.view_list.index.CheckedKeys()
+        )
         if not self.settings.selected_views:
             MessageBox.Show("Выберите хотя бы один вид!")
             return
@@ -414,9 +449,24 @@ class MainForm(Form):
         self.tabControl.SelectedIndex = 0
         self.tabControl.Selecting += self.OnTabSelecting
 
+    def OnFontWidthCheckedChanged(self, sender, args):
+        """Переключает подсказку и поля шрифта при смене модели ширины текста."""
+        use_font = self.chkFontWidth.Checked
+        self.txtFontName.Enabled = use_font
+        self.numTextSize.Enabled = use_font
+        self.numCoefficient.Enabled = not use_font
+        self.lblCoefficientHint.Text = (
+            "Длина = ширина текста + 1 мм" if use_font else "Длина = символы × коэф. + 1 мм"
+        )
+
     def OnNext2Click(self, sender, args):
-        # Сохраняем коэффициент длины полки
+        # Сохраняем коэффициент длины полки и модель ширины текста
         self.settings.length_coefficient = float(self.numCoefficient.Value)
+        self.settings.use_font_width = self.chkFontWidth.Checked
+        self.settings.font_name = self.txtFontName.Text.strip() or DEFAULT_FONT_NAME
+        self.settings.text_size_mm = float(self.numTextSize.Value)
+        if self.settings.use_font_width and not self.CheckFontInstalled(self.settings.font_name):
+            return
         
         # Проверяем, что выбраны параметры
         has_3d_params = any(p for p in self.settings.selected_parameters_3d.values() if p)
@@ -433,6 +483,40 @@ class MainForm(Form):
         self.tabControl.SelectedIndex = 2
         self.tabControl.Selecting += self.OnTabSelecting
 
+    def CheckFontInstalled(self, font_name):
+        """
+        Предупреждает, если шрифт модели ширины текста не установлен.
+
+        GDI+ измеряет неустановленный шрифт по шрифту-заменителю, и длины
+        полок получаются неверными; пользователь решает, продолжать ли.
+
+        Args:
+            font_name (str): Имя шрифта из поля txtFontName.
+
+        Returns:
+            bool: True, если шрифт установлен или пользователь согласился
+                продолжить с шрифтом-заменителем.
+        """
+        try:
+            if is_font_installed(font_name):
+                return True
+        except Exception as e:
+            if PYREVIT_AVAILABLE:
+                logger.warning("Не удалось получить список шрифтов: {}".format(e))
+            return True
+
+        if PYREVIT_AVAILABLE:
+            logger.warning("Шрифт '{}' не установлен в системе".format(font_name))
+        answer = MessageBox.Show(
+            "Шрифт '{}' не установлен в системе. Ширина текста будет измерена по "
+            "шрифту-заменителю, и длины полок могут не совпасть с марками.\n\n"
+            "Продолжить?".format(font_name),
+            "Шрифт не найден",
+            MessageBoxButtons.YesNo,
+            MessageBoxIcon.Warning,
+        )
+        return answer == DialogResult.Yes
+
     def OnBack2Click(self, sender, args):
         self.tabControl.Selecting -= self.OnTabSelecting
         self.tabControl.SelectedIndex = 1
@@ -684,6 +768,40 @@ class MainForm(Form):
                 logger.error(error_msg)
             MessageBox.Show(error_msg)
 
+    def CheckFontInstalled(self, font_name):
+        """
+        Предупреждает, если шрифт модели ширины текста не установлен.
+
+        GDI+ измеряет неустановленный шрифт по шрифту-заменителю, и длины
+        полок получаются неверными; пользователь решает, продолжать ли.
+
+        Args:
+            font_name (str): Имя шрифта из поля txtFontName.
+
+        Returns:
+            bool: True, если шрифт установлен или пользователь согласился
+                продолжить с шрифтом-заменителем.
+        """
+        try:
+            if is_font_installed(font_name):
+                return True
+        except Exception as e:
+            if PYREVIT_AVAILABLE:
+                logger.warning("Не удалось получить список шрифтов: {}".format(e))
+            return True
+
+        if PYREVIT_AVAILABLE:
+            logger.warning("Шрифт '{}' не установлен в системе".format(font_name))
+        answer = MessageBox.Show(
+            "Шрифт '{}' не установлен в системе. Ширина текста будет измерена по "
+            "шрифту-заменителю, и длины полок могут не совпасть с марками.\n\n"
+            "Продолжить?".format(font_name),
+            "Шрифт не найден",
+            MessageBoxButtons.YesNo,
+            MessageBoxIcon.Warning,
+        )
+        return answer == DialogResult.Yes
+
     def OnBack2Click(self, sender, args):
         self.tabControl.Selecting -= self.OnTabSelecting
         self.tabControl.SelectedIndex = 1
@@ -700,133 +818,65 @@ class MainForm(Form):
         self.Close()
 
     def LoadTagDefaults(self):
-        """Загружает сохраненные настройки из файла (коэффициент и параметры для 3D/планов)."""
-        self.tag_defaults = {}
+        """Загружает профиль текущего документа из файла (коэффициент и параметры для 3D/планов)."""
         script_dir = os.path.dirname(__file__)
         defaults_path = os.path.join(script_dir, "tag_defaults.json")
-        if os.path.exists(defaults_path):
-            try:
-                with codecs.open(defaults_path, "r", encoding="utf-8") as f:
-                    self.tag_defaults = json.load(f)
-                
-                # Загружаем коэффициент
-                if "length_coefficient" in self.tag_defaults:
-                    self.settings.length_coefficient = self.tag_defaults.get("length_coefficient", DEFAULT_LENGTH_COEFFICIENT)
-                
-                # Загружаем параметры для 3D
-                for cat_name, cat_data in self.tag_defaults.items():
-                    if isinstance(cat_data, dict) and "param_3d" in cat_data:
-                        # Найти категорию по имени
-                        for cat in self.settings.selected_categories:
-                            if self.GetCategoryName(cat) == cat_name:
-                                self.settings.selected_parameters_3d[cat.Id.IntegerValue] = cat_data["param_3d"]
-                
-                # Загружаем параметры для планов
-                for cat_name, cat_data in self.tag_defaults.items():
-                    if isinstance(cat_data, dict) and "param_plan" in cat_data:
-                        for cat in self.settings.selected_categories:
-                            if self.GetCategoryName(cat) == cat_name:
-                                self.settings.selected_parameters_plan[cat.Id.IntegerValue] = cat_data["param_plan"]
-                
-                if PYREVIT_AVAILABLE:
-                    logger.info("Загружены настройки из {}".format(defaults_path))
-                    logger.info("Коэффициент длины полки: {}".format(self.settings.length_coefficient))
-            except Exception as e:
-                if PYREVIT_AVAILABLE:
-                    logger.warning("Не удалось загрузить настройки: {}".format(str(e)))
-        else:
-            if PYREVIT_AVAILABLE:
-                logger.info("Файл настроек не найден, будут использованы значения по умолчанию")
+        self.tag_profiles = TagProfileStore.Load(defaults_path)
+        if self.tag_profiles.error and PYREVIT_AVAILABLE:
+            logger.warning("Не удалось загрузить настройки: {}".format(self.tag_profiles.error))
+
+        profile = self.tag_profiles.Profile(document_profile_key(self.doc), self.doc.Title)
+        self.tag_defaults = profile["categories"]
+        self.profile_settings = profile["settings"]
+
+        # Загружаем коэффициент
+        self.settings.length_coefficient = self.profile_settings.get(
+            "length_coefficient", DEFAULT_LENGTH_COEFFICIENT
+        )
+        self.settings.use_font_width = self.profile_settings.get("use_font_width", False)
+        self.settings.font_name = self.profile_settings.get("font_name", DEFAULT_FONT_NAME)
+        self.settings.text_size_mm = self.profile_settings.get(
+            "text_size_mm", DEFAULT_TEXT_SIZE_MM
+        )
+
+        # Загружаем параметры для 3D и планов
+        for cat_name, cat_data in self.tag_defaults.items():
+            for cat in self.settings.selected_categories:
+                if self.GetCategoryName(cat) != cat_name:
+                    continue
+                if "param_3d" in cat_data:
+                    self.settings.selected_parameters_3d[cat.Id.IntegerValue] = cat_data["param_3d"]
+                if "param_plan" in cat_data:
+                    self.settings.selected_parameters_plan[cat.Id.IntegerValue] = cat_data["param_plan"]
+
+        if PYREVIT_AVAILABLE:
+            logger.info("Загружены настройки из {}".format(defaults_path))
+            logger.info("Коэффициент длины полки: {}".format(self.settings.length_coefficient))
 
     def SaveTagDefaults(self):
-        """Сохраняет настройки в файл (коэффициент и параметры для 3D/планов)."""
-        script_dir = os.path.dirname(__file__)
-        defaults_path = os.path.join(script_dir, "tag_defaults.json")
-        
+        """Сохраняет профиль текущего документа (коэффициент и параметры для 3D/планов)."""
         # Сохраняем коэффициент
-        self.tag_defaults["length_coefficient"] = self.settings.length_coefficient
-        
+        self.profile_settings["length_coefficient"] = self.settings.length_coefficient
+        self.profile_settings["use_font_width"] = self.settings.use_font_width
+        self.profile_settings["font_name"] = self.settings.font_name
+        self.profile_settings["text_size_mm"] = self.settings.text_size_mm
+
         try:
-            with codecs.open(defaults_path, "w", encoding="utf-8") as f:
-                json.dump(self.tag_defaults, f, indent=4, ensure_ascii=False)
-            if PYREVIT_AVAILABLE:
-                logger.debug("Настройки сохранены в {}".format(defaults_path))
+            if self.tag_profiles.Save(document_profile_key(self.doc)):
+                if PYREVIT_AVAILABLE:
+                    logger.debug("Настройки сохранены в {}".format(self.tag_profiles.path))
         except Exception as e:
             if PYREVIT_AVAILABLE:
                 logger.error("Ошибка при сохранении настроек: {}".format(str(e)))
 
     def generate_new_name_and_num(self, tag_type, required_length):
-        """Генерирует новое имя для типоразмера на основе длины полки."""
-        name_param = tag_type.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM)
-        if name_param and name_param.HasValue:
-            symbol_name = name_param.AsString()
-        else:
-            symbol_name = tag_type.Name
-
-        # Извлекаем префикс - всё до ПОСЛЕДНЕГО подчёркивания с цифрой
-        # Примеры:
-        # "Размер / Расход_11" → "Размер / Расход"
-        # "Размер_13" → "Размер"
-        # "Марка_8" → "Марка"
-        prefix = symbol_name
-        
-        # Ищем последнее подчёркивание с цифрами после него
-        parts = symbol_name.rsplit("_", 1)
-        if len(parts) > 1:
-            # Проверяем, что после подчёркивания цифры
-            try:
-                int(parts[1])
-                prefix = parts[0]  # Берём часть до последнего "_"
-            except ValueError:
-                pass  # Если после "_" не цифры, оставляем как есть
-
-        family = tag_type.Family
-        existing_names = set()
-        symbol_ids = family.GetFamilySymbolIds()
-        for symbol_id in symbol_ids:
-            symbol = self.doc.GetElement(symbol_id)
-            if symbol:
-                name_param = symbol.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM)
-                if name_param and name_param.HasValue:
-                    name = name_param.AsString()
-                else:
-                    name = symbol.Name
-                existing_names.add(name)
-
-        target_name = "{}_{}".format(prefix, int(required_length))
-        # Проверить, существует ли символ с target_name и подходящей длиной
-        for symbol_id in symbol_ids:
-            symbol = self.doc.GetElement(symbol_id)
-            if (
-                symbol
-                and symbol.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM).AsString()
-                == target_name
-            ):
-                # Проверить длину полки
-                shelf_param_names = [
-                    "Длина полки",
-                    "Shelf Length",
-                    "Length",
-                    "Длина",
-                ]
-                for param_name in shelf_param_names:
-                    shelf_param = symbol.LookupParameter(param_name)
-                    if (
-                        shelf_param
-                        and shelf_param.HasValue
-                        and shelf_param.StorageType == StorageType.Double
-                    ):
-                        current_length = shelf_param.AsDouble() * 304.8  # в мм
-                        if abs(current_length - required_length) < 1:
-                            return target_name, int(required_length), symbol.Id
-
-        # Если не найден подходящий, создать новый уникальный
-        num = int(required_length)
-        while True:
-            new_name = "{}_{}".format(prefix, num)
-            if new_name not in existing_names:
-                return new_name, num, None
-            num += 1  # Инкремент в случае конфликта
+        """
+        Генерирует новое имя для типоразмера на основе длины полки.
+
+        Префикс - всё до последнего подчёркивания с числом ("Размер / Расход_11"
+        → "Размер / Расход"). Типоразмеры семейства берутся из индекса запуска.
+        """
+        return self.symbol_index.NewNameAndNum(tag_type, required_length)
 
     # Анализ и корректировка
     def OnExecuteClick(self, sender, args):
@@ -839,27 +889,15 @@ class MainForm(Form):
             print("=" * 80)
             print("НАЧАЛО ВЫПОЛНЕНИЯ КОРРЕКТИРОВКИ МАРОК")
             print("=" * 80)
-            
-        tag_categories = [
-            BuiltInCategory.OST_DuctTags,
-            BuiltInCategory.OST_DuctTerminalTags,
-            BuiltInCategory.OST_DuctAccessoryTags,
-            BuiltInCategory.OST_DuctInsulationsTags,
-            BuiltInCategory.OST_MechanicalEquipmentTags,
-        ]
 
         results = []
-        total_tags_all = 0
-        tags_with_category = 0
-        tags_with_elements = 0
-        tags_with_param = 0
-        tags_with_value = 0
-        changed_tags = 0
-        created_symbols = {}
-        actual_category_ids = set()
-
-        # Кэширование маркеров для производительности
-        all_tags = []
+        stats = dict((key, 0) for key, label in REPORT_COUNTERS)
+        # Группы планирования: (id семейства, тип вида, длина) → [базовый типоразмер, марки]
+        groups = {}
+
+        # Марки собираются по видам; тип вида (3D или План) определяется один раз на вид
+        view_batches = dict((view_key, []) for view_key in VIEW_KEYS)
+        total_tags = 0
         for view in self.settings.selected_views:
             if PYREVIT_AVAILABLE:
                 logger.info("Сбор марок для вида: {}".format(view.Name))
@@ -867,207 +905,104 @@ class MainForm(Form):
                 IndependentTag
             )
             tags_in_view = collector.ToElements()
-            all_tags.extend(tags_in_view)
+            view_key = "3d" if isinstance(view, View3D) else "plan"
+            view_batches[view_key].append((view, tags_in_view))
+            total_tags += len(tags_in_view)
             if PYREVIT_AVAILABLE:
                 logger.debug("Вид {}: найдено {} марок".format(view.Name, len(tags_in_view)))
 
-        # Инициализация прогресса
+        # Инициализация прогресса (обновление UI не чаще раза в 200 мс)
         self.progressBar.Value = 0
-        processed_tags = 0
-        total_tags_estimated = len(all_tags) or 1
-        
+        self.progress_stage = "Анализ марок"
+        progress = ProgressReporter(total_tags, self.OnProgressReport, unit="марок")
+
+        if PYREVIT_AVAILABLE:
+            logger.info("Всего марок для обработки: {}".format(total_tags))
+
+        # Индекс типоразмеров семейств марок, общий для всего запуска
+        self.symbol_index = ShelfSymbolIndex(self.doc)
+        # Значения параметров: один элемент часто замаркирован на нескольких видах
+        self.values = ParameterValueCache(self.doc)
+        self.width_model = None
+        if self.settings.use_font_width:
+            self.width_model = TextWidthModel(
+                self.settings.font_name, self.settings.text_size_mm
+            )
+
+        # Планирование: требуемая длина полки для каждой марки, пакетами по типу вида
+        for view_key in VIEW_KEYS:
+            for view, tags_in_view in view_batches[view_key]:
+                for tag in tags_in_view:
+                    progress.Step()
+                    try:
+                        planned = self.PlanTag(tag, stats)
+                        if planned:
+                            base_symbol, required_length = planned
+                            group_key = (
+                                base_symbol.Family.Id.IntegerValue, view_key, required_length
+                            )
+                            group = groups.get(group_key)
+                            if group is None:
+                                groups[group_key] = group = [base_symbol, []]
+                            group[1].append(tag)
+                    except Exception as tag_error:
+                        error_msg = "Ошибка при обработке марки ID {}: {}".format(tag.Id, str(tag_error))
+                        if PYREVIT_AVAILABLE:
+                            logger.error(error_msg)
+                            logger.error(traceback.format_exc())
+                        else:
+                            print(error_msg)
+                        results.append(error_msg)
+        progress.Finish()
+
+        planned_tags = sum(len(group[1]) for group in groups.values())
         if PYREVIT_AVAILABLE:
-            logger.info("Всего марок для обработки: {}".format(len(all_tags)))
+            logger.info("Запланировано марок: {}, групп длины полки: {}".format(planned_tags, len(groups)))
+
+        # Прогресс изменения типоразмеров (Duplicate/ChangeTypeId - самая долгая часть)
+        self.progress_stage = "Изменение типоразмеров"
+        progress = ProgressReporter(planned_tags, self.OnProgressReport, unit="марок")
 
         trans = Transaction(self.doc, "Корректировка типоразмеров марок")
         try:
             trans.Start()
-            
-            for tag in all_tags:
-                try:
-                    total_tags_all += 1
-                    
-                    # Обновление прогресса
-                    processed_tags += 1
-                    progress = int(processed_tags * 100 / total_tags_estimated)
-                    if progress > 100:
-                        progress = 100
-                    self.progressBar.Value = progress
-                    
-                    # Периодическое логирование прогресса
-                    if processed_tags % 50 == 0 and PYREVIT_AVAILABLE:
-                        logger.debug("Обработано {}/{} марок ({}%)".format(processed_tags, len(all_tags), progress))
 
-                    if tag.Category:
-                        actual_category_ids.add(tag.Category.Id.IntegerValue)
-                    else:
-                        if PYREVIT_AVAILABLE:
-                            logger.debug("Марка ID {}: нет категории, пропускаем".format(tag.Id))
-                        continue
-                        
-                    if tag.Category and tag.Category.Id.IntegerValue in [
-                        c.value__ for c in tag_categories
-                    ]:
-                        tags_with_category += 1
-                        tagged_elements = tag.GetTaggedLocalElements()
-                        if tagged_elements:
-                            tags_with_elements += 1
-                            element = tagged_elements[0]
-                            category = element.Category
-                            param_name = self.settings.selected_parameters.get(
-                                category.Id.IntegerValue
-                            )
-                            if param_name:
-                                tags_with_param += 1
-                                # Проверка instance или type параметра
-                                param = element.LookupParameter(param_name)
-                                if not param:
-                                    # Проверить type parameter
-                                    type_elem = self.doc.GetElement(element.GetTypeId())
-                                    if type_elem:
-                                        param = type_elem.LookupParameter(param_name)
-                                if param:
-                                    if param and param.HasValue:
-                                        tags_with_value += 1
-                                        value = param.AsValueString()
-                                        if value is None:
-                                            value = ""
-                                        char_count = len(value)
-                                        required_length = math.ceil(char_count * self.settings.length_coefficient + 1)
-                                        
-                                        if PYREVIT_AVAILABLE:
-                                            logger.debug("Марка ID {}: значение '{}', символов: {}, требуемая длина: {}мм".format(tag.Id, value, char_count, required_length))
-
-                                        # Получить базовый символ марки
-                                        base_symbol = self.doc.GetElement(tag.GetTypeId())
-                                        if not isinstance(base_symbol, FamilySymbol):
-                                            if PYREVIT_AVAILABLE:
-                                                logger.warning("Марка ID {}: не является семейством, пропускаем".format(tag.Id))
-                                            continue
-                                        try:
-                                            if not base_symbol.Family:
-                                                if PYREVIT_AVAILABLE:
-                                                    logger.warning("Марка ID {}: нет семейства, пропускаем".format(tag.Id))
-                                                continue
-                                        except Exception as fam_e:
-                                            if PYREVIT_AVAILABLE:
-                                                logger.warning("Марка ID {}: ошибка при получении семейства: {}".format(tag.Id, str(fam_e)))
-                                            continue
-
-                                        family_id = base_symbol.Family.Id.IntegerValue
-                                        
-                                        # Определяем тип вида (3D или План)
-                                        view = tag.Document.GetElement(tag.OwnerViewId)
-                                        is_3d_view = isinstance(view, View3D) if view else False
-                                        view_key = "3d" if is_3d_view else "plan"
-
-                                        # Инициализировать словарь для семейства + типа вида
-                                        cache_key = (family_id, view_key)
-                                        if cache_key not in created_symbols:
-                                            created_symbols[cache_key] = {}
-
-                                        # Создать новый символ, если нужен
-                                        if (
-                                            required_length
-                                            not in created_symbols[cache_key]
-                                        ):
-                                            new_name, shelf_num, existing_id = (
-                                                self.generate_new_name_and_num(
-                                                    base_symbol, required_length
-                                                )
-                                            )
-
-                                            if existing_id is not None:
-                                                # Использовать существующий символ
-                                                new_symbol = self.doc.GetElement(
-                                                    existing_id
-                                                )
-                                                created_symbols[cache_key][
-                                                    required_length
-                                                ] = new_symbol
-                                                if PYREVIT_AVAILABLE:
-                                                    logger.info("Найден существующий символ: {} (длина {}мм) для семейства ID {} ({})".format(new_name, required_length, family_id, view_key))
-                                            else:
-                                                # Создать новый символ
-                                                new_symbol = base_symbol.Duplicate(new_name)
-                                                # Установить "Длина полки"
-                                                shelf_param_names = [
-                                                    "Длина полки",
-                                                    "Shelf Length",
-                                                    "Length",
-                                                    "Длина",
-                                                ]
-                                                shelf_set = False
-                                                for param_name_shelf in shelf_param_names:
-                                                    shelf_param = (
-                                                        new_symbol.LookupParameter(
-                                                            param_name_shelf
-                                                        )
-                                                    )
-                                                    if (
-                                                        shelf_param
-                                                        and not shelf_param.IsReadOnly
-                                                        and shelf_param.StorageType
-                                                        == StorageType.Double
-                                                    ):
-                                                        shelf_param.Set(
-                                                            required_length / 304.8
-                                                        )
-                                                        shelf_set = True
-                                                        if PYREVIT_AVAILABLE:
-                                                            logger.debug("Установлена длина полки {}мм для символа {}".format(required_length, new_name))
-                                                        break
-                                                if not shelf_set:
-                                                    if PYREVIT_AVAILABLE:
-                                                        logger.warning("Не найдено параметра для установки длины полки в символе {}".format(new_name))
-                                                created_symbols[cache_key][
-                                                    required_length
-                                                ] = new_symbol
-
-                                        # Назначить новый символ марке
-                                        new_symbol = created_symbols[cache_key][
-                                            required_length
-                                        ]
-                                        if tag.GetTypeId() != new_symbol.Id:
-                                            tag.ChangeTypeId(new_symbol.Id)
-                                            changed_tags += 1
-                                            if PYREVIT_AVAILABLE:
-                                                logger.debug("Марка ID {}: изменен тип на {}".format(tag.Id, new_symbol.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM).AsString()))
-
-                                        results.append(
-                                            "Марка ID {}: присвоен тип '{}' с длиной полки {}мм".format(
-                                                tag.Id, new_name, required_length
-                                            )
-                                        )
-                                    else:
-                                        if PYREVIT_AVAILABLE:
-                                            logger.debug("Марка ID {}: параметр '{}' не имеет значения".format(tag.Id, param_name))
-                                else:
-                                    if PYREVIT_AVAILABLE:
-                                        logger.debug("Марка ID {}: параметр '{}' не найден".format(tag.Id, param_name))
-                            else:
-                                if PYREVIT_AVAILABLE:
-                                    logger.debug("Марка ID {}: нет выбранного параметра для категории {}".format(tag.Id, category.Name if category else 'Unknown'))
-                        else:
-                            if PYREVIT_AVAILABLE:
-                                logger.debug("Марка ID {}: нет привязанных элементов".format(tag.Id))
-                    else:
-                        if PYREVIT_AVAILABLE:
-                            logger.debug("Марка ID {}: категория {} не в списке целевых".format(tag.Id, tag.Category.Name if tag.Category else 'Unknown'))
-
-                except Exception as tag_error:
-                    error_msg = "Ошибка при обработке марки ID {}: {}".format(tag.Id, str(tag_error))
+            # Каждая группа разрешается в типоразмер один раз и назначается всем её маркам
+            for group_key in sorted(groups):
+                base_symbol, tags = groups[group_key]
+                family_id, view_key, required_length = group_key
+                try:
+                    new_symbol, new_name = self.ResolveShelfSymbol(
+                        base_symbol, required_length, stats
+                    )
+                    if PYREVIT_AVAILABLE:
+                        logger.debug("Семейство ID {} ({}), {}мм: '{}', марок {}".format(
+                            family_id, view_key, required_length, new_name, len(tags)))
+                except Exception as group_error:
+                    error_msg = "Ошибка подбора типоразмера (семейство ID {}, {}мм): {}".format(
+                        family_id, required_length, str(group_error))
                     if PYREVIT_AVAILABLE:
                         logger.error(error_msg)
                         logger.error(traceback.format_exc())
-                    else:
-                        print(error_msg)
                     results.append(error_msg)
+                    progress.Step(len(tags))
+                    continue
+
+                retype = [tag for tag in tags if tag.GetTypeId() != new_symbol.Id]
+                changed = self.ChangeTagTypes(retype, new_symbol, results)
+                stats["changed"] += len(changed)
+                for tag in changed:
+                    results.append(
+                        "Марка ID {}: присвоен тип '{}' с длиной полки {}мм".format(
+                            tag.Id, new_name, required_length
+                        )
+                    )
+                progress.Step(len(tags))
 
             trans.Commit()
             if PYREVIT_AVAILABLE:
                 logger.info("Транзакция успешно завершена")
-                
+
         except Exception as e:
             error_msg = "Критическая ошибка: {}".format(str(e))
             if PYREVIT_AVAILABLE:
@@ -1082,60 +1017,214 @@ class MainForm(Form):
                     logger.warning("Транзакция отменена")
         finally:
             trans.Dispose()
+            progress.Finish()
+
+        # Типоразмер подбирается один раз на группу, а не на каждую марку
+        stats["groups"] = len(groups)
 
         # Формирование итогового отчета
-        lines = [
-            "=" * 60,
-            "ИТОГОВЫЙ ОТЧЕТ ОБ ОБРАБОТКЕ",
-            "=" * 60,
-            "Всего марок: {}".format(total_tags_all),
-            "С целевой категорией: {}".format(tags_with_category),
-            "С привязанными элементами: {}".format(tags_with_elements),
-            "С выбранным параметром: {}".format(tags_with_param),
-            "С заполненным значением: {}".format(tags_with_value),
-            "Изменено марок: {}".format(changed_tags),
-            "Создано символов: {}".format(sum(len(symbols) for symbols in created_symbols.values())),
-            "=" * 60,
-            "ДЕТАЛЬНЫЙ ЛОГ:"
-        ]
-        
+        summary = ["{}: {}".format(label, stats[key]) for key, label in REPORT_COUNTERS]
+        if groups:
+            summary.append("Марок на группу (в среднем): {:.1f}".format(
+                float(planned_tags) / len(groups)))
+        summary.append("Индекс типоразмеров: семейств {}, обращений {}".format(
+            self.symbol_index.builds, self.symbol_index.lookups
+        ))
+        summary.append(self.values.Stats())
+        if self.width_model:
+            summary.append("Ширина текста ({} {}мм): {}".format(
+                self.settings.font_name, self.settings.text_size_mm, self.width_model.Stats()
+            ))
+        lines = ["=" * 60, "ИТОГОВЫЙ ОТЧЕТ ОБ ОБРАБОТКЕ", "=" * 60]
+        lines.extend(summary)
+        lines.extend(["=" * 60, "ДЕТАЛЬНЫЙ ЛОГ:"])
+
         # Добавляем детальные результаты
         for result in results[-20:]:  # Последние 20 записей
             lines.append(result)
-            
+
         log_text = Environment.NewLine.join(lines)
 
         self.txtResults.Text = log_text
-        
+
         # Выводим итоги в консоль pyRevit
+        report = [
+            "=" * 60, "ИТОГИ ОБРАБОТКИ", "=" * 60
+        ] + summary + [
+            "=" * 60, "ВЫПОЛНЕНИЕ ЗАВЕРШЕНО", "=" * 60
+        ]
+        for line in report:
+            if PYREVIT_AVAILABLE:
+                logger.info(line)
+            else:
+                print(line)
+
+    def PlanTag(self, tag, stats):
+        """
+        Определяет требуемую длину полки марки.
+
+        Args:
+            tag (IndependentTag): Марка.
+            stats (dict): Счётчики отчёта (см. REPORT_COUNTERS).
+
+        Returns:
+            tuple: (базовый типоразмер, длина полки в мм) или None, если
+                марку не нужно менять.
+        """
+        stats["total"] += 1
+
+        if not tag.Category:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: нет категории, пропускаем".format(tag.Id))
+            return None
+        if tag.Category.Id.IntegerValue not in TAG_CATEGORY_IDS:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: категория {} не в списке целевых".format(tag.Id, tag.Category.Name))
+            return None
+        stats["with_category"] += 1
+
+        tagged_elements = tag.GetTaggedLocalElements()
+        if not tagged_elements:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: нет привязанных элементов".format(tag.Id))
+            return None
+        stats["with_elements"] += 1
+
+        element = tagged_elements[0]
+        category = element.Category
+        param_name = self.settings.selected_parameters.get(category.Id.IntegerValue)
+        if not param_name:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: нет выбранного параметра для категории {}".format(tag.Id, category.Name if category else 'Unknown'))
+            return None
+        stats["with_param"] += 1
+
+        # Проверка instance или type параметра (значения кэшируются на запуск)
+        found, value = self.values.Get(element, param_name)
+        if not found:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: параметр '{}' не найден".format(tag.Id, param_name))
+            return None
+        if value is None:
+            if PYREVIT_AVAILABLE:
+                logger.debug("Марка ID {}: параметр '{}' не имеет значения".format(tag.Id, param_name))
+            return None
+        stats["with_value"] += 1
+
+        required_length = self.RequiredLength(value)
         if PYREVIT_AVAILABLE:
-            logger.info("=" * 60)
-            logger.info("ИТОГИ ОБРАБОТКИ")
-            logger.info("=" * 60)
-            logger.info("Всего марок: {}".format(total_tags_all))
-            logger.info("С целевой категорией: {}".format(tags_with_category))
-            logger.info("С привязанными элементами: {}".format(tags_with_elements))
-            logger.info("С выбранным параметром: {}".format(tags_with_param))
-            logger.info("С заполненным значением: {}".format(tags_with_value))
-            logger.info("Изменено марок: {}".format(changed_tags))
-            logger.info("Создано символов: {}".format(sum(len(symbols) for symbols in created_symbols.values())))
-            logger.info("=" * 60)
-            logger.info("ВЫПОЛНЕНИЕ ЗАВЕРШЕНО")
-            logger.info("=" * 60)
+            logger.debug("Марка ID {}: значение '{}', символов: {}, требуемая длина: {}мм".format(tag.Id, value, len(value), required_length))
+
+        # Получить базовый символ марки
+        base_symbol = self.doc.GetElement(tag.GetTypeId())
+        if not isinstance(base_symbol, FamilySymbol):
+            if PYREVIT_AVAILABLE:
+                logger.warning("Марка ID {}: не является семейством, пропускаем".format(tag.Id))
+            return None
+        try:
+            if not base_symbol.Family:
+                if PYREVIT_AVAILABLE:
+                    logger.warning("Марка ID {}: нет семейства, пропускаем".format(tag.Id))
+                return None
+        except Exception as fam_e:
+            if PYREVIT_AVAILABLE:
+                logger.warning("Марка ID {}: ошибка при получении семейства: {}".format(tag.Id, str(fam_e)))
+            return None
+        return base_symbol, required_length
+
+    def RequiredLength(self, value):
+        """
+        Рассчитывает длину полки для текста марки.
+
+        Args:
+            value (str): Текст значения параметра.
+
+        Returns:
+            int: Длина полки, мм (ширина текста по шрифту или
+                символы × коэффициент, плюс запас).
+        """
+        if self.width_model:
+            width = self.width_model.Width(value)
         else:
-            print("=" * 60)
-            print("ИТОГИ ОБРАБОТКИ")
-            print("=" * 60)
-            print("Всего марок: {}".format(total_tags_all))
-            print("С целевой категорией: {}".format(tags_with_category))
-            print("С привязанными элементами: {}".format(tags_with_elements))
-            print("С выбранным параметром: {}".format(tags_with_param))
-            print("С заполненным значением: {}".format(tags_with_value))
-            print("Изменено марок: {}".format(changed_tags))
-            print("Создано символов: {}".format(sum(len(symbols) for symbols in created_symbols.values())))
-            print("=" * 60)
-            print("ВЫПОЛНЕНИЕ ЗАВЕРШЕНО")
-            print("=" * 60)
+            width = len(value) * self.settings.length_coefficient
+        return int(math.ceil(width + SHELF_MARGIN_MM))
+
+    def ChangeTagTypes(self, tags, new_symbol, results):
+        """
+        Переводит марки группы на типоразмер одним вызовом Element.ChangeTypeId.
+
+        Если групповой вызов не прошёл (например, одна из марок не может
+        сменить тип), марки переводятся по одной, чтобы ошибка одной марки
+        не отменяла смену типа остальных.
+
+        Args:
+            tags (list): Марки группы с другим типоразмером.
+            new_symbol (FamilySymbol): Типоразмер с нужной длиной полки.
+            results (list): Детальный лог, сюда добавляются ошибки.
+
+        Returns:
+            list: Марки, тип которых изменён.
+        """
+        if not tags:
+            return []
+        try:
+            Element.ChangeTypeId(self.doc, List[ElementId]([tag.Id for tag in tags]), new_symbol.Id)
+            return tags
+        except Exception as group_error:
+            if PYREVIT_AVAILABLE:
+                logger.warning("Групповая смена типа {} марок не выполнена: {}".format(
+                    len(tags), group_error))
+
+        changed = []
+        for tag in tags:
+            try:
+                tag.ChangeTypeId(new_symbol.Id)
+                changed.append(tag)
+            except Exception as tag_error:
+                error_msg = "Ошибка при обработке марки ID {}: {}".format(tag.Id, str(tag_error))
+                if PYREVIT_AVAILABLE:
+                    logger.error(error_msg)
+                results.append(error_msg)
+        return changed
+
+    def ResolveShelfSymbol(self, base_symbol, required_length, stats):
+        """
+        Находит или создаёт типоразмер с нужной длиной полки.
+
+        Args:
+            base_symbol (FamilySymbol): Типоразмер марки, задающий префикс имени.
+            required_length (int): Длина полки, мм.
+            stats (dict): Счётчики отчёта.
+
+        Returns:
+            tuple: (FamilySymbol, имя типоразмера).
+        """
+        new_name, shelf_num, existing_id = self.generate_new_name_and_num(
+            base_symbol, required_length
+        )
+        if existing_id is not None:
+            if PYREVIT_AVAILABLE:
+                logger.info("Найден существующий символ: {} (длина {}мм)".format(new_name, required_length))
+            return self.doc.GetElement(existing_id), new_name
+
+        # Создать новый символ и установить "Длина полки"
+        new_symbol, shelf_set = self.symbol_index.CreateSymbol(
+            base_symbol, new_name, required_length
+        )
+        stats["created"] += 1
+        if PYREVIT_AVAILABLE:
+            if shelf_set:
+                logger.debug("Установлена длина полки {}мм для символа {}".format(required_length, new_name))
+            else:
+                logger.warning("Не найдено параметра для установки длины полки в символе {}".format(new_name))
+        return new_symbol, new_name
+
+    def OnProgressReport(self, reporter):
+        """Обновляет прогресс-бар и строку состояния (вызывается с ограничением частоты)."""
+        self.progressBar.Value = reporter.Percent()
+        self.lblProgress.Text = "{}: {}".format(self.progress_stage, reporter.Text())
+        self.progressBar.Refresh()
+        self.lblProgress.Refresh()
 
     def OnTabSelecting(self, sender, args):
         args.Cancel = True
@@ -12,74 +12,148 @@ clr.AddReference("RevitAPIUI")
 clr.AddReference("System.Windows.Forms")
 clr.AddReference("System.Drawing")
 
-import codecs
-import datetime
-import json
 import os
-import random
+import re
+import time
 
 from Autodesk.Revit.DB import *
 from System.Drawing import *
 from System.Windows.Forms import *
 
+from batch_run import BatchConfig, BatchRunner, summary_file_name
+from chunked_run import RunCheckpoint, run_signature
+from duct_selection import SELECTION_MODES
+from element_names import ElementNameCache
+from marks_engine import (
+    DEFAULT_OFFSET_X,
+    DEFAULT_OFFSET_Y,
+    TagPlacementEngine,
+    get_category_name,
+)
+from plan_export import export_plan
+from progress_reporter import ProgressReporter
+from run_log import DEBUG, INFO, WARNING, RunLog
+from run_manifest import RunManifest, document_key
+from tag_catalog import TagFamilyCatalog, get_tag_category_id
+from tag_profiles import TagProfileStore, document_profile_key, saved_tag, store_tag
+from view_index import ViewIndex
+from view_list import VirtualViewList
+from view_snapshot import collect_view_snapshots, get_views
+
 # Константы
-MM_TO_FEET = 304.8
-DEFAULT_OFFSET_X = 60.0
-DEFAULT_OFFSET_Y = 30.0
 VIEW_TYPES = ["3D виды", "Планы этажей"]  # Доступные типы видов
+DUCT_SELECTION_NAMES = [  # Подписи режимов отбора в порядке SELECTION_MODES
+    "Самый длинный в группе",
+    "N самых длинных в группе",
+    "Самый длинный в группе на каждом уровне",
+]
+DEFAULT_DUCT_TOP_N = 3
+LOG_LEVELS = [  # Подписи уровней лога и минимальный сохраняемый уровень
+    ("Подробный", DEBUG),
+    ("Основной", INFO),
+    ("Только ошибки", WARNING),
+]
+LOG_CAPACITY = 20000  # Записей лога в памяти
+LOG_PAGE_SIZE = 500  # Записей лога на странице просмотра
+LOG_SPILL_PATH = os.path.join(os.path.dirname(__file__), "logs", "last_run.log")
 
 
 # Логирование
-class Logger:
+class Logger(RunLog):
     """
-    Класс для управления логированием.
+    Журнал выполнения с постраничным просмотром.
 
-    Attributes:
-        messages (list): Список сообщений лога.
-        enabled (bool): Флаг включения логирования.
+    Записи хранятся в кольцевом буфере (см. run_log.RunLog) и форматируются
+    только при просмотре; вытесненные записи дописываются в LOG_SPILL_PATH.
     """
 
-    def __init__(self, enabled=False):
+    def __init__(self, enabled=False, min_level=DEBUG, spill_path=LOG_SPILL_PATH):
         """
         Инициализирует логгер.
 
         Args:
             enabled (bool): Включить логирование.
-        """
-        self.messages = []
-        self.enabled = enabled
-
-    def add(self, message):
-        """
-        Добавляет сообщение в лог.
-
-        Args:
-            message (str): Сообщение для логирования.
-        """
-        if self.enabled:
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            self.messages.append("[{0}] {1}".format(timestamp, message))
+            min_level (int): Минимальный сохраняемый уровень.
+            spill_path (str, optional): Файл для вытесненных записей.
+        """
+        RunLog.__init__(
+            self,
+            enabled=enabled,
+            min_level=min_level,
+            capacity=LOG_CAPACITY,
+            spill_path=spill_path,
+        )
 
     def show(self):
         """
-        Показывает лог в окне сообщения или форме.
+        Показывает лог постранично (LOG_PAGE_SIZE записей на странице).
         """
         if not self.enabled:
             MessageBox.Show("Логирование отключено", "Информация")
             return
-        if not self.messages:
+        if not self.Count():
             MessageBox.Show("Нет записей в логе", "Информация")
             return
-        log_text = "\n".join(self.messages)
+        self.Close()
+
         form = Form()
         form.Text = "Логи выполнения"
-        form.Size = Size(600, 400)
+        form.Size = Size(700, 500)
+
         textbox = TextBox()
         textbox.Multiline = True
-        textbox.Dock = DockStyle.Fill
+        textbox.ReadOnly = True
         textbox.ScrollBars = ScrollBars.Vertical
-        textbox.Text = log_text
-        form.Controls.Add(textbox)
+        textbox.Location = Point(5, 5)
+        textbox.Size = Size(675, 400)
+        textbox.Anchor = (
+            AnchorStyles.Top | AnchorStyles.Bottom | AnchorStyles.Left | AnchorStyles.Right
+        )
+
+        btnPrev = Button()
+        btnPrev.Text = "←"
+        btnPrev.Location = Point(5, 415)
+        btnPrev.Size = Size(40, 25)
+        btnPrev.Anchor = AnchorStyles.Bottom | AnchorStyles.Left
+
+        btnNext = Button()
+        btnNext.Text = "→"
+        btnNext.Location = Point(50, 415)
+        btnNext.Size = Size(40, 25)
+        btnNext.Anchor = AnchorStyles.Bottom | AnchorStyles.Left
+
+        lblPage = Label()
+        lblPage.Location = Point(100, 419)
+        lblPage.Size = Size(580, 40)
+        lblPage.Anchor = AnchorStyles.Bottom | AnchorStyles.Left | AnchorStyles.Right
+
+        page_count = self.PageCount(LOG_PAGE_SIZE)
+        state = {"page": page_count - 1}
+
+        def ShowPage():
+            page = state["page"]
+            textbox.Text = "\r\n".join(self.Page(page, LOG_PAGE_SIZE))
+            text = "Страница {0} из {1}, записей: {2}".format(page + 1, page_count, self.Count())
+            if self.spilled:
+                text += "\nРанние записи ({0}) сохранены в: {1}".format(self.spilled, self.spill_path)
+            elif self.dropped:
+                text += "\nРанние записи отброшены: {0}".format(self.dropped)
+            lblPage.Text = text
+            btnPrev.Enabled = page > 0
+            btnNext.Enabled = page < page_count - 1
+
+        def OnPrev(sender, args):
+            state["page"] -= 1
+            ShowPage()
+
+        def OnNext(sender, args):
+            state["page"] += 1
+            ShowPage()
+
+        btnPrev.Click += OnPrev
+        btnNext.Click += OnNext
+        form.Controls.AddRange((textbox, btnPrev, btnNext, lblPage))
+        ShowPage()
         form.ShowDialog()
 
 
@@ -100,7 +174,16 @@ class TagSettings(object):
         offset_y (float): Смещение по Y в мм.
         orientation (TagOrientation): Ориентация марки.
         use_leader (bool): Использовать выноску.
+        random_offset (bool): Разброс направлений смещения.
+        offset_seed (int): Зерно разброса (одинаковое зерно - одинаковая раскладка).
+        avoid_collisions (bool): Размещать марки без наложений.
+        duct_selection_mode (str): Режим отбора воздуховодов (см. duct_selection).
+        duct_top_n (int): Количество воздуховодов на группу в режиме top_n.
+        incremental (bool): Обрабатывать только новые и изменённые элементы.
+        chunk_tags (int): Марок в одной транзакции (0 - без ограничения).
+        chunk_views (int): Видов в одной транзакции (0 - без ограничения).
         enable_logging (bool): Включить логирование.
+        log_level (int): Минимальный уровень записей лога.
     """
 
     def __init__(self):
@@ -120,7 +203,15 @@ class TagSettings(object):
         self.orientation = TagOrientation.Horizontal
         self.use_leader = True
         self.enable_logging = False
-        self.random_offset = True  # Случайное направление смещения
+        self.log_level = DEBUG
+        self.random_offset = True  # Разброс направлений смещения
+        self.offset_seed = 0
+        self.avoid_collisions = False  # Поиск свободного места для марки
+        self.duct_selection_mode = SELECTION_MODES[0]
+        self.duct_top_n = DEFAULT_DUCT_TOP_N
+        self.incremental = False  # Пропуск элементов из манифеста прошлого запуска
+        self.chunk_tags = 0  # 0 - все марки в одной транзакции
+        self.chunk_views = 0
 
 
 # Главная форма
@@ -132,10 +223,16 @@ class MainForm(Form):
         doc (Document): Документ Revit.
         uidoc (UIDocument): UI-документ Revit.
         settings (TagSettings): Настройки приложения.
-        views_dict (dict): Словарь видов.
+        view_snapshots (dict): {IntegerValue id вида: ViewSnapshot}.
+        view_list (VirtualViewList): Список видов с поиском.
         category_mapping (dict): Маппинг категорий.
         logger (Logger): Экземпляр логгера.
-        tag_defaults (dict): Словарь дефолтных марок по категориям.
+        tag_profiles (TagProfileStore): Профили tag_defaults.json по документам.
+        tag_defaults (dict): Марки по категориям из профиля текущего документа.
+        engine (TagPlacementEngine): Движок расстановки марок.
+        progress (ProgressReporter): Счётчик прогресса текущего запуска.
+        tag_catalog (TagFamilyCatalog): Каталог семейств марок документа.
+        names (ElementNameCache): Кэш имён семейств и типоразмеров.
     """
 
     def __init__(self, doc, uidoc):
@@ -149,16 +246,47 @@ class MainForm(Form):
         self.doc = doc
         self.uidoc = uidoc
         self.settings = TagSettings()
-        self.views_dict = {}
-        self.all_views_dict = {}
-        self.lstViewsChecked = {}
+        self.view_snapshots = {}
         self.category_mapping = {}
         self.logger = Logger(self.settings.enable_logging)
+        self.tag_profiles = None
         self.tag_defaults = self.LoadTagDefaults()
+        self.engine = TagPlacementEngine(self.doc, self.settings, self.logger)
+        self.progress = None
+        self.names = ElementNameCache(self.logger)
+        self.tag_catalog = TagFamilyCatalog(self.doc, self.names.Get)
+        self.doc.Application.DocumentChanged += self.OnDocumentChanged
+        self.FormClosed += self.OnFormClosed
 
         self.InitializeComponent()
         self.LoadAllViews()
 
+    def OnFormClosed(self, sender, args):
+        """
+        Отписывает форму от событий документа.
+        """
+        self.doc.Application.DocumentChanged -= self.OnDocumentChanged
+
+    def OnDocumentChanged(self, sender, args):
+        """
+        Обработчик Application.DocumentChanged.
+
+        Сбрасывает в кэше имён изменённые (в том числе переименованные) и
+        удалённые элементы документа и передаёт событие каталогу марок.
+
+        Args:
+            sender: Источник события.
+            args (DocumentChangedEventArgs): Аргументы события.
+        """
+        try:
+            if args.GetDocument().Equals(self.doc):
+                changed = [element_id.IntegerValue for element_id in args.GetModifiedElementIds()]
+                changed.extend(element_id.IntegerValue for element_id in args.GetDeletedElementIds())
+                self.names.Invalidate(changed)
+        except Exception:
+            self.names.Invalidate()
+        self.tag_catalog.OnDocumentChanged(sender, args)
+
     def InitializeComponent(self):
         """
         Инициализирует компоненты формы.
@@ -256,10 +384,9 @@ class MainForm(Form):
             self.btnSelectAll,
             self.btnDeselectAll,
             self.CreateControl(
-                CheckedListBox,
+                ListView,
                 Location=Point(10, 65),
                 Size=Size(600, 360),
-                CheckOnClick=True,
             ),
             self.CreateControl(
                 CheckBox,
@@ -273,6 +400,12 @@ class MainForm(Form):
                 size=Size(100, 25),
                 click_handler=self.OnShowLogsClick,
             ),
+            self.CreateControl(
+                ComboBox,
+                Location=Point(330, 441),
+                Size=Size(130, 20),
+                DropDownStyle=ComboBoxStyle.DropDownList,
+            ),
             self.CreateButton(
                 text="Далее →",
                 location=Point(600, 440),
@@ -288,6 +421,7 @@ class MainForm(Form):
             self.lstViews,
             self.chkLogging,
             self.btnShowLogs,
+            self.cmbLogLevel,
             self.btnNext1,
         ) = (
             controls[0],
@@ -299,9 +433,14 @@ class MainForm(Form):
             controls[6],
             controls[7],
             controls[8],
+            controls[9],
         )
+        for name, level in LOG_LEVELS:
+            self.cmbLogLevel.Items.Add(name)
+        self.cmbLogLevel.SelectedIndex = 0
         self.chkLogging.CheckedChanged += self.OnLoggingCheckedChanged
-        self.txtSearchViews.TextChanged += self.OnSearchViewsTextChanged
+        self.view_list = VirtualViewList(self.lstViews)
+        self.view_list.BindSearch(self.txtSearchViews)
         for c in controls:
             tab.Controls.Add(c)
 
@@ -495,11 +634,60 @@ class MainForm(Form):
         self.chkUseLeader.Checked = True
 
         self.chkRandomOffset = CheckBox()
-        self.chkRandomOffset.Text = "Случайное направление смещения"
+        self.chkRandomOffset.Text = "Разброс направлений смещения"
         self.chkRandomOffset.Location = Point(10, 105)
         self.chkRandomOffset.Size = Size(250, 20)
         self.chkRandomOffset.Checked = True
 
+        self.numOffsetSeed = NumericUpDown()
+        self.numOffsetSeed.Location = Point(330, 105)
+        self.numOffsetSeed.Size = Size(80, 20)
+        self.numOffsetSeed.Minimum = 0
+        self.numOffsetSeed.Maximum = 999999
+        self.numOffsetSeed.Value = 0
+
+        self.chkAvoidCollisions = CheckBox()
+        self.chkAvoidCollisions.Text = "Избегать наложения марок"
+        self.chkAvoidCollisions.Location = Point(10, 130)
+        self.chkAvoidCollisions.Size = Size(250, 20)
+        self.chkAvoidCollisions.Checked = False
+
+        self.cmbDuctSelection = ComboBox()
+        self.cmbDuctSelection.Location = Point(170, 160)
+        self.cmbDuctSelection.Size = Size(280, 20)
+        self.cmbDuctSelection.DropDownStyle = ComboBoxStyle.DropDownList
+        for name in DUCT_SELECTION_NAMES:
+            self.cmbDuctSelection.Items.Add(name)
+        self.cmbDuctSelection.SelectedIndex = 0
+
+        self.numDuctTopN = NumericUpDown()
+        self.numDuctTopN.Location = Point(170, 190)
+        self.numDuctTopN.Size = Size(60, 20)
+        self.numDuctTopN.Minimum = 1
+        self.numDuctTopN.Maximum = 50
+        self.numDuctTopN.Value = DEFAULT_DUCT_TOP_N
+
+        self.chkIncremental = CheckBox()
+        self.chkIncremental.Text = "Только новые и изменённые элементы"
+        self.chkIncremental.Location = Point(10, 220)
+        self.chkIncremental.Size = Size(300, 20)
+        self.chkIncremental.Checked = False
+
+        self.numChunkTags = NumericUpDown()
+        self.numChunkTags.Location = Point(230, 250)
+        self.numChunkTags.Size = Size(80, 20)
+        self.numChunkTags.Minimum = 0
+        self.numChunkTags.Maximum = 100000
+        self.numChunkTags.Increment = 100
+        self.numChunkTags.Value = 0
+
+        self.numChunkViews = NumericUpDown()
+        self.numChunkViews.Location = Point(230, 280)
+        self.numChunkViews.Size = Size(80, 20)
+        self.numChunkViews.Minimum = 0
+        self.numChunkViews.Maximum = 1000
+        self.numChunkViews.Value = 0
+
         controls = [
             self.CreateControl(
                 Label,
@@ -513,6 +701,28 @@ class MainForm(Form):
             self.cmbOrientation,
             self.chkUseLeader,
             self.chkRandomOffset,
+            self.CreateControl(
+                Label, Text="Зерно:", Location=Point(270, 107), Size=Size(55, 20)
+            ),
+            self.numOffsetSeed,
+            self.chkAvoidCollisions,
+            self.CreateControl(
+                Label, Text="Отбор воздуховодов:", Location=Point(10, 160), Size=Size(150, 20)
+            ),
+            self.cmbDuctSelection,
+            self.CreateControl(
+                Label, Text="N на группу:", Location=Point(10, 190), Size=Size(150, 20)
+            ),
+            self.numDuctTopN,
+            self.chkIncremental,
+            self.CreateControl(
+                Label, Text="Марок в транзакции (0 - все):", Location=Point(10, 250), Size=Size(210, 20)
+            ),
+            self.numChunkTags,
+            self.CreateControl(
+                Label, Text="Видов в транзакции (0 - все):", Location=Point(10, 280), Size=Size(210, 20)
+            ),
+            self.numChunkViews,
             self.CreateButton(
                 "← Назад", Point(500, 455), click_handler=self.OnBack3Click
             ),
@@ -532,7 +742,7 @@ class MainForm(Form):
         """
         self.txtSummary = TextBox()
         self.txtSummary.Location = Point(10, 40)
-        self.txtSummary.Size = Size(700, 400)
+        self.txtSummary.Size = Size(700, 375)
         self.txtSummary.Multiline = True
         self.txtSummary.ScrollBars = ScrollBars.Vertical
         self.txtSummary.ReadOnly = True
@@ -543,6 +753,10 @@ class MainForm(Form):
         self.progressBar.Minimum = 0
         self.progressBar.Maximum = 100
 
+        self.lblProgress = self.CreateControl(
+            Label, Text="", Location=Point(10, 425), Size=Size(700, 20)
+        )
+
         controls = [
             self.CreateControl(
                 Label,
@@ -550,7 +764,20 @@ class MainForm(Form):
                 Location=Point(10, 10),
                 Size=Size(300, 20),
             ),
+            self.CreateButton(
+                "Пакетный запуск…",
+                Point(400, 8),
+                Size(150, 25),
+                click_handler=self.OnBatchClick,
+            ),
+            self.CreateButton(
+                "Предпросмотр плана…",
+                Point(560, 8),
+                Size(150, 25),
+                click_handler=self.OnPreviewClick,
+            ),
             self.txtSummary,
+            self.lblProgress,
             self.progressBar,
             self.CreateButton(
                 "← Назад", Point(340, 450), click_handler=self.OnBack4Click
@@ -567,89 +794,44 @@ class MainForm(Form):
 
     def LoadAllViews(self):
         """
-        Загружает список всех видов (3D и планы) в список.
+        Загружает список всех видов (3D и планы) в индекс, отсортированный по имени.
         """
         try:
-            self.lstViews.Items.Clear()
-            self.all_views_dict.clear()
-            self.views_dict.clear()
-            self.lstViewsChecked.clear()
-
-            # Собираем 3D виды
-            views_3d = (
-                FilteredElementCollector(self.doc)
-                .OfClass(View3D)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
+            self.view_snapshots.clear()
 
-            # Собираем планы этажей
-            views_plan = (
-                FilteredElementCollector(self.doc)
-                .OfClass(ViewPlan)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-
-            all_views = list(views_3d) + list(views_plan)
-
-            # Сортируем виды по имени
-            all_views_sorted = sorted(all_views, key=lambda v: v.Name or "")
+            # Снимки видов собираются одним проходом, объекты видов не хранятся
+            entries = []
+            for snapshot in collect_view_snapshots(self.doc):
+                self.view_snapshots[snapshot.id] = snapshot
+                entries.append((snapshot.Label(), snapshot.id))
 
-            for view in all_views_sorted:
-                if not view.IsTemplate and view.CanBePrinted:
-                    # Определяем тип вида
-                    view_type = "3D" if isinstance(view, View3D) else "План"
-                    name = "{0} [{1}] (ID: {2})".format(
-                        view.Name,
-                        view_type,
-                        str(view.Id.IntegerValue)
-                    )
-                    self.all_views_dict[name] = view
-                    self.lstViewsChecked[name] = False
-
-            self.UpdateViewsList("")  # Показать все
-            if self.lstViews.Items.Count > 0:
-                self.lstViews.SetItemChecked(0, True)
-                self.lstViewsChecked[self.lstViews.Items[0]] = True
+            index = ViewIndex(entries)
+            if len(index):
+                index.SetChecked(index.keys[0], True)
+            self.view_list.SetIndex(index)
 
         except Exception as e:
             MessageBox.Show("Ошибка загрузки видов: " + str(e))
 
     def UpdateViewsList(self, filter_text):
         """
-        Обновляет список видов с фильтром и сортировкой по имени.
+        Применяет фильтр к списку видов.
 
         Args:
             filter_text (str): Текст фильтра.
         """
-        self.lstViews.Items.Clear()
-        self.views_dict.clear()
-        filter_lower = filter_text.lower()
-        
-        # Сортируем виды по имени перед добавлением
-        sorted_views = sorted(
-            self.all_views_dict.items(),
-            key=lambda x: x[0].lower()  # Сортировка по имени вида (ключ словаря)
-        )
-        
-        for name, view in sorted_views:
-            if filter_lower in name.lower():
-                self.lstViews.Items.Add(name, self.lstViewsChecked.get(name, False))
-                self.views_dict[name] = view
+        self.view_list.ApplyFilter(filter_text)
 
     # Навигация
     def OnNext1Click(self, sender, args):
         self.settings.enable_logging = self.chkLogging.Checked
+        self.settings.log_level = LOG_LEVELS[self.cmbLogLevel.SelectedIndex][1]
         self.logger.enabled = self.settings.enable_logging
+        self.logger.min_level = self.settings.log_level
 
-        self.settings.selected_views = []
-        for i in range(self.lstViews.Items.Count):
-            name = self.lstViews.Items[i]
-            checked = self.lstViews.GetItemChecked(i)
-            if checked and name in self.views_dict:
-                self.settings.selected_views.append(self.views_dict[name])
-            self.lstViewsChecked[name] = checked
+        self.settings.selected_views = get_views(
+            self.doc, self.view_list.index.CheckedKeys()
+        )
 
         if not self.settings.selected_views:
             MessageBox.Show("Выберите хотя бы один вид!")
@@ -662,28 +844,15 @@ class MainForm(Form):
 
     def OnSelectAllViews(self, sender, args):
         """
-        Обработчик кнопки "Выбрать все".
+        Обработчик кнопки "Выбрать все" (виды текущего результата поиска).
         """
-        for i in range(self.lstViews.Items.Count):
-            self.lstViews.SetItemChecked(i, True)
-            name = self.lstViews.Items[i]
-            self.lstViewsChecked[name] = True
+        self.view_list.CheckVisible(True)
 
     def OnDeselectAllViews(self, sender, args):
         """
-        Обработчик кнопки "Снять выбор".
-        """
-        for i in range(self.lstViews.Items.Count):
-            self.lstViews.SetItemChecked(i, False)
-            name = self.lstViews.Items[i]
-            self.lstViewsChecked[name] = False
-
-    def OnSearchViewsTextChanged(self, sender, args):
-        """
-        Обработчик изменения текста поиска видов.
+        Обработчик кнопки "Снять выбор" (виды текущего результата поиска).
         """
-        filter_text = sender.Text
-        self.UpdateViewsList(filter_text)
+        self.view_list.CheckVisible(False)
 
     def OnLoggingCheckedChanged(self, sender, args):
         """
@@ -736,6 +905,13 @@ class MainForm(Form):
         )
         self.settings.use_leader = self.chkUseLeader.Checked
         self.settings.random_offset = self.chkRandomOffset.Checked
+        self.settings.offset_seed = int(self.numOffsetSeed.Value)
+        self.settings.avoid_collisions = self.chkAvoidCollisions.Checked
+        self.settings.duct_selection_mode = SELECTION_MODES[self.cmbDuctSelection.SelectedIndex]
+        self.settings.duct_top_n = int(self.numDuctTopN.Value)
+        self.settings.incremental = self.chkIncremental.Checked
+        self.settings.chunk_tags = int(self.numChunkTags.Value)
+        self.settings.chunk_views = int(self.numChunkViews.Value)
         self.txtSummary.Text = self.GenerateSummary()
         self.tabControl.Selecting -= self.OnTabSelecting
         self.tabControl.SelectedIndex = 4
@@ -805,171 +981,17 @@ class MainForm(Form):
             self.lstCategoriesPlan.Items.Add(name, True)
             self.category_mapping[name] = cat
 
-    def GetDuctsToTag(self, duct_elements):
-        """
-        Отбирает воздуховоды для маркировки, оставляя только самый длинный в каждой группе.
-        Группировка по "Имя системы" -> "Сечение".
-
-        Args:
-            duct_elements (list): Список элементов воздуховодов.
-
-        Returns:
-            list: Список элементов воздуховодов для маркировки.
-        """
-        # Словарь для группировки: {system_name: {section: [ducts]}}
-        groups = {}
-
-        # Группируем воздуховоды
-        for duct in duct_elements:
-            try:
-                # Получаем параметр "Имя системы"
-                system_name_param = duct.LookupParameter("Имя системы")
-                if not system_name_param:
-                    # Пытаемся найти параметр по BuiltInParameter
-                    system_name_param = duct.get_Parameter(
-                        BuiltInParameter.RBS_SYSTEM_NAME_PARAM
-                    )
-
-                system_name = ""
-                if system_name_param and system_name_param.HasValue:
-                    if system_name_param.StorageType == StorageType.String:
-                        system_name = system_name_param.AsString()
-                    else:
-                        system_name = system_name_param.AsValueString()
-
-                # Получаем параметр "Сечение"
-                section_param = duct.LookupParameter("Сечение")
-                if not section_param:
-                    # Для воздуховодов сечение можно получить из размеров
-                    section = self.GetDuctSection(duct)
-                else:
-                    section = ""
-                    if section_param.HasValue:
-                        if section_param.StorageType == StorageType.String:
-                            section = section_param.AsString()
-                        else:
-                            section = section_param.AsValueString()
-
-                # Получаем длину воздуховода
-                length_param = duct.LookupParameter("Длина")
-                if not length_param:
-                    length_param = duct.get_Parameter(
-                        BuiltInParameter.CURVE_ELEM_LENGTH
-                    )
-
-                length = 0.0
-                if length_param and length_param.HasValue:
-                    if length_param.StorageType == StorageType.Double:
-                        length = length_param.AsDouble()
-                    else:
-                        length = float(length_param.AsValueString().replace(",", "."))
-
-                # Создаем ключи для группировки
-                if system_name not in groups:
-                    groups[system_name] = {}
-
-                if section not in groups[system_name]:
-                    groups[system_name][section] = []
-
-                # Добавляем воздуховод в группу
-                groups[system_name][section].append({"element": duct, "length": length})
-
-            except Exception as e:
-                self.logger.add(
-                    "Ошибка обработки воздуховода {0}: {1}".format(duct.Id, e)
-                )
-                continue
-
-        # Отбираем самые длинные воздуховоды в каждой группе
-        selected_ducts = []
-        for system_name, sections in groups.items():
-            for section, ducts in sections.items():
-                if ducts:
-                    # Находим воздуховод с максимальной длиной
-                    longest_duct = max(ducts, key=lambda x: x["length"])
-                    selected_ducts.append(longest_duct["element"])
-                    self.logger.add(
-                        "Выбран воздуховод ID {0} для системы '{1}', сечения '{2}', длина {3:.2f}".format(
-                            longest_duct["element"].Id,
-                            system_name,
-                            section,
-                            longest_duct["length"],
-                        )
-                    )
-
-        return selected_ducts
-
-    def GetDuctSection(self, duct):
+    def GetCategoryName(self, category):
         """
-        Получает сечение воздуховода.
+        Получает имя категории для отображения.
 
         Args:
-            duct (Element): Элемент воздуховода.
+            category (Category): Категория Revit.
 
         Returns:
-            str: Строка с описанием сечения.
+            str: Имя категории.
         """
-        try:
-            # Для круглых воздуховодов
-            diameter_param = duct.LookupParameter("Диаметр")
-            if not diameter_param:
-                diameter_param = duct.get_Parameter(
-                    BuiltInParameter.RBS_CURVE_DIAMETER_PARAM
-                )
-
-            if diameter_param and diameter_param.HasValue:
-                if diameter_param.StorageType == StorageType.Double:
-                    diameter = diameter_param.AsDouble() * 304.8  # в мм
-                    return "Ø{:.0f}".format(diameter)
-
-            # Для прямоугольных воздуховодов
-            width_param = duct.LookupParameter("Ширина")
-            if not width_param:
-                width_param = duct.get_Parameter(BuiltInParameter.RBS_CURVE_WIDTH_PARAM)
-
-            height_param = duct.LookupParameter("Высота")
-            if not height_param:
-                height_param = duct.get_Parameter(
-                    BuiltInParameter.RBS_CURVE_HEIGHT_PARAM
-                )
-
-            if (
-                width_param
-                and height_param
-                and width_param.HasValue
-                and height_param.HasValue
-            ):
-                width = 0.0
-                height = 0.0
-
-                if width_param.StorageType == StorageType.Double:
-                    width = width_param.AsDouble() * 304.8  # в мм
-                else:
-                    width = float(width_param.AsValueString().replace(",", "."))
-
-                if height_param.StorageType == StorageType.Double:
-                    height = height_param.AsDouble() * 304.8  # в мм
-                else:
-                    height = float(height_param.AsValueString().replace(",", "."))
-
-                return "{:.0f}x{:.0f}".format(width, height)
-
-            return "Не определено"
-        except Exception as e:
-            self.logger.add(
-                "Ошибка получения сечения воздуховода {0}: {1}".format(duct.Id, e)
-            )
-            return "Ошибка"
-
-    def GetCategoryName(self, category):
-        if not category:
-            return "Неизвестная категория"
-        try:
-            if hasattr(category, "Id") and category.Id.IntegerValue < 0:
-                return LabelUtils.GetLabelFor(BuiltInCategory(category.Id.IntegerValue))
-        except Exception as e:
-            self.logger.add("Ошибка получения имени категории: {0}".format(e))
-        return getattr(category, "Name", "Неизвестная категория")
+        return get_category_name(category, self.logger)
 
     def PopulateTagFamilies3D(self):
         """Заполняет список марок для 3D видов"""
@@ -980,10 +1002,12 @@ class MainForm(Form):
             item.Tag = category
 
             cat_name = self.GetCategoryName(category)
-            family_name, type_name = self.GetSavedTagForCurrentView(cat_name, "3D")
+            family_name, type_name, type_id = self.GetSavedTagForCurrentView(
+                cat_name, "3D"
+            )
 
             if family_name and type_name:
-                tag_family, tag_type = self.FindSavedTag(family_name, type_name)
+                tag_family, tag_type = self.FindSavedTag(family_name, type_name, type_id)
                 if tag_family and tag_type:
                     item.SubItems.Add(self.GetElementName(tag_family))
                     item.SubItems.Add(self.GetElementName(tag_type))
@@ -1013,10 +1037,12 @@ class MainForm(Form):
             item.Tag = category
 
             cat_name = self.GetCategoryName(category)
-            family_name, type_name = self.GetSavedTagForCurrentView(cat_name, "План")
+            family_name, type_name, type_id = self.GetSavedTagForCurrentView(
+                cat_name, "План"
+            )
 
             if family_name and type_name:
-                tag_family, tag_type = self.FindSavedTag(family_name, type_name)
+                tag_family, tag_type = self.FindSavedTag(family_name, type_name, type_id)
                 if tag_family and tag_type:
                     item.SubItems.Add(self.GetElementName(tag_family))
                     item.SubItems.Add(self.GetElementName(tag_type))
@@ -1038,26 +1064,16 @@ class MainForm(Form):
             self.lstTagFamiliesPlan.Items.Add(item)
 
     def GetSavedTagForCurrentView(self, cat_name, view_type):
-        """Получает сохранённую марку для указанного типа вида"""
-        defaults = self.tag_defaults.get(cat_name, {})
-        if view_type == "3D":
-            family_name = defaults.get("family_3d")
-            type_name = defaults.get("type_3d")
-        else:
-            family_name = defaults.get("family_plan")
-            type_name = defaults.get("type_plan")
-        return family_name, type_name
+        """Получает сохранённую марку (семейство, типоразмер, id типоразмера) для типа вида"""
+        suffix = "3d" if view_type == "3D" else "plan"
+        return saved_tag(self.tag_defaults.get(cat_name, {}), suffix)
 
-    def SaveTagForCurrentView(self, cat_name, view_type, family_name, type_name):
+    def SaveTagForCurrentView(self, cat_name, view_type, family_name, type_name, type_id=None):
         """Сохраняет марку для указанного типа вида"""
-        if cat_name not in self.tag_defaults:
-            self.tag_defaults[cat_name] = {}
-        if view_type == "3D":
-            self.tag_defaults[cat_name]["family_3d"] = family_name
-            self.tag_defaults[cat_name]["type_3d"] = type_name
-        else:
-            self.tag_defaults[cat_name]["family_plan"] = family_name
-            self.tag_defaults[cat_name]["type_plan"] = type_name
+        suffix = "3d" if view_type == "3D" else "plan"
+        store_tag(
+            self.tag_defaults.setdefault(cat_name, {}), suffix, family_name, type_name, type_id
+        )
         self.logger.add("Сохранение настроек для '{0}' ({1}): {2} - {3}".format(
             cat_name, view_type, family_name, type_name))
         self.SaveTagDefaults()
@@ -1091,7 +1107,8 @@ class MainForm(Form):
                 current_type = self.settings.category_tag_types_plan.get(category)
 
             form = TagFamilySelectionForm(
-                self.doc, available_families, current_family, current_type
+                self.doc, available_families, current_family, current_type,
+                catalog=self.tag_catalog, names=self.names,
             )
             if (
                 form.ShowDialog() == DialogResult.OK
@@ -1112,136 +1129,60 @@ class MainForm(Form):
                     self.settings.category_tag_families_plan[category] = form.SelectedFamily
                     self.settings.category_tag_types_plan[category] = form.SelectedType
                 
-                self.SaveTagForCurrentView(cat_name, view_type, family_name, type_name)
+                self.SaveTagForCurrentView(
+                    cat_name, view_type, family_name, type_name,
+                    form.SelectedType.Id.IntegerValue,
+                )
         else:
             MessageBox.Show("Нет доступных семейств марок для этой категории")
 
     def FindTagForCategory(self, category):
-        tag_category_id = self.GetTagCategoryId(category)
-        if not tag_category_id:
-            return None, None
-
-        collector = FilteredElementCollector(self.doc)
-        tag_families = (
-            collector.OfClass(Family).WhereElementIsNotElementType().ToElements()
-        )
-
-        for family in tag_families:
-            if not family or not hasattr(family, "FamilyCategory"):
-                continue
+        """
+        Подбирает марку по умолчанию для категории элементов.
 
-            if family.FamilyCategory and family.FamilyCategory.Id == tag_category_id:
-                symbol_ids = family.GetFamilySymbolIds()
-                if symbol_ids and symbol_ids.Count > 0:
-                    # Ищем активный типоразмер
-                    for symbol_id in list(symbol_ids):
-                        tag_type = self.doc.GetElement(symbol_id)
-                        if tag_type and tag_type.IsActive:
-                            return family, tag_type
-                    # Если нет активных, берем первый доступный
-                    tag_type = self.doc.GetElement(list(symbol_ids)[0])
-                    return family, tag_type
+        Args:
+            category (Category): Категория элементов.
 
-        return None, None
+        Returns:
+            tuple: (Family, FamilySymbol) или (None, None).
+        """
+        return self.tag_catalog.DefaultTag(self.GetTagCategoryId(category))
 
     def GetTagCategoryId(self, element_category):
-        mapping = {
-            BuiltInCategory.OST_DuctCurves: BuiltInCategory.OST_DuctTags,
-            BuiltInCategory.OST_FlexDuctCurves: BuiltInCategory.OST_DuctTags,
-            BuiltInCategory.OST_DuctTerminal: BuiltInCategory.OST_DuctTerminalTags,
-            BuiltInCategory.OST_DuctAccessory: BuiltInCategory.OST_DuctAccessoryTags,
-            BuiltInCategory.OST_DuctInsulations: BuiltInCategory.OST_DuctInsulationsTags,
-            BuiltInCategory.OST_MechanicalEquipment: BuiltInCategory.OST_MechanicalEquipmentTags,
-        }
+        """
+        Определяет категорию марок для категории элементов.
 
-        try:
-            if hasattr(element_category, "Id") and element_category.Id.IntegerValue < 0:
-                element_cat = BuiltInCategory(element_category.Id.IntegerValue)
-                if element_cat in mapping:
-                    tag_cat = Category.GetCategory(self.doc, mapping[element_cat])
-                    if tag_cat:
-                        return tag_cat.Id
-        except Exception as e:
-            self.logger.add("Ошибка получения категории марки: {0}".format(e))
-        return None
+        Args:
+            element_category (Category): Категория элементов.
 
-    def GetElementName(self, element):
-        if not element:
-            return "Без имени"
-        try:
-            # Для FamilySymbol (типоразмеров)
-            if isinstance(element, FamilySymbol):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-
-                if hasattr(element, "Family") and element.Family:
-                    family_name = (
-                        element.Family.Name
-                        if hasattr(element.Family, "Name") and element.Family.Name
-                        else ""
-                    )
+        Returns:
+            ElementId: Id категории марок или None.
+        """
+        return get_tag_category_id(self.doc, element_category, self.logger)
 
-                    # Пробуем получить имя типа через параметры
-                    type_name = ""
-                    for param_name in ["Тип", "Type Name", "Имя типа"]:
-                        param = element.LookupParameter(param_name)
-                        if param and param.HasValue:
-                            type_name = param.AsString()
-                            break
-
-                    if family_name and type_name:
-                        return family_name + " - " + type_name
-                    elif type_name:
-                        return type_name
-                    elif family_name:
-                        return family_name
-
-                return "Типоразмер " + str(element.Id.IntegerValue)
-
-            # Для Family (семейств)
-            elif isinstance(element, Family):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-                return "Семейство " + str(element.Id.IntegerValue)
-
-            # Общий случай
-            if hasattr(element, "Name") and element.Name:
-                name = element.Name
-                if name and not name.startswith("IronPython"):
-                    return name
+    def GetElementName(self, element):
+        """
+        Получает имя элемента Revit из общего кэша имён.
 
-        except Exception as e:
-            self.logger.add(
-                "GetElementName: Ошибка при получении имени элемента: {0}".format(e)
-            )
+        Args:
+            element (Element): Элемент Revit.
 
-        return "Элемент " + str(element.Id.IntegerValue)
+        Returns:
+            str: Имя элемента.
+        """
+        return self.names.Get(element)
 
     def GetAvailableTagFamiliesForCategory(self, category):
-        tag_category_id = self.GetTagCategoryId(category)
-        if not tag_category_id:
-            return []
-
-        collector = FilteredElementCollector(self.doc)
-        tag_families = (
-            collector.OfClass(Family).WhereElementIsNotElementType().ToElements()
-        )
+        """
+        Возвращает семейства марок, подходящие для категории элементов.
 
-        available_families = []
-        for family in tag_families:
-            if (
-                family
-                and hasattr(family, "FamilyCategory")
-                and family.FamilyCategory
-                and family.FamilyCategory.Id == tag_category_id
-            ):
-                available_families.append(family)
+        Args:
+            category (Category): Категория элементов.
 
-        return available_families
+        Returns:
+            list: Семейства марок (Family).
+        """
+        return self.tag_catalog.Families(self.GetTagCategoryId(category))
 
     def GenerateSummary(self):
         summary = "СВОДКА ПЕРЕД ВЫПОЛНЕНИЕМ:\r\n\r\n"
@@ -1264,7 +1205,17 @@ class MainForm(Form):
         )
         summary += "Ориентация: " + orientation_text + "\r\n"
         summary += "Выноска: " + ("Да" if self.settings.use_leader else "Нет") + "\r\n"
-        summary += "Случайное смещение: " + ("Да" if self.settings.random_offset else "Нет") + "\r\n"
+        summary += "Разброс смещения: " + (
+            "Да (зерно {0})".format(self.settings.offset_seed) if self.settings.random_offset else "Нет"
+        ) + "\r\n"
+        summary += "Без наложений: " + ("Да" if self.settings.avoid_collisions else "Нет") + "\r\n"
+        summary += "Отбор воздуховодов: " + DUCT_SELECTION_NAMES[
+            SELECTION_MODES.index(self.settings.duct_selection_mode)
+        ] + "\r\n"
+        summary += "Инкрементально: " + ("Да" if self.settings.incremental else "Нет") + "\r\n"
+        summary += "Разбиение на транзакции: марок {0}, видов {1}\r\n".format(
+            self.settings.chunk_tags or "все", self.settings.chunk_views or "все"
+        )
         summary += (
             "Логирование: "
             + ("Включено" if self.settings.enable_logging else "Отключено")
@@ -1300,137 +1251,48 @@ class MainForm(Form):
         """
         Обработчик кнопки 'Выполнить'.
         """
-        success_count = 0
-        errors = []
-
         self.logger.add("Начало выполнения расстановки марок.")
-        self.logger.add("Выбрано видов: {0}".format(len(self.settings.selected_views)))
 
-        trans = Transaction(self.doc, "Расстановка марок")
-        trans.Start()
+        errors = []
+        success_count = 0
         try:
-            # 1. Собираем элементы по видам и категориям
-            elements_by_view_and_category = {}
-            for view in self.settings.selected_views:
-                # Проверяем тип вида - поддерживаем 3D и Планы
-                if not isinstance(view, (View3D, ViewPlan)):
-                    error_msg = "Вид '{0}' не поддерживается (требуется 3D или План), пропущен".format(view.Name)
-                    errors.append(error_msg)
-                    self.logger.add(error_msg)
-                    continue
-
-                view_type = "3D" if isinstance(view, View3D) else "План"
-                self.logger.add("Обработка вида: {0} [{1}]".format(view.Name, view_type))
-                elements_by_view_and_category[view.Id] = {}
+            self.PrepareManifest()
 
-                for category in self.settings.selected_categories:
-                    elements = list(
-                        FilteredElementCollector(self.doc, view.Id)
-                        .OfCategoryId(category.Id)
-                        .WhereElementIsNotElementType()
-                        .ToElements()
-                    )
-                    elements_by_view_and_category[view.Id][category.Id] = elements
-                    self.logger.add(
-                        "Категория '{0}': найдено элементов {1}".format(
-                            self.GetCategoryName(category), len(elements)
-                        )
-                    )
-
-            # 2. Применяем фильтрацию для воздуховодов (если нужно)
-            # Сначала собираем все элементы для прогресса
-            all_elements_for_progress = []
-
-            for view in self.settings.selected_views:
-                if not isinstance(view, (View3D, ViewPlan)):
-                    continue
-
-                for category in self.settings.selected_categories:
-                    elements = elements_by_view_and_category[view.Id][category.Id]
-
-                    # Применяем новую логику только для воздуховодов
-                    if category.Id.IntegerValue == int(BuiltInCategory.OST_DuctCurves):
-                        # Отбираем воздуховоды для маркировки
-                        elements = self.GetDuctsToTag(elements)
-                        self.logger.add(
-                            "Для категории '{0}' отобрано {1} воздуховодов для маркировки".format(
-                                self.GetCategoryName(category), len(elements)
-                            )
-                        )
-
-                    # Обновляем элементы в кэше
-                    elements_by_view_and_category[view.Id][category.Id] = elements
-                    # Добавляем в общий список для прогресса
-                    all_elements_for_progress.extend(elements)
-
-            # 3. Настраиваем прогресс-бар на РЕАЛЬНОЕ количество операций
-            total_operations = len(all_elements_for_progress)
-            self.logger.add("Всего операций после фильтрации: {0}".format(total_operations))
+            views = self.settings.selected_views
+            checkpoint = None
+            if self.settings.chunk_tags or self.settings.chunk_views:
+                checkpoint = RunCheckpoint.Load(
+                    self.GetCheckpointPath(), self.GetRunSignature()
+                )
+                views = self.ResumeViews(views, checkpoint)
 
-            if total_operations == 0:
-                self.progressBar.Maximum = 1
-            else:
-                self.progressBar.Maximum = total_operations
+            plan = self.engine.plan(
+                views,
+                self.settings.selected_categories,
+                self.settings.category_tag_types_3d,
+                self.settings.category_tag_types_plan,
+            )
+            self.RecheckResumed(plan, checkpoint)
 
+            # Настраиваем прогресс-бар на РЕАЛЬНОЕ количество операций
+            self.progressBar.Maximum = max(len(plan.items), 1)
             self.progressBar.Value = 0
-            
-            # 4. Основной цикл расстановки марок
-            processed_count = 0
-
-            for view in self.settings.selected_views:
-                # Пропускаем неподдерживаемые типы видов
-                if not isinstance(view, (View3D, ViewPlan)):
-                    continue
-
-                view_type = "3D" if isinstance(view, View3D) else "План"
-                self.logger.add("  [Вид] {0} [{1}]".format(view.Name, view_type))
-
-                for category in self.settings.selected_categories:
-                    elements = elements_by_view_and_category[view.Id][category.Id]
-
-                    self.logger.add("    [{0}] Обработка {1} элементов...".format(
-                        self.GetCategoryName(category), len(elements)))
-
-                    for element in elements:
-                        # Обновляем прогресс перед каждой операцией
-                        processed_count += 1
-                        self.progressBar.Value = min(
-                            processed_count, self.progressBar.Maximum
-                        )
+            self.progress = ProgressReporter(
+                len(plan.items), self.OnProgressReport, unit="марок"
+            )
 
-                        # Обновляем UI для плавного отображения прогресса
-                        Application.DoEvents()
-
-                        if self.HasExistingTag(element, view):
-                            self.logger.add(
-                                "  ⊘ Элемент {0} уже имеет марку, пропущен".format(
-                                    element.Id
-                                )
-                            )
-                            continue
-
-                        if self.CreateTag(element, view, category):
-                            success_count += 1
-                        else:
-                            error_msg = "Не удалось создать марку для элемента {0}".format(
-                                element.Id
-                            )
-                            errors.append(error_msg)
-                            self.logger.add("  ✗ {0}".format(error_msg))
-
-            trans.Commit()
-            self.logger.add("Транзакция подтверждена успешно")
-            
+            result = self.engine.execute(
+                plan, self.OnEngineProgress, checkpoint=checkpoint
+            )
+            self.progress.Finish()
+            success_count = result.success_count
+            errors.extend(result.errors)
         except Exception as e:
-            trans.RollBack()
             error_msg = "Критическая ошибка: {0}".format(e)
             errors.append(error_msg)
             self.logger.add(error_msg)
-        finally:
-            trans.Dispose()
-            self.logger.add("Транзакция завершена")
-        
-        # 5. Гарантируем, что прогресс-бар показывает 100% в конце
+
+        # Гарантируем, что прогресс-бар показывает 100% в конце
         self.progressBar.Value = self.progressBar.Maximum
         
         # Сохранить выбранные марки
@@ -1444,208 +1306,206 @@ class MainForm(Form):
             if len(errors) > 10:
                 result_msg += "\n... и еще {0} ошибок".format(len(errors) - 10)
 
+        self.logger.Close()
         MessageBox.Show(result_msg, "Результат")
         if self.settings.enable_logging:
             self.logger.show()
         self.Close()
 
-    def CreateTag(self, element, view, category):
+    def PrepareManifest(self):
         """
-        Создает марку для указанного элемента на виде.
-
-        Args:
-            element (Element): Элемент для марки.
-            view (View): Вид (3D или План).
-            category (Category): Категория элемента.
+        Подключает к движку манифест документа в инкрементальном режиме.
+        """
+        if self.settings.incremental:
+            self.engine.manifest = RunManifest.Load(self.GetManifestPath())
+        else:
+            self.engine.manifest = None
 
-        Returns:
-            bool: True, если марка создана успешно.
+    def OnPreviewClick(self, sender, args):
+        """
+        Обработчик кнопки 'Предпросмотр плана': строит план без транзакции
+        и сохраняет его в CSV или JSON для проверки и сравнения ревизий.
         """
+        dialog = SaveFileDialog()
+        dialog.Filter = "CSV (*.csv)|*.csv|JSON (*.json)|*.json"
+        dialog.FileName = "{0}_plan.csv".format(self.doc.Title)
+        if dialog.ShowDialog() != DialogResult.OK:
+            return
+
+        start = time.time()
         try:
-            # Получаем тип марки для текущего вида
-            if isinstance(view, View3D):
-                tag_type = self.settings.category_tag_types_3d.get(category)
-                view_type_name = "3D"
-            else:
-                tag_type = self.settings.category_tag_types_plan.get(category)
-                view_type_name = "План"
-            
-            if not tag_type:
-                self.logger.add("  ⚠️ Тип марки не выбран для категории '{}' ({} вид)".format(
-                    self.GetCategoryName(category), view_type_name))
-                return False
-
-            # Проверяем bounding box
-            bbox = element.get_BoundingBox(view)
-            if not bbox or not bbox.Min or not bbox.Max:
-                self.logger.add("  ⚠️ Элемент ID {} не имеет bounding box на виде {}".format(
-                    element.Id.IntegerValue, view.Name))
-                return False
-
-            center = (bbox.Min + bbox.Max) / 2
-            scale_factor = 100.0 / view.Scale
-
-            self.logger.add("  -> Элемент ID {}: центр=({}, {}), масштаб={}".format(
-                element.Id.IntegerValue,
-                round(center.X, 2),
-                round(center.Y, 2),
-                round(view.Scale, 1)))
-
-            # Информация о типе марки
-            if tag_type:
-                try:
-                    tag_info = "ID={}, Class={}".format(
-                        tag_type.Id.IntegerValue,
-                        tag_type.__class__.__name__)
-                    self.logger.add("  -> Тип марки ({}): {}".format(view_type_name, tag_info))
-                except:
-                    self.logger.add("  -> Тип марки: ID={}".format(tag_type.Id.IntegerValue))
-            else:
-                self.logger.add("  -> Тип марки: НЕ УКАЗАН")
-
-            offset_x = (self.settings.offset_x * scale_factor) / MM_TO_FEET
-            offset_y = (self.settings.offset_y * scale_factor) / MM_TO_FEET
-
-            # Для 3D видов - случайное направление, для планов - только XY
-            if isinstance(view, View3D):
-                # 3D вид - случайное направление по всем осям
-                if self.settings.random_offset:
-                    direction_x = random.choice([-1, 1])
-                    direction_y = random.choice([-1, 1])
-                    direction_z = random.choice([-1, 1])
-                else:
-                    direction_x = 1 if element.Id.IntegerValue % 2 == 0 else -1
-                    direction_y = 1 if element.Id.IntegerValue % 3 == 0 else -1
-                    direction_z = 1 if element.Id.IntegerValue % 5 == 0 else -1
-
-                tag_point = XYZ(
-                    center.X + offset_x * direction_x,
-                    center.Y + offset_y * direction_y,
-                    center.Z + offset_x * 0.5 * direction_z,  # Меньшее смещение по Z
-                )
-            else:
-                # План этажа - смещение только по XY
-                if self.settings.random_offset:
-                    direction_x = random.choice([-1, 1])
-                    direction_y = random.choice([-1, 1])
-                else:
-                    direction_x = 1 if element.Id.IntegerValue % 2 == 0 else -1
-                    direction_y = 1 if element.Id.IntegerValue % 3 == 0 else -1
+            self.PrepareManifest()
+            plan = self.engine.plan(
+                self.settings.selected_views,
+                self.settings.selected_categories,
+                self.settings.category_tag_types_3d,
+                self.settings.category_tag_types_plan,
+            )
+            rows = export_plan(plan, dialog.FileName, self.GetElementName)
+        except Exception as e:
+            error_msg = "Ошибка построения плана: {0}".format(e)
+            self.logger.add(error_msg)
+            MessageBox.Show(error_msg, "Ошибка")
+            return
 
-                tag_point = XYZ(
-                    center.X + offset_x * direction_x,
-                    center.Y + offset_y * direction_y,
-                    center.Z,
-                )
+        skipped = {}
+        for element, view, reason in plan.skipped:
+            skipped[reason] = skipped.get(reason, 0) + 1
+        message = "План построен за {0:.1f} с (документ не изменён).\n\n".format(
+            time.time() - start
+        )
+        message += "Марок к созданию: {0}\n".format(len(plan.items))
+        for reason, label in (
+            ("existing_tag", "Уже замаркированы"),
+            ("no_bbox", "Нет габарита на виде"),
+            ("no_tag_type", "Не выбран тип марки"),
+            ("unchanged", "Не изменились с прошлого запуска"),
+        ):
+            if skipped.get(reason):
+                message += "{0}: {1}\n".format(label, skipped[reason])
+        message += "\nЗаписано строк: {0}\n{1}".format(rows, dialog.FileName)
+        MessageBox.Show(message, "Предпросмотр плана")
+
+    def OnBatchClick(self, sender, args):
+        """
+        Обработчик кнопки 'Пакетный запуск': применяет текущие категории,
+        настройки и марки из tag_defaults.json к нескольким документам.
+        """
+        self.SaveTagDefaults()
+        form = BatchRunForm(self.doc.Application, self.GetBatchConfigPath())
+        if form.ShowDialog() != DialogResult.OK:
+            return
 
-            self.logger.add("  -> Точка для марки: ({}, {}, {})".format(
-                round(tag_point.X, 2),
-                round(tag_point.Y, 2),
-                round(tag_point.Z, 2)))
+        config = BatchConfig.FromSettings(self.settings, form.ViewPattern, self.tag_defaults)
+        config.save_opened = form.SaveOpened
+        try:
+            config.Save(self.GetBatchConfigPath())
+        except Exception as e:
+            self.logger.add("Ошибка сохранения пакетной конфигурации: {0}".format(e))
 
-            # Проверяем тип марки
-            if not tag_type:
-                self.logger.add("  ⚠️ Тип марки не указан!")
-                return False
+        runner = BatchRunner(
+            config, self.logger, os.path.join(os.path.dirname(__file__), "manifests")
+        )
 
-            # Получаем имя типа марки для логирования (с обработкой ошибок)
-            tag_type_name = None
-            try:
-                # Пытаемся получить имя через параметр
-                name_param = tag_type.LookupParameter("Тип")
-                if name_param and name_param.HasValue:
-                    tag_type_name = name_param.AsString()
-                
-                if not tag_type_name:
-                    name_param = tag_type.LookupParameter("Type Name")
-                    if name_param and name_param.HasValue:
-                        tag_type_name = name_param.AsString()
-                
-                if not tag_type_name:
-                    # Пробуем прямое свойство
-                    tag_type_name = str(tag_type.Name) if tag_type.Name else None
-                    
-            except:
-                pass
-            
-            # Если не удалось получить имя, используем ID
-            if not tag_type_name:
-                tag_type_name = "ID_{}".format(tag_type.Id.IntegerValue)
-
-            # Проверяем и активируем типоразмер если нужно
-            if not tag_type.IsActive:
-                self.logger.add("  ⚠️ Тип марки '{}' не активен, активирую...".format(tag_type_name))
-                try:
-                    tag_type.Activate()
-                    self.logger.add("  ✓ Тип марки '{}' активирован".format(tag_type_name))
-                except Exception as e:
-                    self.logger.add("  ⚠️ Не удалось активировать тип '{}': {}".format(tag_type_name, e))
-                    # Продолжаем, возможно марка создастся с типом по умолчанию
-
-            tag = IndependentTag.Create(
-                self.doc,
-                view.Id,
-                Reference(element),
-                self.settings.use_leader,
-                TagMode.TM_ADDBY_CATEGORY,
-                self.settings.orientation,
-                tag_point,
+        def OnDocument(summary):
+            self.lblProgress.Text = "Обработан документ: {0} ({1:.1f} с)".format(
+                summary.title, summary.total_time
             )
+            Application.DoEvents()
 
-            if tag:
-                self.logger.add("  ✓ Марка создана для элемента ID {}".format(element.Id.IntegerValue))
+        if form.Paths:
+            runner.RunFiles(self.doc.Application, form.Paths, OnDocument)
+        else:
+            runner.RunDocuments(list(self.doc.Application.Documents), OnDocument)
 
-                # Примечание: Тип конца выноски (Leader End) нельзя изменить программно
-                # Это настройка семейства марки, которая задаётся в редакторе семейств Revit
+        report_path = os.path.join(
+            os.path.dirname(__file__), "batch_reports", summary_file_name()
+        )
+        try:
+            runner.WriteSummary(report_path)
+        except Exception as e:
+            report_path = "не сохранена ({0})".format(e)
+        MessageBox.Show(
+            runner.SummaryText() + "\n\nСводка: " + report_path, "Пакетный запуск"
+        )
 
-                # Пытаемся установить нужный типоразмер
-                try:
-                    tag.ChangeTypeId(tag_type.Id)
-                    self.logger.add("  ✓ Тип марки изменён на '{}'".format(tag_type_name))
-                except Exception as e:
-                    self.logger.add("  ⚠️ Не удалось изменить тип марки на '{}': {}".format(tag_type_name, e))
-                    self.logger.add("     Примечание: марка создана с типом по умолчанию")
-                return True
-            else:
-                self.logger.add("  ⚠️ IndependentTag.Create вернул None")
-                return False
+    def GetBatchConfigPath(self):
+        """
+        Returns:
+            str: Путь к сохранённой конфигурации пакетного запуска.
+        """
+        return os.path.join(os.path.dirname(__file__), "batch_config.json")
 
-        except Exception as e:
-            self.logger.add("  ⚠️ Exception при создании марки: {0}".format(e))
-            return False
+    def ResumeViews(self, views, checkpoint):
+        """
+        Предлагает продолжить прерванный запуск.
 
-    def HasExistingTag(self, element, view):
+        Завершённые виды не исключаются: контрольная точка записывается до
+        сохранения документа, и их марки могли пропасть. Они планируются
+        заново, уже существующие марки отсекает индекс, а RecheckResumed
+        сообщает, сколько марок пришлось восстановить.
+
+        Args:
+            views (list): Выбранные виды.
+            checkpoint (RunCheckpoint): Контрольная точка запуска.
+
+        Returns:
+            list: Виды для обработки.
+        """
+        if not checkpoint.IsResumable():
+            return views
+        answer = MessageBox.Show(
+            "Найден прерванный запуск: подтверждено частей {0}, марок {1}, "
+            "завершено видов {2}.\n\nПродолжить с места остановки? Завершённые виды "
+            "будут перепроверены по существующим маркам.".format(
+                checkpoint.committed_chunks,
+                checkpoint.committed_tags,
+                len(checkpoint.completed_views),
+            ),
+            "Продолжение",
+            MessageBoxButtons.YesNo,
+        )
+        if answer != DialogResult.Yes:
+            checkpoint.Clear()
+            return views
+        self.logger.add("Продолжение запуска: перепроверка завершённых видов {0}".format(
+            len(checkpoint.completed_views)))
+        return views
+
+    def RecheckResumed(self, plan, checkpoint):
         """
-        Проверяет, есть ли уже марка для элемента на виде.
+        Сверяет завершённые виды контрольной точки с планом продолжения.
 
         Args:
-            element (Element): Элемент.
-            view (View): Вид (3D или План).
+            plan (TagPlan): План продолжения.
+            checkpoint (RunCheckpoint): Контрольная точка запуска.
+        """
+        if checkpoint is None or not checkpoint.completed_views:
+            return
+        lost = checkpoint.Recheck(planned.view.Id.IntegerValue for planned in plan.items)
+        if lost:
+            lost_tags = sum(1 for planned in plan.items if planned.view.Id.IntegerValue in lost)
+            self.logger.warning(
+                "Документ не был сохранён после прерванного запуска: на завершённых видах "
+                "({0}) будут заново созданы марки: {1}", len(lost), lost_tags)
+
+    def GetRunSignature(self):
+        """
+        Возвращает подпись запуска по выбранным видам, категориям и маркам.
 
         Returns:
-            bool: True, если марка существует.
+            str: Подпись запуска.
         """
-        try:
-            for tag in (
-                FilteredElementCollector(self.doc, view.Id)
-                .OfClass(IndependentTag)
-                .ToElements()
-            ):
-                try:
-                    for tagged_elem in tag.GetTaggedLocalElements():
-                        if tagged_elem.Id == element.Id:
-                            return True
-                except Exception as e:
-                    self.logger.add("Ошибка проверки марки {0}: {1}".format(tag.Id, e))
-                    if (
-                        hasattr(tag, "TaggedLocalElementId")
-                        and tag.TaggedLocalElementId == element.Id
-                    ):
-                        return True
-            return False
-        except Exception as e:
-            self.logger.add("Ошибка проверки существующей марки: {0}".format(e))
-            return False
+        tag_types = list(self.settings.category_tag_types_3d.values()) + list(
+            self.settings.category_tag_types_plan.values()
+        )
+        return run_signature(
+            [v.Id.IntegerValue for v in self.settings.selected_views],
+            [c.Id.IntegerValue for c in self.settings.selected_categories],
+            [t.Id.IntegerValue for t in tag_types if t],
+        )
+
+    def OnEngineProgress(self, done, total):
+        """
+        Передаёт прогресс выполнения плана в счётчик (обновление UI ограничено по частоте).
+
+        Args:
+            done (int): Количество обработанных элементов.
+            total (int): Общее количество элементов.
+        """
+        self.progress.Update(done)
+
+    def OnProgressReport(self, reporter):
+        """
+        Обновляет прогресс-бар и строку состояния.
+
+        Args:
+            reporter (ProgressReporter): Счётчик прогресса.
+        """
+        self.progressBar.Value = min(reporter.done, self.progressBar.Maximum)
+        self.lblProgress.Text = reporter.Text()
+        # Обновляем UI для плавного отображения прогресса
+        Application.DoEvents()
 
     def OnShowLogsClick(self, sender, args):
         """
@@ -1655,88 +1515,58 @@ class MainForm(Form):
 
     def LoadTagDefaults(self):
         """
-        Загружает сохраненные дефолты марок из файла.
+        Загружает профиль марок текущего документа из tag_defaults.json.
 
         Returns:
-            dict: Словарь с марками по категориям.
+            dict: Словарь с марками по категориям (изменяется на месте).
         """
         config_path = self.GetConfigPath()
-        if os.path.exists(config_path):
-            try:
-                # Используем codecs для совместимости с IronPython 2.7
-                with codecs.open(config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.logger.add("Настройки марок загружены из: {}".format(config_path))
-                    return data
-            except Exception as e:
-                self.logger.add("Ошибка загрузки настроек марок: {0}".format(e))
-        else:
-            self.logger.add("Файл настроек не найден: {}".format(config_path))
-        return {}
+        self.tag_profiles = TagProfileStore.Load(config_path)
+        if self.tag_profiles.error:
+            self.logger.add("Ошибка загрузки настроек марок: {0}".format(self.tag_profiles.error))
+        profile = self.tag_profiles.Profile(document_profile_key(self.doc), self.doc.Title)
+        self.logger.add("Настройки марок загружены из: {}".format(config_path))
+        return profile["categories"]
 
     def SaveTagDefaults(self):
         """
-        Сохраняет выбранные марки в файл (и для 3D, и для планов).
+        Обновляет в профиле выбранные марки (и для 3D, и для планов) и
+        записывает профиль, если он изменился.
         """
-        defaults = {}
-
-        # Сохраняем настройки для 3D видов
-        for cat, family in self.settings.category_tag_families_3d.items():
-            cat_name = self.GetCategoryName(cat)
-            if cat_name not in defaults:
-                defaults[cat_name] = {}
-
-            family_name = self.GetElementName(family)
-            type_elem = self.settings.category_tag_types_3d.get(cat)
-            type_name = self.GetElementName(type_elem) if type_elem else ""
-
-            if family_name and type_name:
-                defaults[cat_name]["family_3d"] = family_name
-                defaults[cat_name]["type_3d"] = type_name
-
-        # Сохраняем настройки для планов
-        for cat, family in self.settings.category_tag_families_plan.items():
-            cat_name = self.GetCategoryName(cat)
-            if cat_name not in defaults:
-                defaults[cat_name] = {}
-
-            family_name = self.GetElementName(family)
-            type_elem = self.settings.category_tag_types_plan.get(cat)
-            type_name = self.GetElementName(type_elem) if type_elem else ""
-
-            if family_name and type_name:
-                defaults[cat_name]["family_plan"] = family_name
-                defaults[cat_name]["type_plan"] = type_name
+        for suffix, families, types in (
+            ("3d", self.settings.category_tag_families_3d, self.settings.category_tag_types_3d),
+            ("plan", self.settings.category_tag_families_plan, self.settings.category_tag_types_plan),
+        ):
+            for cat, family in families.items():
+                type_elem = types.get(cat)
+                family_name = self.GetElementName(family)
+                type_name = self.GetElementName(type_elem) if type_elem else ""
+                if family_name and type_name:
+                    store_tag(
+                        self.tag_defaults.setdefault(self.GetCategoryName(cat), {}),
+                        suffix, family_name, type_name, type_elem.Id.IntegerValue,
+                    )
 
-        config_path = self.GetConfigPath()
         try:
-            # Используем codecs для совместимости с IronPython 2.7
-            with codecs.open(config_path, "w", encoding="utf-8") as f:
-                json.dump(defaults, f, ensure_ascii=False, indent=4)
-            self.logger.add("Настройки марок сохранены в: {}".format(config_path))
+            if self.tag_profiles.Save(document_profile_key(self.doc)):
+                self.logger.add("Настройки марок сохранены в: {}".format(self.GetConfigPath()))
         except Exception as e:
             self.logger.add("Ошибка сохранения настроек марок: {0}".format(e))
 
-    def FindSavedTag(self, family_name, type_name):
+    def FindSavedTag(self, family_name, type_name, type_id=None):
         """
-        Находит семейство и тип по именам из сохраненных.
+        Находит семейство и тип сохранённой марки: по id типоразмера, при
+        несовпадении - по именам.
 
         Args:
             family_name (str): Имя семейства.
             type_name (str): Имя типоразмера.
+            type_id (int, optional): Сохранённый IntegerValue id типоразмера.
 
         Returns:
             tuple: (Family, FamilySymbol) или (None, None).
         """
-        collector = FilteredElementCollector(self.doc).OfClass(Family)
-        for family in collector:
-            if self.GetElementName(family) == family_name:
-                symbol_ids = family.GetFamilySymbolIds()
-                for symbol_id in symbol_ids:
-                    symbol = self.doc.GetElement(symbol_id)
-                    if self.GetElementName(symbol) == type_name:
-                        return family, symbol
-        return None, None
+        return self.tag_catalog.FindSaved(family_name, type_name, type_id)
 
     def GetConfigPath(self):
         """
@@ -1748,6 +1578,150 @@ class MainForm(Form):
         script_dir = os.path.dirname(__file__)
         return os.path.join(script_dir, "tag_defaults.json")
 
+    def GetCheckpointPath(self):
+        """
+        Возвращает путь к контрольной точке запуска для документа.
+
+        Returns:
+            str: Путь к checkpoints/<ключ документа>.json.
+        """
+        script_dir = os.path.dirname(__file__)
+        return os.path.join(script_dir, "checkpoints", document_key(self.doc) + ".json")
+
+    def GetManifestPath(self):
+        """
+        Возвращает путь к манифесту инкрементальных запусков для документа.
+
+        Returns:
+            str: Путь к manifests/<ключ документа>.json.
+        """
+        script_dir = os.path.dirname(__file__)
+        return os.path.join(script_dir, "manifests", document_key(self.doc) + ".json")
+
+
+# Форма пакетного запуска
+class BatchRunForm(Form):
+    """
+    Форма параметров пакетного запуска: шаблон имён видов и источник документов.
+
+    Attributes:
+        ViewPattern (str): Регулярное выражение для имён видов.
+        Paths (list): Файлы для обработки; пустой список - открытые документы.
+        SaveOpened (bool): Сохранять файлы после обработки.
+    """
+
+    def __init__(self, application, config_path):
+        self.ViewPattern = ""
+        self.Paths = []
+        self.SaveOpened = True
+        if os.path.exists(config_path):
+            try:
+                config = BatchConfig.Load(config_path)
+                self.ViewPattern = config.view_pattern
+                self.SaveOpened = config.save_opened
+            except Exception:
+                pass
+        self.open_titles = [
+            doc.Title for doc in application.Documents
+            if not doc.IsLinked and not doc.IsFamilyDocument
+        ]
+        self.InitializeComponent()
+
+    def InitializeComponent(self):
+        """
+        Инициализирует компоненты формы.
+        """
+        self.Text = "Пакетный запуск"
+        self.Size = Size(600, 420)
+        self.StartPosition = FormStartPosition.CenterParent
+        self.FormBorderStyle = FormBorderStyle.FixedDialog
+        self.MaximizeBox = False
+        self.MinimizeBox = False
+
+        self.txtPattern = TextBox(
+            Text=self.ViewPattern, Location=Point(200, 10), Size=Size(370, 20)
+        )
+        self.rbOpen = RadioButton(
+            Text="Открытые документы ({0})".format(len(self.open_titles)),
+            Location=Point(10, 45),
+            Size=Size(300, 20),
+            Checked=True,
+        )
+        self.rbFiles = RadioButton(
+            Text="Файлы из списка", Location=Point(10, 70), Size=Size(200, 20)
+        )
+        self.btnAddFiles = Button(
+            Text="Добавить…", Location=Point(470, 68), Size=Size(100, 25)
+        )
+        self.lstFiles = ListBox(Location=Point(10, 100), Size=Size(560, 200))
+        self.chkSave = CheckBox(
+            Text="Сохранять и закрывать файлы после обработки",
+            Location=Point(10, 310),
+            Size=Size(400, 20),
+            Checked=self.SaveOpened,
+        )
+        self.btnRun = Button(Text="Запустить", Location=Point(390, 345), Size=Size(90, 25))
+        self.btnCancel = Button(Text="Отмена", Location=Point(485, 345), Size=Size(85, 25))
+
+        self.btnAddFiles.Click += self.OnAddFilesClick
+        self.btnRun.Click += self.OnRunClick
+        self.btnCancel.Click += self.OnCancelClick
+
+        controls = [
+            Label(
+                Text="Шаблон имён видов (regex):", Location=Point(10, 12), Size=Size(185, 20)
+            ),
+            self.txtPattern,
+            self.rbOpen,
+            self.rbFiles,
+            self.btnAddFiles,
+            self.lstFiles,
+            self.chkSave,
+            self.btnRun,
+            self.btnCancel,
+        ]
+        for c in controls:
+            self.Controls.Add(c)
+
+    def OnAddFilesClick(self, sender, args):
+        """
+        Обработчик кнопки 'Добавить…': выбор файлов .rvt.
+        """
+        dialog = OpenFileDialog()
+        dialog.Filter = "Revit (*.rvt)|*.rvt"
+        dialog.Multiselect = True
+        if dialog.ShowDialog() == DialogResult.OK:
+            for path in dialog.FileNames:
+                if not self.lstFiles.Items.Contains(path):
+                    self.lstFiles.Items.Add(path)
+            self.rbFiles.Checked = True
+
+    def OnRunClick(self, sender, args):
+        """
+        Обработчик кнопки 'Запустить'.
+        """
+        self.ViewPattern = self.txtPattern.Text.strip()
+        try:
+            re.compile(self.ViewPattern)
+        except re.error as e:
+            MessageBox.Show("Некорректный шаблон: {0}".format(e))
+            return
+        if self.rbFiles.Checked:
+            self.Paths = list(self.lstFiles.Items)
+            if not self.Paths:
+                MessageBox.Show("Добавьте файлы для обработки!")
+                return
+        self.SaveOpened = self.chkSave.Checked
+        self.DialogResult = DialogResult.OK
+        self.Close()
+
+    def OnCancelClick(self, sender, args):
+        """
+        Обработчик кнопки Отмена.
+        """
+        self.DialogResult = DialogResult.Cancel
+        self.Close()
+
 
 # Форма выбора семейства марки
 class TagFamilySelectionForm(Form):
@@ -1757,18 +1731,24 @@ class TagFamilySelectionForm(Form):
     Attributes:
         doc (Document): Документ Revit.
         available_families (list): Список доступных семейств.
+        catalog (TagFamilyCatalog): Каталог семейств марок (необязательно).
+        names (ElementNameCache): Кэш имён, общий с главной формой.
         selected_family: Выбранное семейство.
         selected_type: Выбранный типоразмер.
     """
 
-    def __init__(self, doc, available_families, current_family, current_type):
+    def __init__(
+        self, doc, available_families, current_family, current_type, catalog=None, names=None
+    ):
         self.doc = doc
         self.available_families = available_families
+        self.catalog = catalog
         self.selected_family = None
         self.selected_type = None
         self.family_dict = {}
         self.type_dict = {}
-        self.logger = Logger(enabled=True)  # Логирование для формы выбора
+        self.logger = Logger(enabled=True, spill_path=None)  # Логирование для формы выбора
+        self.names = names or ElementNameCache(self.logger)
 
         self.InitializeComponent()
         self.PopulateFamilies()
@@ -1826,7 +1806,7 @@ class TagFamilySelectionForm(Form):
 
         for family in self.available_families:
             if family:
-                family_name = self.GetElementNameImproved(family)
+                family_name = self.GetElementName(family)
                 self.lstFamilies.Items.Add(family_name)
                 self.family_dict[family_name] = family
 
@@ -1836,7 +1816,7 @@ class TagFamilySelectionForm(Form):
 
     def GetElementName(self, element):
         """
-        Получает имя элемента Revit.
+        Получает имя элемента Revit из общего кэша имён.
 
         Args:
             element (Element): Элемент Revit.
@@ -1844,123 +1824,7 @@ class TagFamilySelectionForm(Form):
         Returns:
             str: Имя элемента.
         """
-        if not element:
-            return "Без имени"
-        try:
-            # Для FamilySymbol (типоразмеров)
-            if isinstance(element, FamilySymbol):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-
-                if hasattr(element, "Family") and element.Family:
-                    family_name = (
-                        element.Family.Name
-                        if hasattr(element.Family, "Name") and element.Family.Name
-                        else ""
-                    )
-
-                    # Пробуем получить имя типа через параметры
-                    type_name = ""
-                    for param_name in ["Тип", "Type Name", "Имя типа"]:
-                        param = element.LookupParameter(param_name)
-                        if param and param.HasValue:
-                            type_name = param.AsString()
-                            break
-
-                    if family_name and type_name:
-                        return family_name + " - " + type_name
-                    elif type_name:
-                        return type_name
-                    elif family_name:
-                        return family_name
-
-                return "Типоразмер " + str(element.Id.IntegerValue)
-
-            # Для Family (семейств)
-            elif isinstance(element, Family):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-                return "Семейство " + str(element.Id.IntegerValue)
-
-            # Общий случай
-            if hasattr(element, "Name") and element.Name:
-                name = element.Name
-                if name and not name.startswith("IronPython"):
-                    return name
-
-        except Exception as e:
-            self.logger.add(
-                "GetElementName: Ошибка при получении имени элемента: {0}".format(e)
-            )
-
-        return "Элемент " + str(element.Id.IntegerValue)
-
-    def GetElementNameImproved(self, element):
-        """
-        Получает улучшенное имя для элемента Revit.
-
-        Args:
-            element (Element): Элемент Revit.
-
-        Returns:
-            str: Имя элемента.
-        """
-        if not element:
-            return "Без имени"
-        try:
-            # Для FamilySymbol (типоразмеров)
-            if isinstance(element, FamilySymbol):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-
-                if hasattr(element, "Family") and element.Family:
-                    family_name = (
-                        element.Family.Name
-                        if hasattr(element.Family, "Name") and element.Family.Name
-                        else ""
-                    )
-
-                    # Пробуем получить имя типа через параметры
-                    type_name = ""
-                    for param_name in ["Тип", "Type Name", "Имя типа"]:
-                        param = element.LookupParameter(param_name)
-                        if param and param.HasValue:
-                            type_name = param.AsString()
-                            break
-
-                    if family_name and type_name:
-                        return family_name + " - " + type_name
-                    elif type_name:
-                        return type_name
-                    elif family_name:
-                        return family_name
-
-                return "Типоразмер " + str(element.Id.IntegerValue)
-
-            # Для Family (семейств)
-            elif isinstance(element, Family):
-                if hasattr(element, "Name") and element.Name:
-                    name = element.Name
-                    if name and not name.startswith("IronPython"):
-                        return name
-                return "Семейство " + str(element.Id.IntegerValue)
-
-            # Общий случай
-            if hasattr(element, "Name") and element.Name:
-                name = element.Name
-                if name and not name.startswith("IronPython"):
-                    return name
-
-        except Exception as e:
-            self.logger.add("Ошибка получения имени элемента: {0}".format(e))
-
-        return "Элемент " + str(element.Id.IntegerValue)
+        return self.names.Get(element)
 
     def OnFamilySelected(self, sender, args):
         """
@@ -1983,12 +1847,14 @@ class TagFamilySelectionForm(Form):
         self.type_dict.clear()
 
         try:
-            symbol_ids = family.GetFamilySymbolIds()
-            if symbol_ids and symbol_ids.Count > 0:
-                for symbol_id in list(symbol_ids):
-                    symbol = self.doc.GetElement(symbol_id)
+            if self.catalog:
+                symbols = self.catalog.Symbols(family)
+            else:
+                symbols = [self.doc.GetElement(symbol_id) for symbol_id in family.GetFamilySymbolIds()]
+            if symbols:
+                for symbol in symbols:
                     if symbol:
-                        symbol_name = self.GetElementNameImproved(symbol)
+                        symbol_name = self.GetElementName(symbol)
                         status = " (активный)" if symbol.IsActive else " (не активный)"
                         display_name = (
                             symbol_name
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Замеры marks_engine на документе-заглушке (tests/revit_stub).
+
+Проверка существующих марок: TaggedElementIndex против прежнего
+HasExistingTag, который для каждого элемента собирал марки вида и обходил
+их GetTaggedLocalElements. Прежний способ квадратичен, поэтому на больших
+видах он замеряется на выборке элементов и пересчитывается на весь вид.
+
+Сбор элементов вида: один коллектор с ElementMulticategoryFilter
+(TagPlacementEngine.CollectElementsByCategory) против прежнего коллектора
+OfCategoryId на каждую категорию.
+
+Запуск из корня репозитория:
+    python bench/bench_marks_engine.py [--sizes 100,1000,5000,20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tests", "revit_stub"))
+sys.path.insert(0, os.path.join(ROOT, "BIM_Rage_4er.extension", "lib"))
+
+from Autodesk.Revit.DB import FilteredElementCollector, IndependentTag  # noqa: E402
+
+from marks_engine import TagPlacementEngine, TaggedElementIndex  # noqa: E402
+from stub_model import build_document  # noqa: E402
+
+DEFAULT_SIZES = (100, 1000, 5000, 20000)
+TAGGED_SHARE = 0.25
+# Максимум элементов, на которых замеряется прежняя проверка
+LEGACY_SAMPLE = 500
+# Элементы других категорий на виде (трубы) относительно выбранных
+OTHER_SHARE = 1.0
+# Повторы замера сбора элементов (берётся лучшее время)
+COLLECT_REPEATS = 3
+
+
+def legacy_has_existing_tag(doc, element, view):
+    """
+    Прежняя проверка MainForm.HasExistingTag: новый коллектор марок вида
+    на каждый элемент.
+    """
+    for tag in FilteredElementCollector(doc, view.Id).OfClass(IndependentTag).ToElements():
+        for tagged_elem in tag.GetTaggedLocalElements():
+            if tagged_elem.Id == element.Id:
+                return True
+    return False
+
+
+def bench_tag_index(sizes):
+    """
+    Сравнивает проверку наличия марок по индексу и прежним обходом.
+
+    Args:
+        sizes (list): Количества элементов на виде.
+
+    Returns:
+        list: [(элементов, марок, с прежним способом, с индексом, оценка по выборке)].
+    """
+    rows = []
+    for size in sizes:
+        doc, view, categories, elements = build_document(size, TAGGED_SHARE)
+        tag_count = FilteredElementCollector(doc, view.Id).OfClass(IndependentTag).GetElementCount()
+
+        start = time.time()
+        index = TaggedElementIndex(doc)
+        indexed = sum(1 for element in elements if index.Contains(element, view))
+        index_time = time.time() - start
+
+        # Равномерная выборка: марки ранних элементов находятся быстрее
+        sample = elements[::max(1, len(elements) // LEGACY_SAMPLE)]
+        start = time.time()
+        legacy = sum(1 for element in sample if legacy_has_existing_tag(doc, element, view))
+        legacy_time = (time.time() - start) * len(elements) / len(sample)
+
+        expected = sum(1 for element in sample if index.Contains(element, view))
+        if legacy != expected or indexed != tag_count:
+            raise AssertionError("Результаты проверок расходятся")
+        rows.append((size, tag_count, legacy_time, index_time, len(sample) < len(elements)))
+    return rows
+
+
+def legacy_collect_by_category(doc, view, categories):
+    """
+    Прежний сбор элементов в OnExecuteClick: коллектор на каждую категорию.
+    """
+    return dict(
+        (
+            category.Id.IntegerValue,
+            list(
+                FilteredElementCollector(doc, view.Id)
+                .OfCategoryId(category.Id)
+                .WhereElementIsNotElementType()
+                .ToElements()
+            ),
+        )
+        for category in categories
+    )
+
+
+def best_time(func, *args):
+    best = None
+    for _ in range(COLLECT_REPEATS):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_collectors(sizes):
+    """
+    Сравнивает сбор элементов вида одним коллектором и по категориям.
+
+    Args:
+        sizes (list): Количества элементов выбранных категорий на виде.
+
+    Returns:
+        list: [(элементов на виде, категорий, с по категориям, с одним проходом)].
+    """
+    rows = []
+    for size in sizes:
+        doc, view, categories, elements = build_document(size, other_share=OTHER_SHARE)
+        engine = TagPlacementEngine(doc, None)
+        legacy_time, legacy = best_time(legacy_collect_by_category, doc, view, categories)
+        single_time, single = best_time(engine.CollectElementsByCategory, view, categories)
+        if legacy != single:
+            raise AssertionError("Результаты сбора расходятся")
+        view_size = len(doc.Candidates(view.Id))
+        rows.append((view_size, len(categories), legacy_time, single_time))
+    return rows
+
+
+def print_collectors(rows):
+    print("Сбор элементов вида (выбранные категории + {0:.0%} других)".format(OTHER_SHARE))
+    print("{0:>9} {1:>9} {2:>14} {3:>12} {4:>9}".format(
+        "элементов", "категорий", "по категор., с", "один проход, с", "ускорение"))
+    for view_size, category_count, legacy_time, single_time in rows:
+        print("{0:>9} {1:>9} {2:>14.4f} {3:>14.4f} {4:>8.1f}x".format(
+            view_size, category_count, legacy_time, single_time,
+            legacy_time / single_time if single_time else 0.0))
+
+
+def print_tag_index(rows):
+    print("Проверка существующих марок (один вид, замаркировано {0:.0%})".format(TAGGED_SHARE))
+    print("{0:>9} {1:>7} {2:>14} {3:>12} {4:>9}".format(
+        "элементов", "марок", "прежний, с", "индекс, с", "ускорение"))
+    for size, tag_count, legacy_time, index_time, estimated in rows:
+        print("{0:>9} {1:>7} {2:>13.3f}{3} {4:>12.4f} {5:>8.0f}x".format(
+            size, tag_count, legacy_time, "*" if estimated else " ", index_time,
+            legacy_time / index_time if index_time else 0.0))
+    print("* оценка по выборке из {0} элементов".format(LEGACY_SAMPLE))
+
+
+def parse_sizes(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="количества элементов на виде через запятую")
+    args = parser.parse_args(argv)
+    print_tag_index(bench_tag_index(args.sizes))
+    print("")
+    print_collectors(bench_collectors(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
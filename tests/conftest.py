@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты библиотек расширения запускаются вне Revit: вместо Autodesk.Revit.DB
+подключается заглушка из tests/revit_stub.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tests", "revit_stub"))
+sys.path.insert(0, os.path.join(ROOT, "BIM_Rage_4er.extension", "lib"))
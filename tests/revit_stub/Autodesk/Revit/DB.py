@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Минимальная заглушка Autodesk.Revit.DB для запуска библиотек вне Revit.
+
+Реализована только та часть API, которую используют marks_engine и его
+зависимости: элементы, виды, марки, коллектор, транзакции. Документ
+(Document) хранит элементы в памяти; коллектор вида перебирает элементы
+вида так же, как FilteredElementCollector Revit - одним проходом с
+применением всех фильтров.
+"""
+
+
+class _Enum(int):
+    """
+    Значение перечисления .NET: сравнивается как int, печатается по имени.
+    """
+
+    _names = {}
+
+    def __repr__(self):
+        return self._names.get(int(self), str(int(self)))
+
+    __str__ = __repr__
+
+
+def _fill_enum(enum_type, values):
+    enum_type._names = {}
+    for name, value in values.items():
+        setattr(enum_type, name, enum_type(value))
+        enum_type._names[value] = name
+
+
+class BuiltInCategory(_Enum):
+    pass
+
+
+_fill_enum(BuiltInCategory, {
+    "INVALID": -1,
+    "OST_DuctCurves": -2008000,
+    "OST_DuctFitting": -2008010,
+    "OST_DuctTerminal": -2008013,
+    "OST_DuctAccessory": -2008016,
+    "OST_FlexDuctCurves": -2008020,
+    "OST_PipeCurves": -2008044,
+    "OST_MechanicalEquipment": -2001140,
+    "OST_DuctTags": -2008003,
+})
+
+
+class BuiltInParameter(_Enum):
+    pass
+
+
+_fill_enum(BuiltInParameter, {
+    "INVALID": -1,
+    "RBS_SYSTEM_NAME_PARAM": -1140325,
+    "CURVE_ELEM_LENGTH": -1004005,
+    "RBS_CURVE_DIAMETER_PARAM": -1114132,
+    "RBS_CURVE_WIDTH_PARAM": -1114134,
+    "RBS_CURVE_HEIGHT_PARAM": -1114133,
+    "SYMBOL_NAME_PARAM": -1002002,
+})
+
+
+class StorageType(_Enum):
+    pass
+
+
+_fill_enum(StorageType, {"None": 0, "Integer": 1, "Double": 2, "String": 3, "ElementId": 4})
+
+
+class TagMode(_Enum):
+    pass
+
+
+_fill_enum(TagMode, {"TM_ADDBY_CATEGORY": 0, "TM_ADDBY_MULTICATEGORY": 1})
+
+
+class TagOrientation(_Enum):
+    pass
+
+
+_fill_enum(TagOrientation, {"Horizontal": 0, "Vertical": 1})
+
+
+class LabelUtils(object):
+    @staticmethod
+    def GetLabelFor(built_in_category):
+        return repr(BuiltInCategory(built_in_category))
+
+
+class ElementId(object):
+    def __init__(self, value):
+        self.IntegerValue = int(value)
+
+    def __eq__(self, other):
+        return isinstance(other, ElementId) and other.IntegerValue == self.IntegerValue
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.IntegerValue)
+
+    def __repr__(self):
+        return str(self.IntegerValue)
+
+
+ElementId.InvalidElementId = ElementId(-1)
+
+
+class XYZ(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.X, self.Y, self.Z = x, y, z
+
+    def __add__(self, other):
+        return XYZ(self.X + other.X, self.Y + other.Y, self.Z + other.Z)
+
+    def __sub__(self, other):
+        return XYZ(self.X - other.X, self.Y - other.Y, self.Z - other.Z)
+
+    def __mul__(self, value):
+        return XYZ(self.X * value, self.Y * value, self.Z * value)
+
+    def __truediv__(self, value):
+        return XYZ(self.X / value, self.Y / value, self.Z / value)
+
+    __div__ = __truediv__
+
+
+class BoundingBoxXYZ(object):
+    def __init__(self, low, high):
+        self.Min = XYZ(*low)
+        self.Max = XYZ(*high)
+
+
+class Line(object):
+    def __init__(self, start, end):
+        self.points = (start, end)
+
+    @staticmethod
+    def CreateBound(start, end):
+        return Line(start, end)
+
+    def GetEndPoint(self, index):
+        return self.points[index]
+
+
+class LocationCurve(object):
+    def __init__(self, curve):
+        self.Curve = curve
+
+
+class Category(object):
+    def __init__(self, built_in_category):
+        self.Id = ElementId(built_in_category)
+        self.Name = repr(BuiltInCategory(built_in_category))
+
+
+class InternalDefinition(object):
+    def __init__(self, name, built_in_parameter=BuiltInParameter.INVALID):
+        self.Name = name
+        self.BuiltInParameter = built_in_parameter
+
+
+class Parameter(object):
+    """
+    Параметр со значением в памяти.
+    """
+
+    def __init__(self, name, value, built_in_parameter=BuiltInParameter.INVALID):
+        self.Definition = InternalDefinition(name, built_in_parameter)
+        self.IsShared = False
+        self.IsReadOnly = False
+        self.HasValue = value is not None
+        self.StorageType = StorageType.Double if isinstance(value, float) else StorageType.String
+        self._value = value
+
+    def AsDouble(self):
+        return self._value
+
+    def AsString(self):
+        return self._value
+
+    def AsValueString(self):
+        return None if self._value is None else str(self._value)
+
+
+class Element(object):
+    """
+    Элемент модели.
+
+    Attributes:
+        Id (ElementId): Id, назначается документом.
+        Category (Category): Категория или None.
+        OwnerViewId (ElementId): Вид элемента, принадлежащего виду, иначе InvalidElementId.
+        bbox (BoundingBoxXYZ): Габарит на всех видах или None.
+        params (dict): {имя: Parameter}.
+    """
+
+    def __init__(self, category=None, bbox=None, type_id=None, name="", params=None):
+        self.Id = ElementId.InvalidElementId
+        self.Category = Category(category) if category is not None else None
+        self.OwnerViewId = ElementId.InvalidElementId
+        self.Name = name
+        self.Location = None
+        self.bbox = bbox
+        self.params = dict((param.Definition.Name, param) for param in params or [])
+        self._type_id = type_id or ElementId.InvalidElementId
+
+    def get_BoundingBox(self, view):
+        return self.bbox
+
+    def GetTypeId(self):
+        return self._type_id
+
+    def LookupParameter(self, name):
+        return self.params.get(name)
+
+    def get_Parameter(self, built_in_parameter):
+        for param in self.params.values():
+            if param.Definition.BuiltInParameter == built_in_parameter:
+                return param
+        return None
+
+    def ChangeTypeId(self, *args):
+        """
+        element.ChangeTypeId(type_id) или Element.ChangeTypeId(doc, ids, type_id).
+        """
+        if len(args) == 1:
+            self._type_id = args[0]
+            return
+        doc, (element_ids, type_id) = self, args
+        for element_id in element_ids:
+            doc.GetElement(element_id)._type_id = type_id
+
+
+class ElementType(Element):
+    pass
+
+
+class FamilySymbol(ElementType):
+    """
+    Типоразмер; tag_size - (ширина, высота) марки этого типа на листе в футах.
+    """
+
+    def __init__(self, name="", category=None, active=True, tag_size=None):
+        ElementType.__init__(self, category=category, name=name)
+        self.IsActive = active
+        self.tag_size = tag_size
+
+    def Activate(self):
+        self.IsActive = True
+
+
+class View(Element):
+    def __init__(self, name="", scale=100):
+        Element.__init__(self, name=name)
+        self.Scale = scale
+        self.RightDirection = XYZ(1.0, 0.0, 0.0)
+        self.UpDirection = XYZ(0.0, 1.0, 0.0)
+
+
+class View3D(View):
+    IsSectionBoxActive = False
+
+
+class ViewPlan(View):
+    pass
+
+
+class Reference(object):
+    def __init__(self, element):
+        self.ElementId = element.Id
+
+
+class IndependentTag(Element):
+    """
+    Марка элемента на виде.
+    """
+
+    def __init__(self, tagged_ids, head=None):
+        Element.__init__(self)
+        self.tagged_ids = list(tagged_ids)
+        self.TagHeadPosition = head or XYZ()
+        self.doc = None
+
+    @property
+    def TaggedLocalElementId(self):
+        return self.tagged_ids[0] if self.tagged_ids else None
+
+    def GetTaggedLocalElements(self):
+        return [self.doc.GetElement(element_id) for element_id in self.tagged_ids]
+
+    def get_BoundingBox(self, view):
+        tag_type = self.doc.GetElement(self._type_id) if self.doc else None
+        size = getattr(tag_type, "tag_size", None)
+        if not size:
+            return self.bbox
+        head = self.TagHeadPosition
+        half_w, half_h = size[0] * view.Scale / 2.0, size[1] * view.Scale / 2.0
+        return BoundingBoxXYZ(
+            (head.X - half_w, head.Y - half_h, head.Z),
+            (head.X + half_w, head.Y + half_h, head.Z),
+        )
+
+    @staticmethod
+    def Create(doc, view_id, reference, add_leader, tag_mode, orientation, point):
+        tag = IndependentTag([reference.ElementId], point)
+        tag._type_id = doc.default_tag_type_id
+        return doc.Add(tag, view_id)
+
+
+class ElementMulticategoryFilter(object):
+    def __init__(self, category_ids):
+        self.category_ids = set(category_id.IntegerValue for category_id in category_ids)
+
+    def PassesElement(self, element):
+        return element.Category is not None and element.Category.Id.IntegerValue in self.category_ids
+
+
+class ElementCategoryFilter(object):
+    def __init__(self, category_id):
+        if isinstance(category_id, ElementId):
+            category_id = category_id.IntegerValue
+        self.category_id = int(category_id)
+
+    def PassesElement(self, element):
+        return element.Category is not None and element.Category.Id.IntegerValue == self.category_id
+
+
+class FilteredElementCollector(object):
+    """
+    Коллектор элементов документа или вида.
+
+    Фильтр по классу выполняется по индексу классов документа (как быстрый
+    фильтр Revit), остальные фильтры - при одном проходе в ToElements.
+    """
+
+    def __init__(self, doc, view_id=None):
+        self.doc = doc
+        self.view_id = view_id
+        self.element_class = None
+        self.filters = []
+
+    def OfClass(self, element_class):
+        self.element_class = element_class
+        return self
+
+    def OfCategoryId(self, category_id):
+        return self.WherePasses(ElementCategoryFilter(category_id))
+
+    def OfCategory(self, built_in_category):
+        return self.WherePasses(ElementCategoryFilter(built_in_category))
+
+    def WherePasses(self, element_filter):
+        self.filters.append(element_filter.PassesElement)
+        return self
+
+    def WhereElementIsNotElementType(self):
+        self.filters.append(lambda element: not isinstance(element, ElementType))
+        return self
+
+    def WhereElementIsElementType(self):
+        self.filters.append(lambda element: isinstance(element, ElementType))
+        return self
+
+    def ToElements(self):
+        elements = self.doc.Candidates(self.view_id, self.element_class)
+        return [
+            element for element in elements
+            if all(passes(element) for passes in self.filters)
+        ]
+
+    def ToElementIds(self):
+        return [element.Id for element in self.ToElements()]
+
+    def GetElementCount(self):
+        return len(self.ToElements())
+
+    def __iter__(self):
+        return iter(self.ToElements())
+
+
+class Transaction(object):
+    """
+    Транзакция: элементы, созданные после Start, удаляются при RollBack.
+    """
+
+    def __init__(self, doc, name):
+        self.doc = doc
+        self.name = name
+        self.status = None
+
+    def Start(self):
+        if self.doc.active_transaction is not None:
+            raise Exception("Транзакция уже открыта")
+        self.doc.active_transaction = self
+        self.created = []
+        self.status = "Started"
+
+    def Commit(self):
+        self._close("Committed")
+
+    def RollBack(self):
+        for element in self.created:
+            self.doc.Remove(element)
+        self._close("RolledBack")
+
+    def Dispose(self):
+        if self.status == "Started":
+            self.RollBack()
+
+    def _close(self, status):
+        self.status = status
+        self.doc.active_transaction = None
+        self.doc.transactions.append((self.name, status))
+
+
+class Document(object):
+    """
+    Документ в памяти.
+
+    Attributes:
+        transactions (list): [(имя транзакции, "Committed" или "RolledBack")].
+        default_tag_type_id (ElementId): Тип, с которым создаются марки.
+    """
+
+    def __init__(self, title="Stub"):
+        self.Title = title
+        self.PathName = ""
+        self.elements = {}
+        self.by_class = {}
+        self.transactions = []
+        self.active_transaction = None
+        self.default_tag_type_id = ElementId.InvalidElementId
+        self._next_id = 1000
+
+    def Add(self, element, view_id=None):
+        """
+        Добавляет элемент в документ.
+
+        Args:
+            element (Element): Элемент.
+            view_id (ElementId, optional): Вид, которому принадлежит элемент (для марок).
+
+        Returns:
+            Element: Добавленный элемент.
+        """
+        self._next_id += 1
+        element.Id = ElementId(self._next_id)
+        if view_id is not None:
+            element.OwnerViewId = view_id
+        if isinstance(element, IndependentTag):
+            element.doc = self
+        self.elements[element.Id.IntegerValue] = element
+        for element_class in type(element).__mro__:
+            self.by_class.setdefault(element_class, {})[element.Id.IntegerValue] = element
+        if self.active_transaction is not None:
+            self.active_transaction.created.append(element)
+        return element
+
+    def Remove(self, element):
+        key = element.Id.IntegerValue
+        self.elements.pop(key, None)
+        for elements in self.by_class.values():
+            elements.pop(key, None)
+
+    def GetElement(self, element_id):
+        return self.elements.get(element_id.IntegerValue)
+
+    def Regenerate(self):
+        pass
+
+    def Candidates(self, view_id=None, element_class=None):
+        """
+        Элементы, видимые коллектору: все элементы документа или элементы
+        модели и элементы вида view_id.
+        """
+        elements = self.by_class.get(element_class or Element, {}).values()
+        if view_id is None:
+            return list(elements)
+        invalid = ElementId.InvalidElementId
+        return [
+            element for element in elements
+            if not isinstance(element, View)
+            and (element.OwnerViewId == invalid or element.OwnerViewId == view_id)
+        ]
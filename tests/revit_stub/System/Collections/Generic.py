@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Заглушка System.Collections.Generic для запуска библиотек вне Revit.
+"""
+
+
+class _List(list):
+    """
+    Список .NET: List[T]() и List[T](iterable).
+    """
+
+    def Add(self, item):
+        self.append(item)
+
+    @property
+    def Count(self):
+        return len(self)
+
+
+class _GenericList(object):
+    def __getitem__(self, item_type):
+        return _List
+
+
+List = _GenericList()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Построение документа-заглушки с видами, элементами и марками для тестов
+и замеров.
+"""
+
+from Autodesk.Revit.DB import (
+    BoundingBoxXYZ,
+    BuiltInCategory,
+    BuiltInParameter,
+    Category,
+    Document,
+    Element,
+    FamilySymbol,
+    IndependentTag,
+    Line,
+    LocationCurve,
+    Parameter,
+    View3D,
+    ViewPlan,
+    XYZ,
+)
+
+CATEGORIES = [
+    BuiltInCategory.OST_DuctCurves,
+    BuiltInCategory.OST_DuctFitting,
+    BuiltInCategory.OST_DuctTerminal,
+    BuiltInCategory.OST_DuctAccessory,
+    BuiltInCategory.OST_FlexDuctCurves,
+    BuiltInCategory.OST_MechanicalEquipment,
+]
+
+
+def add_view(doc, name="План 1", plan=True, scale=100):
+    """
+    Добавляет вид в документ.
+    """
+    view = ViewPlan(name, scale) if plan else View3D(name, scale)
+    return doc.Add(view)
+
+
+def add_element(doc, category, index, with_bbox=True):
+    """
+    Добавляет элемент с габаритом 1x1x1 фут в точке, зависящей от index.
+    """
+    bbox = None
+    if with_bbox:
+        x, y = float(index % 200) * 2.0, float(index // 200) * 2.0
+        bbox = BoundingBoxXYZ((x, y, 0.0), (x + 1.0, y + 1.0, 1.0))
+    return doc.Add(Element(category=category, bbox=bbox))
+
+
+def add_duct(doc, system_name, section, length, index=0):
+    """
+    Добавляет воздуховод с параметрами для группировки.
+    """
+    duct = add_element(doc, BuiltInCategory.OST_DuctCurves, index)
+    duct.params = {
+        "Имя системы": Parameter("Имя системы", system_name, BuiltInParameter.RBS_SYSTEM_NAME_PARAM),
+        "Сечение": Parameter("Сечение", section),
+        "Длина": Parameter("Длина", float(length), BuiltInParameter.CURVE_ELEM_LENGTH),
+    }
+    return duct
+
+
+def add_linear_element(doc, category, start, end, diameter=None):
+    """
+    Добавляет линейный элемент (ось start-end, габарит по оси).
+
+    Args:
+        diameter (float, optional): Диаметр сечения, футы.
+    """
+    half = (diameter or 0.0) / 2.0
+    low = tuple(min(a, b) - half for a, b in zip(start, end))
+    high = tuple(max(a, b) + half for a, b in zip(start, end))
+    element = doc.Add(Element(category=category, bbox=BoundingBoxXYZ(low, high)))
+    element.Location = LocationCurve(Line.CreateBound(XYZ(*start), XYZ(*end)))
+    if diameter:
+        element.params["Диаметр"] = Parameter(
+            "Диаметр", float(diameter), BuiltInParameter.RBS_CURVE_DIAMETER_PARAM
+        )
+    return element
+
+
+def add_tag(doc, view, element):
+    """
+    Добавляет марку элемента на вид.
+    """
+    return doc.Add(IndependentTag([element.Id], XYZ()), view.Id)
+
+
+def add_tag_type(doc, category=BuiltInCategory.OST_DuctTags, name="Марка", active=True,
+                 size_mm=None):
+    """
+    Добавляет типоразмер марки.
+
+    Args:
+        size_mm (tuple, optional): (ширина, высота) марки на листе, мм.
+    """
+    size = (size_mm[0] / 304.8, size_mm[1] / 304.8) if size_mm else None
+    return doc.Add(FamilySymbol(name, category, active, size))
+
+
+def build_document(element_count, tagged_share=0.0, other_share=0.0, categories=None):
+    """
+    Строит документ с одним планом, элементами категорий по кругу и марками.
+
+    Args:
+        element_count (int): Количество элементов выбранных категорий.
+        tagged_share (float): Доля замаркированных элементов.
+        other_share (float): Доля элементов других категорий (трубы) от element_count.
+        categories (list, optional): BuiltInCategory элементов. По умолчанию CATEGORIES.
+
+    Returns:
+        tuple: (Document, вид, [Category], [элементы]).
+    """
+    categories = categories or CATEGORIES
+    doc = Document()
+    view = add_view(doc)
+    elements = [
+        add_element(doc, categories[index % len(categories)], index)
+        for index in range(element_count)
+    ]
+    for index in range(int(element_count * other_share)):
+        add_element(doc, BuiltInCategory.OST_PipeCurves, index)
+    if tagged_share:
+        step = max(1, int(round(1.0 / tagged_share)))
+        for element in elements[::step]:
+            add_tag(doc, view, element)
+    return doc, view, [Category(category) for category in categories], elements
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты контрольной точки и разбиения на части (chunked_run).
+"""
+
+import os
+
+from chunked_run import RunCheckpoint, failure_limit
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = RunCheckpoint(path, "sig")
+    checkpoint.MarkCommitted(5, [1, 2])
+
+    loaded = RunCheckpoint.Load(path, "sig")
+    assert loaded.IsResumable()
+    assert loaded.completed_views == set([1, 2]) and loaded.committed_tags == 5
+    assert not RunCheckpoint.Load(path, "other").IsResumable()
+    assert os.listdir(str(tmp_path)) == ["checkpoint.json"]
+
+
+def test_recheck_drops_completed_views_with_missing_tags(tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path / "checkpoint.json"), "sig")
+    checkpoint.completed_views = set([1, 2, 3])
+
+    lost = checkpoint.Recheck([2, 4, 2])
+
+    assert lost == set([2])
+    assert checkpoint.completed_views == set([1, 3])
+
+
+def test_failure_limit_scales_with_chunk_size():
+    assert failure_limit(1) == 3
+    assert failure_limit(100) == 50
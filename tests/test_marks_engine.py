@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты TagPlacementEngine: plan() и execute() на документе-заглушке.
+"""
+
+import pytest
+
+import marks_engine
+from Autodesk.Revit.DB import BuiltInCategory, IndependentTag, TagOrientation, View
+
+import stub_model
+from marks_engine import TagPlacementEngine
+from run_manifest import RunManifest
+from stub_model import add_duct, add_element, add_linear_element, add_tag_type, add_view
+
+# Воздуховоды отбираются по группам (см. test_plan_keeps_longest_duct_per_group),
+# в остальных тестах маркируются все элементы
+CATEGORIES = stub_model.CATEGORIES[1:]
+
+
+class Options(object):
+    """
+    Настройки размещения по умолчанию (как TagSettings).
+    """
+
+    def __init__(self, **values):
+        self.offset_x = 60.0
+        self.offset_y = 30.0
+        self.orientation = TagOrientation.Horizontal
+        self.use_leader = True
+        self.random_offset = False
+        self.avoid_collisions = False
+        self.duct_selection_mode = "longest"
+        self.duct_top_n = 3
+        self.chunk_tags = 0
+        self.chunk_views = 0
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+def build_document(element_count, tagged_share=0.0, other_share=0.0, categories=CATEGORIES):
+    return stub_model.build_document(element_count, tagged_share, other_share, categories)
+
+
+def tags_of(doc, view=None):
+    return doc.Candidates(view.Id if view else None, IndependentTag)
+
+
+def plan_document(doc, views, categories, tag_type, **options):
+    engine = TagPlacementEngine(doc, Options(**options))
+    tag_types = dict((category, tag_type) for category in categories)
+    return engine, engine.plan(views, categories, tag_types, tag_types)
+
+
+def reasons(plan):
+    return sorted(reason for element, view, reason in plan.skipped)
+
+
+def test_plan_collects_elements_of_selected_categories():
+    doc, view, categories, elements = build_document(12, other_share=0.5)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories[1:], tag_type)
+
+    planned_ids = set(item.element.Id.IntegerValue for item in plan.items)
+    expected = set(
+        element.Id.IntegerValue for element in elements
+        if element.Category.Id != categories[0].Id
+    )
+    assert planned_ids == expected
+    assert not plan.skipped and not plan.errors
+    assert not tags_of(doc)
+
+
+def test_plan_skips_elements_with_existing_tags():
+    doc, view, categories, elements = build_document(8, tagged_share=0.5)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type)
+
+    assert reasons(plan) == ["existing_tag"] * 4
+    assert len(plan.items) == 4
+
+
+def test_plan_skips_elements_without_tag_type():
+    doc, view, categories, elements = build_document(3)
+
+    engine, plan = plan_document(doc, [view], categories, None)
+
+    assert reasons(plan) == ["no_tag_type"] * 3
+    assert len(plan.errors) == 3
+    assert not plan.items
+
+
+def test_plan_skips_elements_without_bounding_box():
+    doc, view, categories, elements = build_document(2)
+    add_element(doc, BuiltInCategory.OST_DuctFitting, 0, with_bbox=False)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type)
+
+    assert reasons(plan) == ["no_bbox"]
+    assert len(plan.items) == 2
+
+
+def test_plan_rejects_unsupported_views():
+    doc, view, categories, elements = build_document(2)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [doc.Add(View("Разрез"))], categories, tag_type)
+
+    assert not plan.items
+    assert len(plan.errors) == 1
+
+
+def test_plan_keeps_longest_duct_per_group():
+    doc, view, categories, elements = stub_model.build_document(0)
+    short = add_duct(doc, "П1", "200x200", 1.0)
+    longest = add_duct(doc, "П1", "200x200", 5.0, 1)
+    other = add_duct(doc, "П1", "300x200", 2.0, 2)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type)
+
+    planned = set(item.element.Id for item in plan.items)
+    assert planned == set([longest.Id, other.Id])
+    assert short.Id not in planned
+
+
+def test_plan_keeps_top_n_ducts_per_group():
+    doc, view, categories, elements = stub_model.build_document(0)
+    ducts = [add_duct(doc, "П1", "200x200", float(length), length) for length in range(1, 6)]
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(
+        doc, [view], categories, tag_type, duct_selection_mode="top_n", duct_top_n=2
+    )
+
+    assert set(item.element.Id for item in plan.items) == set(duct.Id for duct in ducts[-2:])
+
+
+def test_plan_skips_unchanged_elements_in_incremental_mode(tmp_path):
+    doc, view, categories, elements = build_document(4)
+    tag_type = add_tag_type(doc)
+    manifest_path = str(tmp_path / "manifest.json")
+
+    engine = TagPlacementEngine(doc, Options())
+    engine.manifest = RunManifest(manifest_path)
+    tag_types = dict((category, tag_type) for category in categories)
+    result = engine.execute(engine.plan([view], categories, tag_types, tag_types))
+    assert result.success_count == 4
+
+    engine = TagPlacementEngine(doc, Options())
+    engine.manifest = RunManifest.Load(manifest_path)
+    plan = engine.plan([view], categories, tag_types, tag_types)
+    assert reasons(plan) == ["unchanged"] * 4
+
+    # Удалённая марка возвращает элемент в обработку
+    doc.Remove(tags_of(doc, view)[0])
+    engine = TagPlacementEngine(doc, Options())
+    engine.manifest = RunManifest.Load(manifest_path)
+    plan = engine.plan([view], categories, tag_types, tag_types)
+    assert reasons(plan) == ["unchanged"] * 3
+    assert len(plan.items) == 1
+
+
+def test_layout_measures_tag_size_with_rolled_back_probe_tag():
+    doc, view, categories, elements = build_document(3)
+    tag_type = add_tag_type(doc, active=False, size_mm=(80.0, 10.0))
+    doc.default_tag_type_id = add_tag_type(doc, name="По умолчанию").Id
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, avoid_collisions=True)
+
+    width, height = engine.tag_sizes[tag_type.Id.IntegerValue]
+    assert (round(width * 304.8, 6), round(height * 304.8, 6)) == (80.0, 10.0)
+    assert doc.transactions == [("Замер марки", "RolledBack")]
+    assert not tags_of(doc)
+    assert len(plan.items) == 3
+
+
+def test_layout_indexes_all_visible_elements_along_their_axis():
+    doc, view, categories, elements = stub_model.build_document(0)
+    kept = add_duct(doc, "П1", "200x200", 5.0)
+    dropped = add_duct(doc, "П1", "200x200", 1.0, 1)
+    diagonal = add_linear_element(
+        doc, BuiltInCategory.OST_DuctCurves, (0.0, 0.0, 0.0), (300.0, 300.0, 0.0), diameter=0.5
+    )
+    tag_type = add_tag_type(doc)
+
+    engine = TagPlacementEngine(doc, Options(avoid_collisions=True))
+    elements_by_category = engine.CollectElementsByCategory(view, categories)
+    view_elements = [(categories[0], [kept])]
+    layout = engine.CreateLayout(view, elements_by_category, view_elements, {categories[0]: tag_type})
+
+    # Воздуховод, не отобранный для маркировки, остаётся препятствием
+    assert dropped.Id.IntegerValue in layout.grid.rects
+    # Длинный воздуховод занимает ячейки вдоль оси, а не весь габарит
+    assert diagonal.Id.IntegerValue in layout.grid.segments
+    assert layout.grid.Intersects((150.0, 150.0, 151.0, 151.0))
+    assert not layout.grid.Intersects((250.0, 20.0, 260.0, 25.0))
+
+
+def test_execute_creates_tags_with_selected_type():
+    doc, view, categories, elements = build_document(5)
+    doc.default_tag_type_id = add_tag_type(doc, name="По умолчанию").Id
+    tag_type = add_tag_type(doc, active=False)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type)
+    result = engine.execute(plan)
+
+    tags = tags_of(doc, view)
+    assert result.success_count == 5 and not result.errors
+    assert set(tag.GetTypeId() for tag in tags) == set([tag_type.Id])
+    assert sorted(tag.TaggedLocalElementId.IntegerValue for tag in tags) == sorted(
+        element.Id.IntegerValue for element in elements
+    )
+    assert tag_type.IsActive
+    assert doc.transactions == [
+        ("Активация типоразмеров марок", "Committed"),
+        ("Расстановка марок", "Committed"),
+    ]
+
+    # Созданные марки попадают в индекс: повторный план их пропускает
+    plan = engine.plan([view], categories, dict.fromkeys(categories, tag_type), {})
+    assert reasons(plan) == ["existing_tag"] * 5
+
+
+def test_execute_reports_progress():
+    doc, first, categories, elements = build_document(2)
+    views = [first, add_view(doc, "План 2")]
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, views, categories, tag_type)
+    progress = []
+    result = engine.execute(plan, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert result.success_count == 4
+    assert progress == [(done, 4) for done in range(1, 5)]
+    for view in views:
+        assert len(tags_of(doc, view)) == 2
+
+
+def test_execute_splits_plan_by_tag_count():
+    doc, view, categories, elements = build_document(7)
+    tag_type = add_tag_type(doc)
+    doc.default_tag_type_id = tag_type.Id
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, chunk_tags=3)
+    result = engine.execute(plan)
+
+    assert result.success_count == 7
+    assert doc.transactions == [
+        ("Расстановка марок (1/3)", "Committed"),
+        ("Расстановка марок (2/3)", "Committed"),
+        ("Расстановка марок (3/3)", "Committed"),
+    ]
+
+
+def test_execute_splits_plan_by_views():
+    doc, first, categories, elements = build_document(2)
+    views = [first, add_view(doc, "План 2"), add_view(doc, "План 3")]
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, views, categories, tag_type, chunk_views=2)
+    result = engine.execute(plan)
+
+    assert result.success_count == 6
+    assert [name for name, status in doc.transactions] == [
+        "Расстановка марок (1/2)",
+        "Расстановка марок (2/2)",
+    ]
+    for view in views:
+        assert len(tags_of(doc, view)) == 2
+
+
+def test_execute_rolls_back_only_the_failed_chunk():
+    doc, view, categories, elements = build_document(6)
+    tag_type = add_tag_type(doc)
+
+    def on_progress(done, total):
+        if done == 4:
+            raise RuntimeError("отмена")
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, chunk_tags=2)
+    result = engine.execute(plan, on_progress=on_progress)
+
+    assert result.success_count == 2
+    assert len(tags_of(doc, view)) == 2
+    assert doc.transactions == [
+        ("Расстановка марок (1/3)", "Committed"),
+        ("Расстановка марок (2/3)", "RolledBack"),
+    ]
+    assert any("отмена" in error for error in result.errors)
+
+
+def test_execute_rolls_back_chunk_with_too_many_failed_tags():
+    doc, view, categories, elements = build_document(8)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, chunk_tags=4)
+    failing = set(item.element.Id for item in plan.items[4:])
+    create_tag = engine.CreateTag
+    engine.CreateTag = lambda planned: None if planned.element.Id in failing else create_tag(planned)
+    result = engine.execute(plan)
+
+    assert result.success_count == 4
+    assert len(tags_of(doc, view)) == 4
+    assert doc.transactions == [
+        ("Расстановка марок (1/2)", "Committed"),
+        ("Расстановка марок (2/2)", "RolledBack"),
+    ]
+    assert any("часть отменена" in error for error in result.errors)
+
+
+def test_execute_keeps_chunk_with_few_failed_tags():
+    doc, view, categories, elements = build_document(8)
+    tag_type = add_tag_type(doc)
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, chunk_tags=4)
+    failing = plan.items[5].element.Id
+    create_tag = engine.CreateTag
+    engine.CreateTag = lambda planned: None if planned.element.Id == failing else create_tag(planned)
+    result = engine.execute(plan)
+
+    assert result.success_count == 7 and len(result.errors) == 1
+    assert [status for name, status in doc.transactions] == ["Committed", "Committed"]
+
+
+def test_execute_assigns_tag_types_one_by_one_when_bulk_call_fails(monkeypatch):
+    doc, view, categories, elements = build_document(3)
+    doc.default_tag_type_id = add_tag_type(doc, name="По умолчанию").Id
+    tag_type = add_tag_type(doc)
+
+    class BulkFails(object):
+        @staticmethod
+        def ChangeTypeId(doc, ids, type_id):
+            raise RuntimeError("групповой вызов недоступен")
+
+    monkeypatch.setattr(marks_engine, "Element", BulkFails)
+    engine, plan = plan_document(doc, [view], categories, tag_type)
+    result = engine.execute(plan)
+
+    assert result.success_count == 3 and not result.errors
+    assert set(tag.GetTypeId() for tag in tags_of(doc, view)) == set([tag_type.Id])
+
+
+@pytest.mark.parametrize("chunk_tags", [0, 1, 4])
+def test_execute_result_does_not_depend_on_chunking(chunk_tags):
+    doc, view, categories, elements = build_document(9, tagged_share=1.0 / 3)
+    tag_type = add_tag_type(doc)
+    existing = len(tags_of(doc, view))
+
+    engine, plan = plan_document(doc, [view], categories, tag_type, chunk_tags=chunk_tags)
+    result = engine.execute(plan)
+
+    assert result.success_count == 9 - existing
+    tagged = set(tag.TaggedLocalElementId for tag in tags_of(doc, view))
+    assert tagged == set(element.Id for element in elements)
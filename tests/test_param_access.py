@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты кэширующего доступа к параметрам (param_access).
+"""
+
+from Autodesk.Revit.DB import BuiltInCategory, Document
+
+from param_access import ParameterAccessor
+from stub_model import add_duct, add_element
+
+
+def test_accessor_counts_direct_reads_as_hits():
+    doc = Document()
+    ducts = [add_duct(doc, "П1", "200x200", 1.0, index) for index in range(3)]
+    accessor = ParameterAccessor()
+
+    values = [accessor.Get(duct, "system_name").AsString() for duct in ducts]
+
+    assert values == ["П1"] * 3
+    assert (accessor.misses, accessor.hits, accessor.name_lookups) == (1, 2, 0)
+
+
+def test_accessor_counts_name_reads_separately():
+    doc = Document()
+    ducts = [add_duct(doc, "П1", "200x200", 1.0, index) for index in range(3)]
+    accessor = ParameterAccessor()
+
+    values = [accessor.Get(duct, "section").AsString() for duct in ducts]
+
+    # "Сечение" не имеет BuiltInParameter и ищется по имени на каждое чтение
+    assert values == ["200x200"] * 3
+    assert (accessor.misses, accessor.hits, accessor.name_lookups) == (1, 0, 2)
+    assert "по имени 2" in accessor.Stats()
+
+
+def test_accessor_caches_missing_fields():
+    doc = Document()
+    element = add_element(doc, BuiltInCategory.OST_DuctFitting, 0)
+    other = add_element(doc, BuiltInCategory.OST_DuctFitting, 1)
+    accessor = ParameterAccessor()
+
+    assert accessor.Get(element, "diameter") is None
+    assert accessor.Get(other, "diameter") is None
+    assert (accessor.misses, accessor.hits) == (1, 1)
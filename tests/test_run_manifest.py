@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты манифеста запусков (run_manifest).
+"""
+
+import os
+
+import pytest
+
+import run_manifest
+from run_manifest import RunManifest
+
+
+def test_save_replaces_manifest_atomically(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = RunManifest(path)
+    manifest.Record(1, 10, "a", [100])
+    manifest.Save()
+    manifest.Record(1, 11, "b", [101])
+    manifest.Save()
+
+    assert RunManifest.Load(path).Get(1, 11) == ["b", [101]]
+    assert os.listdir(str(tmp_path)) == ["manifest.json"]
+
+
+def test_failed_save_keeps_previous_manifest(tmp_path, monkeypatch):
+    path = str(tmp_path / "manifest.json")
+    manifest = RunManifest(path)
+    manifest.Record(1, 10, "a", [100])
+    manifest.Save()
+
+    real_open = run_manifest.codecs.open
+
+    def interrupted(target, mode="r", encoding=None):
+        # Файл уже открыт на запись (и обрезан), запись обрывается
+        real_open(target, mode, encoding=encoding).close()
+        raise IOError("диск заполнен")
+
+    monkeypatch.setattr(run_manifest.codecs, "open", interrupted)
+    manifest.Record(1, 11, "b", [101])
+    with pytest.raises(IOError):
+        manifest.Save()
+    monkeypatch.undo()
+
+    assert RunManifest.Load(path).Get(1, 10) == ["a", [100]]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты индекса типоразмеров марок для длины полки (shelf_symbols).
+"""
+
+from Autodesk.Revit.DB import Document, Element, FamilySymbol, Parameter
+
+from shelf_symbols import ShelfSymbolIndex, shelf_lengths
+
+
+class TagFamily(Element):
+    """
+    Семейство марок с типоразмерами документа.
+    """
+
+    def __init__(self, doc):
+        Element.__init__(self, name="Марка длины")
+        self.symbol_ids = []
+        doc.Add(self)
+
+    def GetFamilySymbolIds(self):
+        return list(self.symbol_ids)
+
+
+def add_symbol(doc, family, name, **lengths_mm):
+    symbol = doc.Add(FamilySymbol(name))
+    symbol.Family = family
+    for param_name, length in lengths_mm.items():
+        symbol.params[param_name] = Parameter(param_name, length / 304.8)
+    family.symbol_ids.append(symbol.Id)
+    return symbol
+
+
+def test_shelf_lengths_reads_every_candidate_parameter():
+    doc = Document()
+    symbol = add_symbol(doc, TagFamily(doc), "Марка_10", Length=12.0, Длина=10.0)
+
+    assert [round(length, 6) for length in shelf_lengths(symbol)] == [12.0, 10.0]
+
+
+def test_existing_symbol_matches_by_any_shelf_parameter():
+    doc = Document()
+    family = TagFamily(doc)
+    base = add_symbol(doc, family, "Марка_8", Длина=8.0)
+    # "Shelf Length" не совпадает, а "Длина" совпадает с требуемой
+    target = add_symbol(doc, family, "Марка_25", **{"Shelf Length": 40.0, "Длина": 25.0})
+
+    index = ShelfSymbolIndex(doc)
+
+    assert index.NewNameAndNum(base, 25.0) == ("Марка_25", 25, target.Id)
+    assert index.NewNameAndNum(base, 26.0) == ("Марка_26", 26, None)
+    # Имя занято типоразмером с другой длиной - новое уникальное имя
+    assert index.NewNameAndNum(base, 8.4)[2] == base.Id
+    add_symbol(doc, family, "Марка_30", Длина=31.5)
+    index = ShelfSymbolIndex(doc)
+    assert index.NewNameAndNum(base, 30.0) == ("Марка_31", 31, None)
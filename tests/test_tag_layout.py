@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты раскладки марок без наложений (tag_layout).
+"""
+
+from tag_layout import SpatialGrid, TagLayout, segment_hits_rect
+
+
+def test_segment_hits_rect_respects_half_width():
+    assert segment_hits_rect((0.0, 0.0), (10.0, 0.0), 0.5, (4.0, 0.2, 5.0, 1.0))
+    assert not segment_hits_rect((0.0, 0.0), (10.0, 0.0), 0.1, (4.0, 0.2, 5.0, 1.0))
+    assert not segment_hits_rect((0.0, 0.0), (10.0, 0.0), 0.5, (11.0, -1.0, 12.0, 1.0))
+    assert segment_hits_rect((0.0, 0.0), (10.0, 10.0), 0.0, (4.0, 4.0, 6.0, 6.0))
+
+
+def test_long_diagonal_segment_occupies_cells_along_axis_only():
+    grid = SpatialGrid(1.0)
+    grid.InsertSegment("duct", (0.0, 0.0), (100.0, 100.0), 0.2)
+
+    assert len(grid.cells) < 500
+    assert grid.Intersects((50.0, 50.0, 51.0, 51.0))
+    # Внутри габарита отрезка, но далеко от оси
+    assert not grid.Intersects((80.0, 10.0, 82.0, 11.0))
+
+
+def test_place_avoids_long_obstacle_instead_of_ignoring_it():
+    layout = TagLayout(2.0, 0.5)
+    layout.AddLinearObstacle("duct", (-100.0, 0.0), (100.0, 0.0), 0.25)
+
+    (u, v), is_free = layout.Place("fitting", (0.0, 0.5), 1.0, 0.5, (1, -1))
+
+    assert is_free
+    assert not segment_hits_rect((-100.0, 0.0), (100.0, 0.0), 0.25, layout.TagRect(u, v))
+
+
+def test_place_uses_tag_size():
+    def place(size):
+        layout = TagLayout(1.0, 0.5)
+        layout.AddObstacle("wall", (2.0, -10.0, 3.0, 10.0))
+        (u, v), is_free = layout.Place("a", (0.0, 0.0), 1.0, 0.5, (1, 1), size=size)
+        return layout, (u, v), is_free
+
+    layout, point, is_free = place(None)
+    assert is_free and point == (1.0, 0.5)
+
+    # Длинная марка в той же точке задевает препятствие и смещается
+    layout, point, is_free = place((4.0, 0.5))
+    assert is_free and point != (1.0, 0.5)
+    assert not layout.grid.Intersects(layout.TagRect(point[0], point[1], (4.0, 0.5)), ignore_key=("tag", "a"))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты модели ширины текста (text_width) с измерителем-заглушкой.
+"""
+
+from text_width import TextWidthModel, is_font_installed
+
+
+def fake_measurer_factory(calls):
+    def factory(font_name):
+        def measure(char):
+            calls.append((font_name, char))
+            return 0.5 if char == " " else 0.6
+        return measure
+    return factory
+
+
+def test_width_measures_each_glyph_once():
+    calls = []
+    model = TextWidthModel("Arial", 2.5, fake_measurer_factory(calls))
+
+    assert round(model.Width("ab a"), 6) == round((0.6 * 3 + 0.5) * 2.5, 6)
+    model.Width("ab a")
+    model.Width("ba")
+
+    assert sorted(char for font, char in calls) == [" ", "a", "b"]
+    assert (model.misses, model.hits) == (2, 1)
+    assert model.Table("Arial") is model.Table("Arial")
+
+
+def test_is_font_installed_ignores_case_and_spaces():
+    installed = set(["arial", "gost type a"])
+
+    assert is_font_installed(" GOST type A ", installed)
+    assert not is_font_installed("ISOCPEUR", installed)
+    assert not is_font_installed("", installed)